@@ -0,0 +1,52 @@
+"""
+Benchmarks cold `12step html` startup with an empty cache, a warm bytecode cache and precompiled templates
+
+Usage: python benchmarks/cold_start.py [-n RUNS] [-c CONFIG] [-D DATA_DIR]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEST_DATA = path.join(ROOT, 'tests', 'data')
+
+
+def run(args, cache_dir, *command):
+    cmd = [sys.executable, '-m', 'pdf12step', '-c', args.config, '-D', args.data_dir, '-C', cache_dir, *command]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=args.workdir)
+    return time.perf_counter() - start
+
+
+def bench(args, prepare=None):
+    timings = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            if prepare:
+                run(args, tmp, *prepare)
+            timings.append(run(args, tmp, 'html', '-o', path.join(tmp, 'out.html')))
+    return {'min': min(timings), 'mean': sum(timings) / len(timings), 'runs': len(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('-c', '--config', default=path.join(TEST_DATA, 'test.config.yml'))
+    parser.add_argument('-D', '--data-dir', default=TEST_DATA)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+    results = {
+        'source': bench(args),
+        'bytecode': bench(args, prepare=('html', '-o', path.devnull)),
+        'compiled': bench(args, prepare=('compile-templates',)),
+    }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
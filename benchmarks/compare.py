@@ -0,0 +1,32 @@
+"""
+Compares two benchmarks/suite.py result files and prints the change of each benchmark
+
+Usage: python benchmarks/compare.py BASE.json HEAD.json
+"""
+import argparse
+import json
+
+
+def load(filename):
+    with open(filename) as rfile:
+        return json.load(rfile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    args = parser.parse_args()
+    base, head = load(args.base), load(args.head)
+    print(f"{'meetings':>9} {'stage':<10} {base['commit'] or 'base':>10} {head['commit'] or 'head':>10} {'change':>8}")
+    for scale, stages in head['results'].items():
+        for stage, result in stages.items():
+            old = base['results'].get(scale, {}).get(stage, {})
+            if 'min' not in result or 'min' not in old:
+                continue
+            change = (result['min'] - old['min']) / old['min'] * 100 if old['min'] else 0
+            print(f"{scale:>9} {stage:<10} {old['min']:>9.3f}s {result['min']:>9.3f}s {change:>+7.1f}%")
+
+
+if __name__ == '__main__':
+    main()
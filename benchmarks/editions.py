@@ -0,0 +1,57 @@
+"""
+Benchmarks rendering several editions with separate `12step pdf` runs against one `12step build` run
+
+Usage: python benchmarks/editions.py [-n EDITIONS] [-j JOBS] [-c CONFIG] [-D DATA_DIR] [--format FORMAT]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEST_DATA = path.join(ROOT, 'tests', 'data')
+
+
+def run(args, workdir, *command):
+    cmd = [sys.executable, '-m', 'pdf12step', '-c', args.config, '-D', args.data_dir, '-C', path.join(workdir, 'cache'),
+           *command]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=workdir)
+    return time.perf_counter() - start
+
+
+def write_editions(workdir, num):
+    configs = []
+    for idx in range(num):
+        config = path.join(workdir, f'edition{idx}.yml')
+        with open(config, 'w') as cfile:
+            cfile.write(f'show_links: {"true" if idx % 2 else "false"}\ndescription: Edition {idx}\n')
+        configs.append(config)
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--editions', type=int, default=4)
+    parser.add_argument('-j', '--jobs', type=int, default=4)
+    parser.add_argument('-c', '--config', default=path.join(TEST_DATA, 'test.config.yml'))
+    parser.add_argument('-D', '--data-dir', default=TEST_DATA)
+    parser.add_argument('--format', default='pdf', choices=('pdf', 'html'))
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = write_editions(tmp, args.editions)
+        results['separate'] = sum(run(args, tmp, '-c', config, args.format, '-f', '-o', f'{idx}.{args.format}')
+                                  for idx, config in enumerate(configs))
+        results['build'] = run(args, tmp, 'build', *configs, '--format', args.format, '-f', '-j', '1')
+        results[f'build -j {args.jobs}'] = run(args, tmp, 'build', *configs, '--format', args.format, '-f',
+                                               '-j', str(args.jobs))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
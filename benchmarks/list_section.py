@@ -0,0 +1,102 @@
+"""
+Benchmarks rendering the list_2sections section through the row() renderer with and without the row fragment cache
+against the previous template which included the row and imported macros once per meeting
+
+Usage: python benchmarks/list_section.py [-m MEETINGS] [-n RUNS]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from os import path
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from pdf12step.adict import AttrDict
+from pdf12step.config import Config
+from pdf12step.templating import Context
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEST_DATA = path.join(ROOT, 'tests', 'data')
+SECTION = 'includes/sections/list_2sections.html'
+INFO = 'includes/info.html'
+IMPORT = "{% import 'macros.html' as macros with context %}"
+
+
+def make_meetings(num, data_dir):
+    """
+    Writes num meetings to the example.com data file by cycling through the test meetings with new ids
+    """
+    with open(path.join(TEST_DATA, 'example.com-meetings.json')) as jfile:
+        sample = json.load(jfile)
+    meetings = []
+    for idx in range(num):
+        meeting = dict(sample[idx % len(sample)], id=idx + 1)
+        meeting['slug'] = f"{meeting['slug']}-{idx}"
+        meetings.append(meeting)
+    with open(path.join(data_dir, 'example.com-meetings.json'), 'w') as jfile:
+        json.dump(meetings, jfile)
+
+
+def legacy_templates(env):
+    """
+    Returns the section and row template sources as they were with the row include and macros import in every row
+    """
+    section = env.loader.get_source(env, SECTION)[0].replace('{{ row(meeting) }}', f"{{% include '{INFO}' %}}")
+    info = env.loader.get_source(env, INFO)[0].splitlines()
+    info[0] = IMPORT
+    return {SECTION: section, INFO: '\n'.join(info)}
+
+
+def load_context(data_dir, cache_dir, **opts):
+    opts.update(config=[path.join(TEST_DATA, 'test.config.yml')], data_dir=data_dir, cache_dir=cache_dir)
+    return Context(AttrDict(Config.load(opts)), opts)
+
+
+def bench_cache(data_dir, runs):
+    """
+    Times a render with a fresh context against an empty and a filled row fragment cache
+    """
+    cold, warm = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for timings in (cold, warm):
+                context = load_context(data_dir, cache_dir)
+                start = time.perf_counter()
+                context.render(SECTION)
+                timings.append(time.perf_counter() - start)
+    return [{'min': min(timings), 'mean': sum(timings) / len(timings), 'runs': runs} for timings in (cold, warm)]
+
+
+def bench(context, runs):
+    template = context.env.get_template(SECTION)
+    template.render(context)  # warm up the cached Meeting fields
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        template.render(context)
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'mean': sum(timings) / len(timings), 'runs': runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-m', '--meetings', type=int, default=20000)
+    parser.add_argument('-n', '--runs', type=int, default=3)
+    args = parser.parse_args()
+    results = {'meetings': args.meetings}
+    with tempfile.TemporaryDirectory() as tmp:
+        make_meetings(args.meetings, tmp)
+        context = load_context(tmp, tmp, row_cache=False)
+        results['row'] = bench(context, args.runs)
+        context.env.loader = ChoiceLoader([DictLoader(legacy_templates(context.env)), context.env.loader])
+        context.env.cache.clear()
+        results['include_per_row_import'] = bench(context, args.runs)
+        results['row_cache_cold'], results['row_cache_warm'] = bench_cache(tmp, args.runs)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmarks the memory of the loaded meetings and the time to compute their derived location fields with every meeting
+holding its own copy of its location against the normalized model where meetings share one Location per location_id
+
+Usage: python benchmarks/normalized.py [-m MEETINGS] [-p PER_LOCATION] [-n RUNS]
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from os import path
+
+from pdf12step.meetings import LOCATION_FIELDS, MeetingSet
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+import synthetic  # noqa: E402
+
+DERIVED = ('zipcode', 'address_display', 'region_display', 'latlon')
+
+
+def memory(data_file, normalized):
+    """
+    Returns the memory the meetings hold after loading them and after computing their derived location fields
+    """
+    gc.collect()
+    tracemalloc.start()
+    meetings = MeetingSet.load(data_file, normalized).items
+    loaded = tracemalloc.get_traced_memory()[0]
+    derive(meetings)
+    derived = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'loaded_kb': loaded // 1024, 'derived_kb': derived // 1024}
+
+
+def derive(meetings):
+    """
+    Computes the derived location fields of the meetings and returns the number of times they were computed,
+    once per meeting or once per shared location
+    """
+    for meeting in meetings:
+        for name in DERIVED:
+            getattr(meeting, name)
+    return len({id(meeting.location_ref or meeting) for meeting in meetings}) * len(DERIVED)
+
+
+def bench(data_file, normalized, runs):
+    timings = {'load_seconds': [], 'derive_seconds': []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        meetings = MeetingSet.load(data_file, normalized).items
+        timings['load_seconds'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        computed = derive(meetings)
+        timings['derive_seconds'].append(time.perf_counter() - start)
+        del meetings
+    result = {name: min(values) for name, values in timings.items()}
+    result['computed'] = computed
+    result.update(memory(data_file, normalized))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-m', '--meetings', type=int, default=20000)
+    parser.add_argument('-p', '--per-location', type=int, default=10, help='Average number of meetings at a location')
+    parser.add_argument('-n', '--runs', type=int, default=3)
+    args = parser.parse_args()
+    results = {'meetings': args.meetings, 'per_location': args.per_location, 'location_fields': len(LOCATION_FIELDS)}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = synthetic.write(synthetic.generate(args.meetings, meetings_per_location=args.per_location), tmp)
+        results['plain'] = bench(data_file, False, args.runs)
+        results['normalized'] = bench(data_file, True, args.runs)
+    for name in ('loaded_kb', 'derived_kb'):
+        results[f'{name[:-3]}_memory_saved'] = 1 - results['normalized'][name] / results['plain'][name]
+    results['derive_speedup'] = results['plain']['derive_seconds'] / results['normalized']['derive_seconds']
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
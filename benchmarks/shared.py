@@ -0,0 +1,92 @@
+"""
+Benchmarks the startup time and memory of worker processes that each load and enrich their own copy of the meetings
+against workers that attach the shared dataset published once, the way jobs get their meetings,
+and workers that also build every meeting from it like a render that shows all of them
+
+Usage: python benchmarks/shared.py [-m MEETINGS] [-w WORKERS]
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from os import path
+
+from pdf12step.dataset import attach, dataset_file, publish
+from pdf12step.meetings import MeetingSet
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+import synthetic  # noqa: E402
+
+
+def memory():
+    """
+    Returns the resident and proportional set sizes of this process in KB, shared pages count once in the PSS
+    """
+    sizes = {}
+    with open('/proc/self/smaps_rollup') as sfile:
+        for line in sfile:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                sizes[name.lower()] = int(value.split()[0])
+    return sizes
+
+
+def worker(mode, data_file, results):
+    start = time.perf_counter()
+    if mode == 'load':
+        meetings = MeetingSet(data_file).enrich()
+    elif mode == 'attach':
+        meetings = attach(data_file).meetings()
+    else:
+        meetings = attach(data_file).meetings().items
+    results.put(dict(memory(), ready=time.perf_counter() - start, meetings=len(meetings)))
+    # keep the meetings until every worker measured its memory
+    results.join()
+
+
+def bench(mode, data_file, workers):
+    """
+    Starts the workers and returns the time until all of them have the meetings and their total memory
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.JoinableQueue()
+    start = time.perf_counter()
+    procs = [context.Process(target=worker, args=(mode, data_file, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    sizes = []
+    for _ in procs:
+        sizes.append(results.get())
+        results.task_done()
+    wall = time.perf_counter() - start
+    for proc in procs:
+        proc.join()
+    return {
+        'startup': wall,
+        'ready_max': max(size['ready'] for size in sizes),
+        'rss_kb': sum(size['rss'] for size in sizes),
+        'pss_kb': sum(size['pss'] for size in sizes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-m', '--meetings', type=int, default=20000)
+    parser.add_argument('-w', '--workers', type=int, default=8)
+    args = parser.parse_args()
+    results = {'meetings': args.meetings, 'workers': args.workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = synthetic.write(synthetic.generate(args.meetings), tmp)
+        start = time.perf_counter()
+        publish(data_file, dataset_file(data_file))
+        results['publish'] = time.perf_counter() - start
+        for mode in ('load', 'attach', 'built'):
+            results[mode] = bench(mode, data_file, args.workers)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmarks loading, filtering, grouping, indexing and rendering synthetic meeting data at several scales
+
+Writes machine readable results with the git commit so runs can be compared with benchmarks/compare.py
+
+Usage: python benchmarks/suite.py [-s SCALE ...] [--pdf-scales SCALE ...] [-n RUNS] [-o OUTPUT]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from os import path
+
+from pdf12step.__version__ import __version__
+from pdf12step.adict import AttrDict
+from pdf12step.config import Config
+from pdf12step.meetings import MeetingSet
+from pdf12step.templating import Context
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+import synthetic  # noqa: E402
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEST_DATA = path.join(ROOT, 'tests', 'data')
+
+
+def timed(func, runs, setup=None):
+    """
+    Returns the min and mean seconds of calling func runs times after one warm up call.
+    The return value of setup is passed to func and is not timed
+    """
+    timings = []
+    for run in range(runs + 1):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg) if setup else func()
+        if run:
+            timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'mean': sum(timings) / len(timings), 'runs': runs}
+
+
+def load_context(data_dir, cache_dir, meetings=None):
+    opts = dict(config=[path.join(TEST_DATA, 'test.config.yml')], data_dir=data_dir, cache_dir=cache_dir,
+                asset_dir=path.join(cache_dir, 'assets'), row_cache=False)
+    return Context(AttrDict(Config.load(opts)), opts, meetings=meetings)
+
+
+def nest(context, meetings):
+    """
+    Groups the meetings the way the list section does, by day then region then sorted by time
+    """
+    return [(day, [(region, group.sort('time')) for region, group in context.by_value(by_day, 'region_display')])
+            for day, by_day in context.by_value(meetings, 'day')]
+
+
+def bench_scale(scale, runs, pdf, seed):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = synthetic.write(synthetic.generate(scale, regions=max(5, scale // 400), seed=seed), tmp)
+        results['load'] = timed(lambda: MeetingSet(data_file).items, runs)
+        meetings = MeetingSet(data_file).enrich()
+        context = load_context(tmp, tmp, meetings)
+        results['filter'] = timed(lambda: context.get_meetings(meetings=meetings), runs)
+        results['by_value'] = timed(lambda: nest(context, context.meetings), runs)
+        results['index'] = timed(lambda items: items.index, runs, lambda: MeetingSet(context.meetings.items))
+        context.prerender()
+        results['html'] = timed(context.render, runs)
+        if pdf:
+            try:
+                results['pdf'] = timed(context.pdf, runs)
+            except (ImportError, OSError) as exc:
+                results['pdf'] = {'error': str(exc).splitlines()[0]}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-s', '--scales', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--pdf-scales', type=int, nargs='*', default=[1000],
+                        help='Scales to also render PDFs at, the PDF render is slow at large scales')
+    parser.add_argument('-n', '--runs', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='-', help='File to write the JSON results to, "-" for stdout')
+    args = parser.parse_args()
+    report = {
+        'commit': git_commit(),
+        'version': __version__,
+        'python': platform.python_version(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'runs': args.runs,
+        'results': {},
+    }
+    for scale in args.scales:
+        report['results'][str(scale)] = bench_scale(scale, args.runs, scale in args.pdf_scales, args.seed)
+        print(f'Benchmarked {scale} meetings', file=sys.stderr)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as rfile:
+            json.dump(report, rfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
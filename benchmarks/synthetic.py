@@ -0,0 +1,204 @@
+"""
+Generates a synthetic TSML meetings data file shaped like the 12-step-meeting-list plugin output
+
+Usage: python benchmarks/synthetic.py [-m MEETINGS] [-r REGIONS] [--online RATIO] [--hybrid RATIO]
+       [--canadian RATIO] [--approximate RATIO] [--seed SEED] [-o OUTPUT]
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from os import path
+
+from pdf12step.config import DEFAULT_CODES
+
+NAME_WORDS = ('Sunrise', 'Serenity', 'Hope', 'Freedom', 'Keep It Simple', 'Living Sober', 'Primary Purpose',
+              'Came To Believe', 'Happy Hour', 'Back To Basics', 'Early Bird', 'Big Book', 'Lunch Bunch',
+              'Promises', 'Grapevine', 'New Beginnings', 'Easy Does It', 'Second Chance', 'Unity', 'Gratitude')
+NAME_SUFFIXES = ('Group', 'Meeting', 'Step Study', 'Discussion', 'Speakers', 'Women', 'Men', 'Young People', '')
+STREETS = ('Main', 'Oak', 'Maple', 'Church', 'Park', 'Washington', 'Lake', 'Hill', 'Charles', 'York', 'Calvert',
+           'Harford', 'Belair', 'Reisterstown', 'Liberty', 'Frederick', 'Falls', 'Edmondson')
+STREET_TYPES = ('St', 'Rd', 'Ave', 'Blvd', 'Ln', 'Pike', 'Dr')
+CITY_PARTS = ('Glen', 'Mill', 'Spring', 'Oak', 'Bel', 'Fair', 'Elk', 'Cedar', 'Brook', 'Ash', 'Pine', 'River')
+CITY_SUFFIXES = ('ton', 'ville', 'field', 'dale', ' Park', ' Heights', 'wood', 'burg', 'mont', ' Falls')
+LOCATIONS = ('St. Mark Church', 'Alano Club', 'Community Center', 'Public Library', 'Fellowship Hall',
+             'Recovery Clubhouse', 'Senior Center', 'Hospital Annex', 'Lutheran Church', 'Friends Meeting House')
+STATES = ('MD', 'DC', 'VA', 'PA', 'DE')
+PROVINCES = ('ON', 'QC', 'BC', 'AB', 'NS')
+# first letters of Canadian postal codes in each province
+PROVINCE_LETTERS = {'ON': 'KLMNP', 'QC': 'GHJ', 'BC': 'V', 'AB': 'T', 'NS': 'B'}
+POSTAL_LETTERS = 'ABCEGHJKLMNPRSTVWXYZ'
+NOTES = ('Enter through the side door', 'Parking in the rear lot', 'Wheelchair accessible',
+         'Meets in the basement', '-Zoom occurs separately, but concurrently.', 'Literature available',
+         'Masks optional', 'Childcare available on request')
+ATTENDANCE_TYPES = {'online': ['ONL'], 'hybrid': ['ONL', 'HYB'], 'in_person': []}
+
+
+def city_name(rand):
+    return rand.choice(CITY_PARTS) + rand.choice(CITY_SUFFIXES)
+
+
+def postal_code(rand, province):
+    letter, digit = rand.choice, rand.randint
+    return (f'{letter(PROVINCE_LETTERS[province])}{digit(0, 9)}{letter(POSTAL_LETTERS)} '
+            f'{digit(0, 9)}{letter(POSTAL_LETTERS)}{digit(0, 9)}')
+
+
+def make_regions(rand, num_regions, sub_regions):
+    """
+    Returns a list of region dicts with their ids, sub regions and a few zipcodes each
+    """
+    regions = []
+    for idx in range(num_regions):
+        name = city_name(rand)
+        if any(region['region'] == name for region in regions):
+            name = f'{name} {idx}'
+        regions.append({
+            'region_id': 20000 + idx,
+            'region': name,
+            'sub_regions': [f'{name} {side}' for side in ('North', 'South', 'East', 'West')[:sub_regions]],
+            'zipcodes': [f'{rand.randint(20000, 21999):05d}' for _ in range(rand.randint(1, 4))],
+        })
+    return regions
+
+
+def make_location(rand, idx, region, canadian, approximate):
+    """
+    Returns the location fields of a meeting in the region with a US or Canadian, full or approximate address
+    """
+    city = region['region']
+    if canadian:
+        province = rand.choice(PROVINCES)
+        country, state, code = 'Canada', province, postal_code(rand, province)
+    else:
+        country, state, code = 'USA', rand.choice(STATES), rand.choice(region['zipcodes'])
+    if approximate:
+        address = f'{city}, {state}, {country}'
+    else:
+        street = f'{rand.randint(1, 19999)} {rand.choice(STREETS)} {rand.choice(STREET_TYPES)}'
+        address = f'{street}, {city}, {state} {code}, {country}'
+    location = {
+        'location_id': 300000 + idx,
+        'location': rand.choice(LOCATIONS),
+        'formatted_address': address,
+        'approximate': 'yes' if approximate else 'no',
+        'latitude': round(rand.uniform(38.5, 40.0), 7),
+        'longitude': round(rand.uniform(-77.5, -76.0), 7),
+        'region_id': region['region_id'],
+        'region': city,
+        'canadian': canadian,
+    }
+    if region['sub_regions']:
+        location['sub_region'] = rand.choice(region['sub_regions'])
+    if rand.random() < 0.2:
+        location['location_notes'] = rand.choice(NOTES)
+    return location
+
+
+def make_meeting(rand, idx, location, attendance_option, codes, updated):
+    """
+    Returns a meeting dict at the location with types and conference fields matching its attendance_option
+    """
+    name = f'{rand.choice(NAME_WORDS)} {rand.choice(NAME_SUFFIXES)}'.strip()
+    slug = f"{name.lower().replace(' ', '-')}-{idx}"
+    domain = 'example.ca' if location['canadian'] else 'example.com'
+    minutes = rand.randrange(6 * 60, 22 * 60, 15)
+    start = datetime(2000, 1, 1, minutes // 60, minutes % 60)
+    types = sorted(set(rand.sample(codes, rand.randint(1, 4)) + ATTENDANCE_TYPES[attendance_option]))
+    meeting = {
+        'id': 100000 + idx,
+        'name': name,
+        'slug': slug,
+        'notes': '\n'.join(rand.sample(NOTES, rand.randint(0, 2))),
+        'updated': updated.strftime('%Y-%m-%d %H:%M:%S'),
+        'url': f'https://{domain}/meetings/{slug}/',
+        'day': rand.randint(0, 6),
+        'time': start.strftime('%H:%M'),
+        'end_time': (start + timedelta(hours=1)).strftime('%H:%M'),
+        'time_formatted': start.strftime('%I:%M %p').lstrip('0').lower(),
+        'types': types,
+        'location_url': f"https://{domain}/locations/{location['location_id']}/",
+        'attendance_option': attendance_option,
+    }
+    meeting.update({key: value for key, value in location.items() if key != 'canadian'})
+    if attendance_option != 'in_person':
+        zoom_id = str(rand.randint(10 ** 9, 10 ** 11 - 1))
+        meeting.update(
+            conference_url=f'https://us02web.zoom.us/j/{zoom_id}',
+            conference_url_notes='Password: ask the group',
+            conference_phone=f'+13017158592,,{zoom_id}#',
+        )
+    return meeting
+
+
+def generate(num, regions=25, sub_regions=0, meetings_per_location=3, online=0.2, hybrid=0.15, canadian=0.0,
+             approximate=0.1, codes=None, seed=0):
+    """
+    Returns a list of num synthetic meeting dicts.
+    Meetings are spread over the regions and share locations, a ratio of them are online or hybrid,
+    have Canadian addresses with postal codes or approximate addresses without a street and zipcode
+
+    :param int num: Number of meetings
+    :param int regions: Number of regions
+    :param int sub_regions: Number of sub regions in each region (up to 4)
+    :param int meetings_per_location: Average number of meetings at each location
+    :param float online: Ratio of online meetings
+    :param float hybrid: Ratio of hybrid meetings
+    :param float canadian: Ratio of locations with Canadian addresses
+    :param float approximate: Ratio of locations with approximate addresses
+    :param list codes: Meeting type codes to pick from, defaults to the TSML spec codes
+    :param int seed: Random seed so the same arguments generate the same data
+    :rtype: list
+    """
+    rand = random.Random(seed)
+    codes = sorted(set(codes or DEFAULT_CODES) - {'ONL', 'HYB', 'TC'})
+    region_list = make_regions(rand, regions, sub_regions)
+    num_locations = max(1, num // max(1, meetings_per_location))
+    locations = [make_location(rand, idx, rand.choice(region_list), rand.random() < canadian,
+                               rand.random() < approximate) for idx in range(num_locations)]
+    updated = datetime(2024, 1, 1)
+    meetings = []
+    for idx in range(num):
+        roll = rand.random()
+        attendance_option = 'online' if roll < online else 'hybrid' if roll < online + hybrid else 'in_person'
+        meetings.append(make_meeting(rand, idx, rand.choice(locations), attendance_option, codes,
+                                     updated + timedelta(minutes=idx)))
+    return meetings
+
+
+def write(meetings, data_dir, site_domain='example.com'):
+    """
+    Writes the meetings to the data file 12step reads for the site_domain and returns its filename
+    """
+    filename = path.join(data_dir, f'{site_domain}-meetings.json')
+    with open(filename, 'w') as jfile:
+        json.dump(meetings, jfile)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-m', '--meetings', type=int, default=10000)
+    parser.add_argument('-r', '--regions', type=int, default=25)
+    parser.add_argument('--sub-regions', type=int, default=0)
+    parser.add_argument('--per-location', type=int, default=3, help='Average number of meetings at a location')
+    parser.add_argument('--online', type=float, default=0.2, help='Ratio of online meetings')
+    parser.add_argument('--hybrid', type=float, default=0.15, help='Ratio of hybrid meetings')
+    parser.add_argument('--canadian', type=float, default=0.0, help='Ratio of Canadian addresses')
+    parser.add_argument('--approximate', type=float, default=0.1, help='Ratio of addresses without a street')
+    parser.add_argument('--codes', default=None, help='Comma separated meeting type codes to pick from')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='-', help='File to write to, "-" for stdout')
+    args = parser.parse_args()
+    meetings = generate(args.meetings, args.regions, args.sub_regions, args.per_location, args.online, args.hybrid,
+                        args.canadian, args.approximate, args.codes.split(',') if args.codes else None, args.seed)
+    if args.output == '-':
+        json.dump(meetings, sys.stdout)
+    else:
+        with open(args.output, 'w') as jfile:
+            json.dump(meetings, jfile)
+
+
+if __name__ == '__main__':
+    main()
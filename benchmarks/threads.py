@@ -0,0 +1,101 @@
+"""
+Benchmarks concurrent renders of fresh contexts in threads, like a threaded Flask server, with the lock free
+cached_property of pdf12step.cached against the locking functools.cached_property of Python 3.8 to 3.11
+
+Usage: python benchmarks/threads.py [-m MEETINGS] [-t THREADS] [-n RUNS]
+"""
+import argparse
+import functools
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from threading import RLock
+
+from pdf12step.adict import AttrDict
+from pdf12step.cached import cached_property
+from pdf12step.client import Client
+from pdf12step.config import Config
+from pdf12step.meetings import Meeting, MeetingSet
+from pdf12step.templating import Context
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+import synthetic  # noqa: E402
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEST_DATA = path.join(ROOT, 'tests', 'data')
+SECTION = 'includes/sections/list_2sections.html'
+CLASSES = (Meeting, MeetingSet, Context, Client)
+
+
+class locked_cached_property(functools.cached_property):
+    """
+    functools.cached_property as it is before Python 3.12, with one lock for all instances
+    """
+
+    def __init__(self, func):
+        super().__init__(func)
+        self.lock = RLock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__
+        if self.attrname not in cache:
+            with self.lock:
+                if self.attrname not in cache:
+                    cache[self.attrname] = self.func(instance)
+        return cache[self.attrname]
+
+
+def use_descriptor(descriptor):
+    """
+    Replaces the cached properties of the classes with the descriptor class
+    """
+    for cls in CLASSES:
+        for name, attr in list(vars(cls).items()):
+            if isinstance(attr, (cached_property, locked_cached_property)):
+                prop = descriptor(attr.func)
+                prop.__set_name__(cls, name)
+                setattr(cls, name, prop)
+
+
+def render(data_dir):
+    opts = dict(config=[path.join(TEST_DATA, 'test.config.yml')], data_dir=data_dir, cache_dir=data_dir,
+                row_cache=False, group_cache=False)
+    context = Context(AttrDict(Config.load(opts)), opts)
+    return context.render(SECTION)
+
+
+def bench(data_dir, threads, runs):
+    render(data_dir)  # compile the templates
+    timings = []
+    for _ in range(runs):
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            list(pool.map(render, [data_dir] * threads))
+            timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'mean': sum(timings) / len(timings), 'renders_per_second': threads / min(timings),
+            'runs': runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-m', '--meetings', type=int, default=2000)
+    parser.add_argument('-t', '--threads', type=int, default=8)
+    parser.add_argument('-n', '--runs', type=int, default=3)
+    args = parser.parse_args()
+    results = {'meetings': args.meetings, 'threads': args.threads, 'python': sys.version.split()[0]}
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic.write(synthetic.generate(args.meetings), tmp)
+        results['lock_free'] = bench(tmp, args.threads, args.runs)
+        use_descriptor(locked_cached_property)
+        results['locked'] = bench(tmp, args.threads, args.runs)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
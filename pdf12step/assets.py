@@ -0,0 +1,63 @@
+import json
+from os import path
+from threading import RLock
+
+from pdf12step.log import logger
+from pdf12step.utils import atomic_open
+
+LOCK = RLock()
+
+
+class AssetCache(object):
+    """
+    Keeps track of the hash of the inputs each generated asset was last written from in `assets.json` in the cache_dir.
+    Assets are only regenerated when their inputs change or the file is missing,
+    and are written atomically so readers like WeasyPrint never see a partially written file.
+
+    :param str cache_dir: Cache directory to keep the stamps file in. Stamps are kept in memory if None
+    """
+    memory = {}
+
+    def __init__(self, cache_dir=None):
+        self.filename = path.join(cache_dir, 'assets.json') if cache_dir else None
+
+    def stamps(self):
+        """
+        Returns the mapping of asset filenames to their input hashes
+
+        :rtype: dict
+        """
+        if self.filename is None:
+            return self.memory
+        if not path.isfile(self.filename):
+            return {}
+        try:
+            with open(self.filename) as sfile:
+                return json.load(sfile)
+        except ValueError:
+            return {}
+
+    def update(self, dest, key, write, mode='w'):
+        """
+        Writes the asset with write(fileobj) if its key changed since the last write or dest is missing.
+        Returns True if the asset was written
+
+        :param str dest: Filename of the asset
+        :param str key: Hash of the inputs that the asset is generated from
+        :param callable write: Function that writes the asset content to the file object passed
+        :param str mode: File mode to write the asset with (eg w/wb)
+        :rtype: bool
+        """
+        with LOCK:
+            stamps = self.stamps()
+            if stamps.get(dest) == key and path.isfile(dest):
+                logger.debug(f'Asset {dest} is up to date')
+                return False
+            with atomic_open(dest, mode) as fobj:
+                write(fobj)
+            stamps[dest] = key
+            if self.filename is not None:
+                with atomic_open(self.filename) as sfile:
+                    json.dump(stamps, sfile, indent=2)
+            logger.info(f'Wrote asset {dest}')
+            return True
@@ -0,0 +1,190 @@
+import multiprocessing
+import time
+from os import path
+
+from pdf12step.adict import AttrDict
+from pdf12step.config import BUILD_OUTPUT as OUTPUT, Config
+from pdf12step.log import logger
+from pdf12step.manifest import BuildManifest, build_inputs, meetings_file
+from pdf12step.meetings import MeetingSet
+from pdf12step.templating import Context
+from pdf12step.utils import atomic_open
+
+# editions and loaded meetings shared with forked worker processes
+shared = {}
+
+
+class Edition(object):
+    """
+    One document rendered from the shared meeting data with its own config layered on the base configs
+
+    :param str name: Name of the edition used in the output filename
+    :param list configs: Config files or YAML strings to merge on top of the base configs
+    :param dict args: Runtime args with the base configs
+    """
+
+    def __init__(self, name, configs, args):
+        self.name = name
+        self.configs = configs
+        self.args = AttrDict(args, config=list(args.get('config') or []) + list(configs))
+        self.config = AttrDict(Config.load(self.args))
+
+    @classmethod
+    def parse(cls, value, args):
+        """
+        Returns an Edition from a `name=config1,config2` or `config` command line value.
+        Without a name, the edition is named after the last config file
+
+        :param str value: Edition value to parse
+        :param dict args: Runtime args with the base configs
+        :rtype: Edition
+        """
+        name, _, configs = value.partition('=') if '=' in value else ('', '', value)
+        configs = [cfg for cfg in configs.split(',') if cfg]
+        if not name:
+            if not configs:
+                raise ValueError(f'Edition "{value}" needs a name or a config')
+            name = path.splitext(path.basename(configs[-1]))[0]
+        return cls(name, configs, args)
+
+    def reload(self):
+        """
+        Loads the config again so edits to the config files are picked up.
+        Unchanged config files are not parsed again (see Config.load).
+        Returns True if the merged config changed
+
+        :rtype: bool
+        """
+        config = AttrDict(Config.load(self.args, setup_log=False))
+        changed = config.config_hash != self.config.config_hash
+        self.config = config
+        return changed
+
+    def __repr__(self):
+        return f'<Edition {self.name} {self.configs}>'
+
+
+def load_meetings(editions):
+    """
+    Loads each meeting data file used by the editions once and computes the derived meeting fields
+
+    :param list editions: Edition instances to load data for
+    :rtype: dict
+    """
+    meetings = {}
+    for edition in editions:
+        data_file = meetings_file(edition.config)
+        if data_file not in meetings:
+            if not path.isfile(data_file):
+                raise OSError(f'Meeting data file {data_file} not found! Please download first')
+            meetings[data_file] = MeetingSet.load(data_file, edition.config.get('normalized')).enrich()
+            logger.info(f'Loaded {len(meetings[data_file])} meetings from {data_file}')
+    return meetings
+
+
+def render_edition(edition, context, formats, output=OUTPUT, force=False):
+    """
+    Renders the edition's context in the given formats and writes the outputs.
+    Outputs whose build manifest shows no changed inputs are skipped unless forced.
+    Returns a report dict of the outputs written and the seconds taken
+
+    :param Edition edition: Edition to render
+    :param Context context: Context of the edition created from the loaded meetings
+    :param list formats: Output formats (pdf/html)
+    :param str output: Output filename pattern with {edition}, {format} and {date_str} fields
+    :param bool force: Render even if nothing changed since the last build
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    report = {'edition': edition.name, 'outputs': [], 'skipped': []}
+    template = edition.args.get('template')
+    prerendered = False
+    for fmt in formats:
+        outfile = output.format(edition=edition.name, format=fmt, date_str=edition.config.date_str)
+        options = {key: edition.args.get(key) for key in ('template', 'limit')}
+        manifest = BuildManifest(outfile, build_inputs(edition.config, options))
+        if not force and manifest.is_current():
+            report['skipped'].append(outfile)
+            continue
+        if not prerendered:
+            context.prerender()
+            prerendered = True
+        if fmt == 'pdf':
+            context.pdf(template, outfile)
+        else:
+            with atomic_open(outfile) as outobj:
+                context.stream(outobj, template)
+        manifest.save()
+        report['outputs'].append(outfile)
+        logger.info(f'Wrote to {outfile}')
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def render_group(indexes):
+    """
+    Renders the shared editions at the indexes one after another. Runs in forked worker processes.
+    Returns a list of (index, report) tuples
+    """
+    return [(idx, render_edition(shared['editions'][idx], shared['contexts'][idx], **shared['options']))
+            for idx in indexes]
+
+
+def group_editions(contexts):
+    """
+    Returns lists of edition indexes that can be rendered at the same time as the other lists.
+    Editions that write different cover or QR assets to the same asset_dir are put in one list
+    so they are rendered one after another
+
+    :param list contexts: Context of each edition
+    :rtype: list
+    """
+    by_dir = {}
+    for idx, context in enumerate(contexts):
+        by_dir.setdefault(context.config.asset_dir, []).append(idx)
+    groups = []
+    for indexes in by_dir.values():
+        if len({contexts[idx].asset_signature() for idx in indexes}) == 1:
+            groups.extend([idx] for idx in indexes)
+        else:
+            groups.append(indexes)
+    return groups
+
+
+def build(editions, formats=('pdf',), output=OUTPUT, force=False, jobs=1):
+    """
+    Loads the meeting data once and renders all the editions from it.
+    With jobs > 1 the editions are rendered in forked worker processes which inherit the loaded data and contexts.
+    Returns a report dict with per edition timings
+
+    :param list editions: Edition instances to render
+    :param list formats: Output formats (pdf/html)
+    :param str output: Output filename pattern with {edition}, {format} and {date_str} fields
+    :param bool force: Render even if nothing changed since the last build
+    :param int jobs: Number of worker processes to render with
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    meetings = load_meetings(editions)
+    contexts = [Context(edition.config, edition.args, meetings=meetings[meetings_file(edition.config)])
+                for edition in editions]
+    shared.update(editions=editions, contexts=contexts, options={'formats': formats, 'output': output, 'force': force})
+    load_seconds = time.perf_counter() - start
+    groups = [list(range(len(editions)))]
+    if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        groups = group_editions(contexts)
+    jobs = max(min(jobs, len(groups)), 1)
+    if jobs > 1:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            results = pool.map(render_group, groups)
+    else:
+        results = [render_group(group) for group in groups]
+    reports = [report for _, report in sorted(result for group in results for result in group)]
+    return {
+        'jobs': jobs,
+        'load_seconds': load_seconds,
+        'editions': reports,
+        'total_seconds': time.perf_counter() - start,
+        # separate runs would each load the data again
+        'sequential_estimate_seconds': sum(report['seconds'] + load_seconds for report in reports),
+    }
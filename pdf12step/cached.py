@@ -1,17 +1,25 @@
 import functools
+import sys
 
-if hasattr(functools, 'cached_property'):
+if sys.version_info >= (3, 12):
+    # no longer takes a lock since Python 3.12
     cached_property = functools.cached_property
 else:
-    # Python <3.7 backport
     _NOT_FOUND = object()
 
     class cached_property:
+        """
+        Property computed once per instance and stored in the instance __dict__ like functools.cached_property
+        but without its lock. functools.cached_property before Python 3.12 holds one lock per property for all
+        instances of the class, so threads computing the property of different instances wait for each other.
+        Here two threads that get a property of the same instance at the same time may both compute it,
+        but they all get the value stored first
+        """
+
         def __init__(self, func):
             self.func = func
             self.attrname = None
             self.__doc__ = func.__doc__
-            self.lock = functools.RLock()
 
         def __set_name__(self, owner, name):
             if self.attrname is None:
@@ -38,17 +46,14 @@ else:
                 raise TypeError(msg) from None
             val = cache.get(self.attrname, _NOT_FOUND)
             if val is _NOT_FOUND:
-                with self.lock:
-                    # check if another thread filled cache while we awaited lock
-                    val = cache.get(self.attrname, _NOT_FOUND)
-                    if val is _NOT_FOUND:
-                        val = self.func(instance)
-                        try:
-                            cache[self.attrname] = val
-                        except TypeError:
-                            msg = (
-                                f"The '__dict__' attribute on {type(instance).__name__!r} instance "
-                                f"does not support item assignment for caching {self.attrname!r} property."
-                            )
-                            raise TypeError(msg) from None
+                val = self.func(instance)
+                try:
+                    # setdefault is atomic so a value stored by another thread meanwhile wins
+                    val = cache.setdefault(self.attrname, val)
+                except (TypeError, AttributeError):
+                    msg = (
+                        f"The '__dict__' attribute on {type(instance).__name__!r} instance "
+                        f"does not support item assignment for caching {self.attrname!r} property."
+                    )
+                    raise TypeError(msg) from None
             return val
@@ -1,17 +1,21 @@
+import json
 import os
 import sys
 
 import click
-from jinja2 import Environment, FileSystemLoader, select_autoescape
 from yaml import safe_dump
 
 from pdf12step.adict import AttrDict
 from pdf12step.client import Client
-from pdf12step.config import ASSET_DIR, BASE_DIR, DATA_DIR, Config
+from pdf12step.config import (ASSET_DIR, BASE_DIR, BUILD_FORMATS, BUILD_OUTPUT, CACHE_DIR, DATA_DIR, SHARD_OUTPUT,
+                              Config)
 from pdf12step.log import logger
-from pdf12step.templating import Context
+from pdf12step.profiling import profiler
 from pdf12step.utils import booler, lister
 
+# Commands import the templating, build and web modules when they run so that --help, config and download
+# start without loading jinja2, weasyprint, qrcode/PIL, flask or IPython
+
 
 def prompt(name, title, default=None, cast=str):
     """
@@ -37,10 +41,36 @@ def ensure_config(ctx):
         raise click.Abort
 
 
+def build_manifest(ctx, outfile):
+    """
+    Returns the BuildManifest with the current input hashes for the outfile.
+    Returns None when rendering to stdout
+    """
+    from pdf12step.manifest import BuildManifest, build_inputs
+
+    if outfile == '-':
+        return
+    options = {key: ctx.obj.get(key) for key in ('template', 'limit')}
+    return BuildManifest(outfile, build_inputs(ctx.obj.configobj, options))
+
+
+def report_profile(table, json_file):
+    """
+    Prints the profile table to stderr and writes the JSON report once the command finished
+    """
+    if table:
+        click.echo(profiler.table(), err=True)
+    if json_file:
+        profiler.dump(json_file)
+    profiler.disable()
+
+
 def do_download(ctx):
-    sections = ctx.obj.sections.split(',') if hasattr(ctx.obj, 'sections') else Client.sections
+    sections = getattr(ctx.obj, 'sections', None)
+    sections = sections.split(',') if sections else Client.download_sections(ctx.obj.configobj)
     client = Client(ctx.obj.configobj.site_url, ctx.obj.configobj.api_url, ctx.obj.configobj.nonce_url)
-    client.download(sections, getattr(ctx.obj, 'format', 'json'), ctx.obj.data_dir, ctx.obj.configobj.site_domain)
+    client.download(sections, getattr(ctx.obj, 'format', 'json'), ctx.obj.data_dir, ctx.obj.configobj.site_domain,
+                    getattr(ctx.obj, 'incremental', False))
 
 
 @click.group('12step')
@@ -70,11 +100,30 @@ def do_download(ctx):
     type=click.Path(file_okay=False, resolve_path=True, dir_okay=True, exists=False),
     help='Asset directory to render static assets to',
 )
+@click.option(
+    '--cache-dir',
+    '-C',
+    default=CACHE_DIR,
+    envvar='PDF12STEP_CACHE_DIR',
+    type=click.Path(file_okay=False, resolve_path=True, dir_okay=True, exists=False),
+    help='Cache directory to store compiled templates and other build caches in',
+)
 @click.option('--logfile', default=None, help='Optional log file to wrie to')
+@click.option('--profile', is_flag=True, help='Print how long each stage of the run took to stderr')
+@click.option('--profile-json', default=None, type=click.Path(dir_okay=False),
+              help='Write how long each stage of the run took as JSON to this file')
+@click.option('--profile-stats', default=None, type=click.Path(file_okay=False),
+              help='Dump cProfile stats of each stage to this directory')
+@click.option('--profile-memory', is_flag=True, help='Record the peak memory of each stage with tracemalloc')
 @click.pass_context
-def cli(ctx, config, verbose, data_dir, asset_dir, logfile):
+def cli(ctx, config, verbose, data_dir, asset_dir, cache_dir, logfile, profile, profile_json, profile_stats,
+        profile_memory):
     ctx.ensure_object(dict)
-    ctx.obj.update(config=config, data_dir=data_dir, asset_dir=asset_dir, verbose=verbose, logfile=logfile)
+    if profile or profile_json or profile_stats or profile_memory:
+        profiler.enable(profile_stats, profile_memory)
+        ctx.call_on_close(lambda: report_profile(profile or profile_memory, profile_json))
+    ctx.obj.update(config=config, data_dir=data_dir, asset_dir=asset_dir, cache_dir=cache_dir, verbose=verbose,
+                   logfile=logfile)
     ctx.obj = AttrDict(ctx.obj)
     ctx.obj.configobj = AttrDict(Config.load(ctx.obj))
 
@@ -92,25 +141,29 @@ def config(ctx):
 @click.option('--download', '-d', is_flag=True, help='Download the assets before rendering. Produces up to date PDFs')
 @click.option('--limit', '-l', type=int, help='Limit the rendering to this number of meetings')
 @click.option('--template', '-t', default=None, envvar='PDF12STEP_TEMPLATE', help='Base template to render')
+@click.option('--force', '-f', is_flag=True, help='Render even if no inputs changed since the output was last built')
 @click.pass_context
 def html(ctx, **kwargs):
     """Formats meeting HTML"""
+    from pdf12step.templating import Context
+
     ensure_config(ctx.obj)
     ctx.obj.update(kwargs)
     if ctx.obj.download:
         do_download(ctx)
+    outfile = ctx.obj.output or f'{ctx.obj.configobj.date_str}.html'
+    manifest = build_manifest(ctx, outfile)
+    if manifest and not ctx.obj.force and manifest.is_current():
+        logger.info(f'{outfile} is up to date, use --force to rebuild')
+        return
     context = Context(ctx.obj.configobj, ctx.obj)
     context.prerender()
     content = context.render(kwargs['template'])
-    outfile = ctx.obj.output
-    if outfile is None:
-        outfile = open(f'{ctx.obj.configobj.date_str}.html', 'w')
-    elif outfile == '-':
-        outfile = sys.stdout.buffer
-    else:
-        outfile = open(outfile, 'w')
+    outfile = sys.stdout if outfile == '-' else open(outfile, 'w')
     outfile.write(content)
     outfile.close()
+    if manifest:
+        manifest.save()
     logger.info(f'Wrote to {outfile.name}')
 
 
@@ -119,50 +172,215 @@ def html(ctx, **kwargs):
 @click.option('--download', '-d', is_flag=True, help='Download the assets before rendering. Produces up to date PDFs')
 @click.option('--limit', '-l', type=int, help='Limit the rendering to this number of meetings')
 @click.option('--template', '-t', default=None, envvar='PDF12STEP_TEMPLATE', help='Base template to render')
+@click.option('--force', '-f', is_flag=True, help='Render even if no inputs changed since the output was last built')
+@click.option('--low-memory', is_flag=True, default=None,
+              help='Stream the HTML to disk and free the layout early to lower the peak memory use')
 @click.pass_context
 def pdf(ctx, **kwargs):
     """Formats meeting PDFs"""
+    from pdf12step.templating import Context
+
     ensure_config(ctx.obj)
     ctx.obj.update(kwargs)
     if ctx.obj.download:
         do_download(ctx)
+    outfile = ctx.obj.output or f'{ctx.obj.configobj.date_str}.pdf'
+    manifest = build_manifest(ctx, outfile)
+    if manifest and not ctx.obj.force and manifest.is_current():
+        logger.info(f'{outfile} is up to date, use --force to rebuild')
+        return
+    if ctx.obj.low_memory:
+        ctx.obj.configobj.low_memory = True
     context = Context(ctx.obj.configobj, ctx.obj)
     context.prerender()
-    content = context.pdf(kwargs['template'])
-    outfile = ctx.obj.output
-    if outfile is None:
-        outfile = open(f'{ctx.obj.configobj.date_str}.pdf', 'wb')
-    elif outfile == '-':
-        outfile = sys.stdout.buffer
-    else:
-        outfile = open(outfile, 'wb')
-    outfile.write(content)
-    outfile.close()
-    logger.info(f'Wrote to {outfile.name}')
+    context.pdf(kwargs['template'], sys.stdout.buffer if outfile == '-' else outfile)
+    if manifest:
+        manifest.save()
+    logger.info(f'Wrote to {outfile}')
+
+
+@cli.command()
+@click.option('--limit', '-l', type=int, help='Limit the rendering to this number of meetings')
+@click.option('--template', '-t', default=None, envvar='PDF12STEP_TEMPLATE', help='Base template to render')
+@click.option('--exact', is_flag=True, help='Lay out the whole document if its page count is not known yet')
+@click.option('--json', 'as_json', is_flag=True, help='Print the page counts as JSON')
+@click.pass_context
+def pages(ctx, **kwargs):
+    """
+    Prints the number of pages the PDF will have
+    The count is exact if the same document was built before, otherwise it is estimated from the page counts
+    of each section, which are cached so only changed sections are laid out
+    """
+    from pdf12step.templating import Context
+
+    ensure_config(ctx.obj)
+    ctx.obj.update(kwargs)
+    context = Context(ctx.obj.configobj, ctx.obj)
+    context.prerender()
+    count = context.page_count(kwargs['template'], kwargs['exact'])
+    if kwargs['as_json']:
+        click.echo(json.dumps(count, indent=2))
+        return
+    click.echo(f"{count['pages']} pages{'' if count['exact'] else ' (estimated)'}")
+    for section, pages in count['sections'].items():
+        click.echo(f'  {section:<20} {pages}')
+
+
+@cli.command()
+@click.argument('editions', nargs=-1, required=True)
+@click.option('--output', '-o', default=BUILD_OUTPUT, show_default=True,
+              help='Output file name pattern with {edition}, {format} and {date_str} fields')
+@click.option('--format', 'formats', multiple=True, type=click.Choice(BUILD_FORMATS), default=('pdf',), show_default=True,
+              help='Output format to render for every edition. Can pass multiple')
+@click.option('--download', '-d', is_flag=True, help='Download the assets before rendering. Produces up to date PDFs')
+@click.option('--limit', '-l', type=int, help='Limit the rendering to this number of meetings')
+@click.option('--template', '-t', default=None, envvar='PDF12STEP_TEMPLATE', help='Base template to render')
+@click.option('--force', '-f', is_flag=True, help='Render even if no inputs changed since the output was last built')
+@click.option('--jobs', '-j', type=int, default=1, help='Number of worker processes to render editions in')
+@click.pass_context
+def build(ctx, editions, **kwargs):
+    """
+    Renders several editions from one load of the meeting data
+    Each EDITION is name=config1,config2 or just a config file, merged on top of the --config files.
+    Use name= for an edition of just the --config files. Eg: 12step -c site.yml build online= print=print.yml
+    """
+    from pdf12step.build import Edition, build as build_editions
+
+    ensure_config(ctx.obj)
+    args = {key: value for key, value in ctx.obj.items() if key != 'configobj'}
+    args.update(limit=kwargs['limit'], template=kwargs['template'])
+    ctx.obj.update(kwargs)
+    if ctx.obj.download:
+        do_download(ctx)
+    editions = [Edition.parse(edition, args) for edition in editions]
+    report = build_editions(editions, kwargs['formats'], kwargs['output'], kwargs['force'], kwargs['jobs'])
+    for edition in report['editions']:
+        outputs = ', '.join(edition['outputs'] + [f'{name} (unchanged)' for name in edition['skipped']])
+        click.echo(f"{edition['edition']:<20} {edition['seconds']:8.2f}s  {outputs}")
+    click.echo(f"{'load data':<20} {report['load_seconds']:8.2f}s")
+    click.echo(f"{'total':<20} {report['total_seconds']:8.2f}s  with {report['jobs']} job(s), "
+               f"about {report['sequential_estimate_seconds']:.2f}s as separate runs")
+
+
+@cli.command()
+@click.option('--by', 'attr', default='region_display', show_default=True,
+              help='Meeting attribute to render a document per value of, any attribute usable with by_value')
+@click.option('--output', '-o', default=SHARD_OUTPUT, show_default=True,
+              help='Output file name pattern with {shard}, {format} and {date_str} fields')
+@click.option('--format', 'formats', multiple=True, type=click.Choice(BUILD_FORMATS), default=('pdf',), show_default=True,
+              help='Output format to render for every shard. Can pass multiple')
+@click.option('--index', default=None, type=click.Path(dir_okay=False),
+              help='JSON file to write the index of shards to. Defaults to the output pattern with shards.json')
+@click.option('--download', '-d', is_flag=True, help='Download the assets before rendering. Produces up to date PDFs')
+@click.option('--template', '-t', default=None, envvar='PDF12STEP_TEMPLATE', help='Base template to render')
+@click.option('--force', '-f', is_flag=True, help='Render even if no inputs changed since the output was last built')
+@click.option('--jobs', '-j', type=int, default=1, help='Number of worker processes to render shards in')
+@click.pass_context
+def shard(ctx, **kwargs):
+    """
+    Renders a small directory for each value of a meeting attribute, eg one per region.
+    Eg: 12step -c site.yml shard --by region_display -j 4
+    """
+    from pdf12step.shard import shard as render_shards
+
+    ensure_config(ctx.obj)
+    ctx.obj.update(kwargs)
+    if ctx.obj.download:
+        do_download(ctx)
+    args = {key: value for key, value in ctx.obj.items() if key != 'configobj'}
+    report = render_shards(ctx.obj.configobj, args, kwargs['attr'], kwargs['formats'], kwargs['output'],
+                           kwargs['index'], kwargs['force'], kwargs['jobs'])
+    for entry in report['shards']:
+        outputs = ', '.join(entry['outputs'] + [f'{name} (unchanged)' for name in entry['skipped']])
+        pages = f"{entry['pages']:>4} pages" if entry.get('pages') else ' ' * 10
+        click.echo(f"{entry['value']:<30} {entry['meetings']:5} meetings {pages} {entry['seconds']:8.2f}s  {outputs}")
+    click.echo(f"{'load data':<30} {report['load_seconds']:8.2f}s")
+    click.echo(f"{'total':<30} {report['total_seconds']:8.2f}s  with {report['jobs']} job(s)")
+
+
+@cli.command()
+@click.argument('editions', nargs=-1, required=True)
+@click.option('--output', '-o', default=BUILD_OUTPUT, show_default=True,
+              help='Output file name pattern with {edition}, {format} and {date_str} fields')
+@click.option('--format', 'formats', multiple=True, type=click.Choice(BUILD_FORMATS), default=('pdf',), show_default=True,
+              help='Output format to render for every edition. Can pass multiple')
+@click.option('--interval', '-i', type=float, default=900, show_default=True, help='Seconds between checks of each site')
+@click.option('--jitter', type=float, default=0.1, show_default=True,
+              help='Fraction of the interval to randomly shift each check by')
+@click.option('--max-queue', type=int, default=16, show_default=True, help='Number of editions that can wait to rebuild')
+@click.option('--status', 'status_file', default=None, type=click.Path(dir_okay=False),
+              help='JSON file to record the last checks and builds in. Defaults to watch.json in the cache dir')
+@click.option('--once', is_flag=True, help='Check each site once, rebuild the changed editions and exit')
+@click.pass_context
+def watch(ctx, editions, **kwargs):
+    """
+    Polls the meeting data of each site and rebuilds editions when it changes.
+    Each EDITION is name=config1,config2 or just a config file like the build command.
+    Editions are only rebuilt when their meetings data, config or templates changed since they were built
+    """
+    from pdf12step.build import Edition
+    from pdf12step.watch import Watcher
+
+    ensure_config(ctx.obj)
+    args = {key: value for key, value in ctx.obj.items() if key != 'configobj'}
+    status_file = kwargs['status_file'] or os.path.join(ctx.obj.configobj.cache_dir, 'watch.json')
+    os.makedirs(os.path.dirname(os.path.abspath(status_file)), exist_ok=True)
+    watcher = Watcher([Edition.parse(edition, args) for edition in editions], kwargs['formats'], kwargs['output'],
+                      kwargs['interval'], kwargs['jitter'], kwargs['max_queue'], status_file)
+    try:
+        watcher.run(kwargs['once'])
+    except KeyboardInterrupt:
+        click.echo('Stopped watching')
 
 
 @cli.command()
 @click.option('-a', '--address', default='0.0.0.0', help='The host interface address to bind to')
 @click.option('-p', '--port', type=int, default=5000, help='The port to bind to')
+@click.option('-s', '--site', 'sites', multiple=True,
+              help='Site to also serve, as name=config1,config2 merged on top of the --config files. Can pass multiple')
 @click.pass_context
-def flask(ctx, **kwargs):
+def flask(ctx, sites, **kwargs):
     """
     Run Flask webapp for Development.
     This should never be run in production!
-    You must restart this if you make any changes to code or asset file
+    You must restart this if you make any changes to code or asset file.
+    Each --site is served at /sites/<name>/ and to requests for its name or site_domain host
     """
     ensure_config(ctx.obj)
     ctx.obj.update(kwargs)
+    from pdf12step.build import Edition
     from pdf12step.flask_app import app
+    from pdf12step.templating import bytecode_cache
 
     os.environ['FLASK_APP'] = __name__
     app.pdfconfig = ctx.obj.configobj
+    app.pdfargs = {key: value for key, value in ctx.obj.items() if key != 'configobj'}
+    app.sites = {site.name: site for site in (Edition.parse(value, app.pdfargs) for value in sites)}
+    app.jinja_env.bytecode_cache = bytecode_cache(ctx.obj.configobj.cache_dir)
     app.run(ctx.obj.address, ctx.obj.port)
 
 
+@cli.command('compile-templates')
+@click.pass_context
+def compile_templates(ctx):
+    """
+    Precompiles templates into python modules in the cache dir
+    Compiles the package templates and any template_dirs. Templates changed after compiling are loaded from source
+    """
+    from pdf12step.loaders import compile_templates as compile_env
+    from pdf12step.templating import get_env
+
+    compiled_dir = os.path.join(ctx.obj.configobj.cache_dir, 'compiled')
+    names = compile_env(get_env(ctx.obj.configobj, compiled=False), compiled_dir)
+    click.echo(f'Compiled {len(names)} templates to {compiled_dir}')
+
+
 @cli.command()
 @click.option('-f', '--format', default='json', type=click.Choice(('json', 'csv')), help='Format of downloaded meeting data')
-@click.option('-s', '--sections', default=','.join(Client.sections), help='Comma separated list of sections to download')
+@click.option('-s', '--sections', default=None,
+              help='Comma separated list of sections to download, defaults to meetings or all with normalized: true')
+@click.option('-i', '--incremental', is_flag=True,
+              help='Merge changed records into the previous JSON download and log the changed ids')
 @click.pass_context
 def download(ctx, **kwargs):
     """
@@ -182,6 +400,8 @@ def init(ctx, **kwargs):
     Prompts you to create a custom config
     Iniitialize your custom configuration interactively by answering a few questions
     """
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
     ctx.obj.update(kwargs)
     sections = [
         ('Data Gathering', [('site_url', 'Site URL running 12 Step Meeting WordPress plugin')]),
@@ -246,6 +466,7 @@ def shell(ctx, **kwargs):
     Contains the context, config and meetings instances
     """
     from IPython import embed
+    from pdf12step.templating import Context
 
     ensure_config(ctx.obj)
     ctx.obj.update(kwargs)
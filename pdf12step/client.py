@@ -1,11 +1,12 @@
 import re
-import requests
 import os
 
 from pdf12step.cached import cached_property
 from pdf12step.config import DATA_DIR
+from pdf12step.delta import update
 from pdf12step.utils import csv_dump, json_dump
 from pdf12step.log import logger
+from pdf12step.profiling import span
 
 
 DEFAULTS = {
@@ -23,7 +24,9 @@ class Client(object):
 
     :param str url: Base URL of the WP site to gather data from
     """
-    sections = ('meetings',)  # 'locations', 'groups', 'regions') these arent necessary for now
+    sections = ('meetings',)
+    # the locations, groups and regions are only needed by the normalized model
+    normalized_sections = ('meetings', 'locations', 'groups', 'regions')
     nonce_url = api_url = None
 
     def __init__(self, site_url, api_url, nonce_url=None, api_key=None):
@@ -38,6 +41,16 @@ class Client(object):
         if api_url:
             self.api_url = api_url if api_url.startswith('http') else f'{site_url}/{api_url}'
 
+    @classmethod
+    def download_sections(cls, config):
+        """
+        Returns the sections to download for the config, all of them with config.normalized
+
+        :param dict config: Merged Config
+        :rtype: tuple
+        """
+        return cls.normalized_sections if config.get('normalized') else cls.sections
+
     @cached_property
     def nonce(self):
         """
@@ -46,6 +59,8 @@ class Client(object):
 
         :rtype: str
         """
+        import requests
+
         response = requests.get(self.nonce_url, headers=HEADERS)
         response.raise_for_status()
         content = response.content.decode()
@@ -54,6 +69,8 @@ class Client(object):
             return match.groups()[0]
 
     def _dispatch(self, method, url, *args, **kwargs):
+        import requests
+
         if not url.startswith('http'):
             url = f'{self.site_url}/{url}'
         logger.info(f'{method.upper()} {url} {args}')
@@ -126,12 +143,16 @@ class Client(object):
         """
         return self.tsml('regions')
 
-    def download(self, sections=None, format='json', data_dir=DATA_DIR, prefix=None):
+    @span('download')
+    def download(self, sections=None, format='json', data_dir=DATA_DIR, prefix=None, incremental=False):
         """
         Downloads all the TSML endpoints meeting data to the DATA_DIR destination.
+        Incremental JSON downloads are merged into the previous file by record id, which is only written
+        when records were added, changed or removed, and the changed ids are logged next to it
 
         :param tuple sections: Specific sections to download (eg meetings)
         :param str format: Which format to load the data in (eg json/csv)
+        :param bool incremental: Merge into the previous download instead of replacing it
         """
         if sections is None:
             sections = self.sections
@@ -142,8 +163,12 @@ class Client(object):
         for section in sections:
             if not hasattr(self, section):
                 raise ValueError(f'Section {section} not known')
-            data = getattr(self, section)()
+            with span(f'download {section}'):
+                data = getattr(self, section)()
             fname = f'{prefix}-{section}.{format}' if prefix else f'{section}.{format}'
             outfile = os.path.join(data_dir, fname)
+            if incremental and format == 'json':
+                update(outfile, data)
+                continue
             json_dump(data, outfile) if format == 'json' else csv_dump(data, outfile)
             logger.info(f'Downloaded {outfile}')
@@ -1,17 +1,29 @@
+import copy
 import os
+from collections import OrderedDict
 from datetime import datetime
+from threading import Lock
 from urllib.parse import urlparse
 
 from pdf12step.adict import AttrDict
-from pdf12step.utils import yaml_load
+from pdf12step.utils import checksum, file_stamp, yaml_load
 from pdf12step.log import logger, setup_logging
+from pdf12step.profiling import span
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.getenv('PDF12STEP_DATA_DIR', 'data'))
 ASSET_DIR = os.path.abspath(os.getenv('PDF12STEP_ASSET_DIR', 'assets'))
+CACHE_DIR = os.path.abspath(os.getenv('PDF12STEP_CACHE_DIR', 'cache'))
 CONFIG_FILE = os.getenv('PDF12STEP_CONFIG', 'config.yaml')
 BASE_TEMPLATE = os.getenv('PDF12STEP_BASE_TEMPLATE', 'layout.html')
 LIST_TEMPLATE = os.getenv('PDF12STEP_LIST_TEMPLATE', 'list_2sections.html')
+RUNTIME_KEYS = ('verbose', 'logfile', 'low_memory', 'context_cache_size', 'pdf_workers',
+                'output_cache_mb', 'shared_data')
+# merged config keys left out of the config hash
+DERIVED_KEYS = ('config_hash',)
+BUILD_OUTPUT = '{date_str}.{edition}.{format}'
+SHARD_OUTPUT = '{date_str}.{shard}.{format}'
+BUILD_FORMATS = ('pdf', 'html')
 DEFAULT_CODES = {
     '11': '11th Step Meditation',
     '12x12': '12 Steps & 12 Traditions',
@@ -74,6 +86,56 @@ DEFAULT_CODES = {
 }
 
 
+def config_checksum(config):
+    """
+    Returns a stable hash of the merged config values that affect rendering.
+    Leaves out runtime only options like verbose and logfile
+
+    :param dict config: Merged Config
+    :rtype: str
+    """
+    return checksum({key: value for key, value in config.items()
+                     if key not in RUNTIME_KEYS and key not in DERIVED_KEYS})
+
+
+# config files by absolute path -> (modification time and size, text, parsed YAML), only the latest stamp of each
+config_files = {}
+# least recently used merged configs by the hash of the args and the config file stamps, without the date_str
+merged_configs = OrderedDict()
+# number of merged configs to keep, eg for the args of the sites and jobs of the web app
+MAX_MERGED_CONFIGS = 32
+config_lock = Lock()
+
+
+def read_config_file(filename):
+    """
+    Returns the text and the parsed YAML of a config file.
+    The file is only read and parsed again when its modification time or size changed
+
+    :param str filename: YAML config file
+    :rtype: tuple
+    """
+    filename = os.path.abspath(filename)
+    stamp = file_stamp(filename)
+    with config_lock:
+        cached = config_files.get(filename)
+    if cached and cached[0] == stamp:
+        return cached[1], cached[2]
+    with open(filename) as cfile:
+        text = cfile.read()
+    data = yaml_load(text)
+    with config_lock:
+        config_files[filename] = (stamp, text, data)
+    return text, data
+
+
+def config_stamp(config_opt):
+    """
+    Returns what identifies the content of a config option, the file stamp for files and the YAML string itself
+    """
+    return file_stamp(config_opt) if os.path.isfile(config_opt) else config_opt
+
+
 def merge(dct, merge_dct):
     """ Recursive dict merge. Inspired by :meth:``dict.update()``, instead of
     updating only top-level keys, dict_merge recurses down into dicts nested
@@ -127,6 +189,15 @@ class Config(AttrDict):
         'stylesheets': [],
         'template_dirs': [],
         'asset_dir': ASSET_DIR,
+        'cache_dir': CACHE_DIR,
+        'row_cache': True,
+        'group_cache': True,
+        'low_memory': False,
+        'context_cache_size': 8,
+        'pdf_workers': 2,
+        'output_cache_mb': 256,
+        'shared_data': True,
+        'normalized': False,
         'qrcode_url': None,
         'notes_pages': 0,
         'even_pages': True,
@@ -138,22 +209,54 @@ class Config(AttrDict):
     }
 
     @classmethod
-    def load(cls, args):
+    @span('config load')
+    def load(cls, args, setup_log=True):
         """
-        Loads the config from defaults, file and args in that order
+        Loads the config from defaults, file and args in that order.
+        The merged config is cached by the args and the modification time and size of the config files,
+        so loading the same unchanged configs again does not read or parse any YAML.
+        The `config_hash` of the merged config can be used as a cache key for it
 
         :param dict args: Args override pass for runtime overrides
+        :param bool setup_log: Set up the logging from the args, off in long running servers that set it up once
         """
-        config = {}
         if not isinstance(args, dict):
             args = args.__dict__ if hasattr(args, '__dict__') else dict(args)
-        setup_logging(args)
-        merge(config, cls._defaults)  # load sane defaults
+        if setup_log:
+            setup_logging(args)
         if 'config' not in args or args['config'] is None:
             args['config'] = [cls._defaults['config_file']]
+        key = checksum([args, [config_stamp(config_opt) for config_opt in args['config']]])
+        with config_lock:
+            config = merged_configs.get(key)
+            if config is not None:
+                merged_configs.move_to_end(key)
+        if config is None:
+            config = cls.merge_configs(args)
+            with config_lock:
+                merged_configs[key] = config
+                while len(merged_configs) > MAX_MERGED_CONFIGS:
+                    merged_configs.popitem(last=False)
+        else:
+            logger.info(f'Using cached config of {args["config"]}')
+        config = copy.deepcopy(config)
+        config['date_str'] = datetime.now().strftime(config['date_fmt'])
+        config['config_hash'] = config_checksum(config)
+        return config
+
+    @classmethod
+    def merge_configs(cls, args):
+        """
+        Returns the defaults merged with the config files and args without the date_str
+
+        :param dict args: Runtime args with the config files
+        :rtype: dict
+        """
+        config = copy.deepcopy(cls._defaults)  # load sane defaults
         for config_opt in args['config']:
             logger.info(f'Loaded config option "{config_opt}"')
-            merge(config, yaml_load(config_opt))
+            data = read_config_file(config_opt)[1] if os.path.isfile(config_opt) else yaml_load(config_opt)
+            merge(config, copy.deepcopy(data))
         merge(config, args)  # runtime
         logger.debug(f'Loaded runtime options {args}')
         for key, value in config.items():
@@ -163,5 +266,4 @@ class Config(AttrDict):
         meetingcodes = config['meetingcodes'].copy()
         meetingcodes.update(DEFAULT_CODES)
         config['meetingcodes'] = meetingcodes
-        config['date_str'] = datetime.now().strftime(config['date_fmt'])
         return config
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from threading import Lock
+
+from pdf12step.config import config_checksum
+from pdf12step.log import logger
+from pdf12step.manifest import data_files
+from pdf12step.templating import Context
+from pdf12step.utils import SingleFlight, checksum, file_stamp
+
+
+def data_stamp(config):
+    """
+    Returns the modification time and size of the meetings data file or None if it is missing,
+    a list of them for each data file with config.normalized
+
+    :param dict config: Config with data_dir and site_domain
+    :rtype: list
+    """
+    stamps = [file_stamp(filename) for filename in data_files(config)]
+    return stamps[0] if len(stamps) == 1 else stamps
+
+
+class ContextCache(object):
+    """
+    Least recently used cache of Context instances shared by all the threads of a process.
+    Contexts are keyed by the request args, the merged config and the meetings data file modification time,
+    so new args, config edits and downloaded data get a new Context while repeated requests reuse the loaded one.
+    Only one thread builds the Context of a key while other threads asking for the same key wait for it
+
+    :param int maxsize: Number of contexts to keep
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.contexts = OrderedDict()
+        self.building = SingleFlight()
+        self.lock = Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def key(self, config, args):
+        """
+        Returns the cache key of the config and runtime args
+
+        :param dict config: Merged Config
+        :param dict args: Runtime args, eg request args
+        :rtype: str
+        """
+        args = {str(name): str(value).strip() for name, value in args.items() if value not in (None, '')}
+        return checksum([args, config.get('config_hash') or config_checksum(config), data_stamp(config)])
+
+    def get(self, config, args):
+        """
+        Returns the cached Context for the config and args, creating it if it is not cached
+
+        :param dict config: Merged Config
+        :param dict args: Runtime args, eg request args
+        :rtype: Context
+        """
+        key = self.key(config, args)
+        with self.lock:
+            if key in self.contexts:
+                return self.hit(key)
+        with self.building(key):
+            with self.lock:
+                if key in self.contexts:
+                    return self.hit(key)
+            context = Context(config, args)
+            with self.lock:
+                self.misses += 1
+                self.contexts[key] = context
+                while len(self.contexts) > self.maxsize:
+                    self.contexts.popitem(last=False)
+                    self.evictions += 1
+        logger.info(f'Context cache miss, {len(self.contexts)} contexts cached')
+        return context
+
+    def hit(self, key):
+        # called with the lock held
+        self.hits += 1
+        self.contexts.move_to_end(key)
+        return self.contexts[key]
+
+    def clear(self):
+        """
+        Drops all the cached contexts, eg after the config files were edited
+        """
+        with self.lock:
+            self.contexts.clear()
+            self.invalidations += 1
+        logger.info('Context cache cleared')
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """
+        Returns the hit/miss, eviction and invalidation counts, the hit rate and the cache size
+
+        :rtype: dict
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate, 'evictions': self.evictions,
+                    'invalidations': self.invalidations, 'size': len(self.contexts), 'maxsize': self.maxsize}
@@ -0,0 +1,320 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from os import makedirs, path
+
+from pdf12step.cached import cached_property
+from pdf12step.log import logger
+from pdf12step.meetings import Meeting, MeetingSet
+from pdf12step.utils import atomic_open, file_stamp
+
+MAGIC = b'P12STEP1'
+VERSION = 1
+# Meeting attributes with an index of the rows of each of their values, the ones the list sections group by
+INDEXES = ('day', 'region_display', 'attendance_option')
+# string id of the fields a meeting does not have
+MISSING = 0xFFFFFFFF
+# tags of the encoded values in the string table
+STR, JSON = ord('s'), ord('j')
+# values of the string table not decoded yet
+UNDECODED = object()
+# datasets attached by this process by filename
+attached = {}
+
+
+def dataset_file(data_file, cache_dir=None):
+    """
+    Returns the filename of the shared dataset of a data file in the datasets folder of the cache_dir,
+    eg `cache/datasets/example.com-meetings.dataset`, or next to the data file without a cache_dir
+
+    :param str data_file: Downloaded data file
+    :param str cache_dir: Project cache directory (config.cache_dir)
+    :rtype: str
+    """
+    name = f'{path.splitext(path.basename(data_file))[0]}.dataset'
+    return path.join(cache_dir, 'datasets', name) if cache_dir else path.join(path.dirname(data_file), name)
+
+
+def derived_fields():
+    """
+    Returns the names of the cached derived Meeting fields
+    """
+    return [name for name, attr in vars(Meeting).items() if isinstance(attr, cached_property)]
+
+
+def encode(value):
+    if isinstance(value, str):
+        return bytes([STR]) + value.encode()
+    return bytes([JSON]) + json.dumps(value).encode()
+
+
+def padding(size):
+    """
+    Returns the number of bytes that align a section of the size to 8 bytes
+    """
+    return -size % 8
+
+
+def publish(data_file, filename):
+    """
+    Writes the meetings of the data file with their derived fields computed to a dataset file that
+    processes map into memory and read without parsing it.
+    Every distinct value is stored once in a string table and each meeting is a row of ids into it.
+    The rows of each value of the INDEXES attributes are stored too, so groups are read without a scan.
+    Returns the dataset filename
+
+    :param str data_file: Downloaded meetings data file
+    :param str filename: Dataset file to write
+    :rtype: str
+    """
+    stamp = file_stamp(data_file)
+    meetings = MeetingSet(data_file).enrich()
+    derived = derived_fields()
+    fields = []
+    for meeting in meetings:
+        fields.extend(name for name in meeting if name not in fields)
+    strings, ids = [], {}
+
+    def string_id(value):
+        encoded = encode(value)
+        if encoded not in ids:
+            ids[encoded] = len(strings)
+            strings.append(encoded)
+        return ids[encoded]
+
+    rows = array('I')
+    for meeting in meetings:
+        rows.extend(string_id(meeting[name]) if name in meeting else MISSING for name in fields)
+        rows.extend(string_id(getattr(meeting, name)) for name in derived)
+    index, indexes = array('I'), {}
+    for attr in INDEXES:
+        groups = {}
+        for row, meeting in enumerate(meetings):
+            values = getattr(meeting, attr)
+            for value in values if isinstance(values, list) else [values]:
+                groups.setdefault(str(value), []).append(row)
+        indexes[attr] = []
+        for value, group in sorted(groups.items()):
+            indexes[attr].append([value, len(index), len(group)])
+            index.extend(group)
+    offsets = array('Q', [0])
+    for encoded in strings:
+        offsets.append(offsets[-1] + len(encoded))
+    sections = [('offsets', offsets.tobytes()), ('rows', rows.tobytes()), ('index', index.tobytes()),
+                ('strings', b''.join(strings))]
+    header = json.dumps({
+        'version': VERSION,
+        'byteorder': sys.byteorder,
+        'stamp': stamp,
+        'rows': len(meetings),
+        'fields': fields,
+        'derived': derived,
+        'indexes': indexes,
+        'sections': [[name, len(data)] for name, data in sections],
+    }).encode()
+    makedirs(path.dirname(filename) or '.', exist_ok=True)
+    with atomic_open(filename, 'wb') as dfile:
+        dfile.write(MAGIC + struct.pack('<Q', len(header)) + header + b'\0' * padding(len(header)))
+        for name, data in sections:
+            dfile.write(data + b'\0' * padding(len(data)))
+    logger.info(f'Published {len(meetings)} meetings with {len(strings)} distinct values to {filename}')
+    return filename
+
+
+class SharedDataset(object):
+    """
+    Meetings dataset written by :func:`publish` mapped read only into memory.
+    Attaching only reads the header, so any number of processes share one copy of the data in the page cache.
+    Meetings are built from their rows when asked for, with their derived fields already set.
+    Each distinct string is decoded once per process and shared by all the meetings that have it,
+    lists and dicts are decoded for every meeting so no two meetings share a mutable value
+
+    :param str filename: Dataset file
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as dfile:
+            self.mmap = mmap.mmap(dfile.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{filename} is not a meetings dataset')
+        start = len(MAGIC) + 8
+        size, = struct.unpack_from('<Q', view, len(MAGIC))
+        self.header = json.loads(bytes(view[start:start + size]))
+        start += size + padding(size)
+        sections = {}
+        for name, size in self.header['sections']:
+            sections[name] = view[start:start + size]
+            start += size + padding(size)
+        self.offsets = sections['offsets'].cast('Q')
+        self.rows = sections['rows'].cast('I')
+        self.index = sections['index'].cast('I')
+        self.strings = sections['strings']
+        self.fields = self.header['fields']
+        self.positions = {name: pos for pos, name in enumerate(self.fields)}
+        self.derived = self.header['derived']
+        self.width = len(self.fields) + len(self.derived)
+        self.values = [UNDECODED] * (len(self.offsets) - 1)
+
+    def __len__(self):
+        return self.header['rows']
+
+    def is_current(self, data_file):
+        """
+        Returns True if the dataset was published from the data file as it is now by this version
+
+        :param str data_file: Downloaded meetings data file
+        :rtype: bool
+        """
+        return (self.header['version'] == VERSION and self.header['byteorder'] == sys.byteorder and
+                self.header['derived'] == derived_fields() and self.header['stamp'] == file_stamp(data_file))
+
+    def value(self, sid):
+        """
+        Returns the decoded value of the string id.
+        Immutable values are kept for the next call, lists and dicts are decoded again on every call
+        """
+        value = self.values[sid]
+        if value is UNDECODED:
+            data = self.strings[self.offsets[sid]:self.offsets[sid + 1]]
+            if data[0] == STR:
+                value = str(data[1:], 'utf8')
+            else:
+                value = json.loads(bytes(data[1:]))
+                if isinstance(value, (list, dict)):
+                    return Meeting.fromdict(value)
+            self.values[sid] = value
+        return value
+
+    def meeting(self, row):
+        """
+        Returns the Meeting of the row with its derived fields set
+
+        :param int row: Row number
+        :rtype: Meeting
+        """
+        start = row * self.width
+        ids = self.rows[start:start + self.width]
+        nfields = len(self.fields)
+        values, value = self.values, self.value
+        # set up like Meeting(record, default='') without converting the values again
+        meeting = Meeting.__new__(Meeting)
+        meeting.__dict__.update(_has_default=True, _default='')
+        for name, sid in zip(self.fields, ids[:nfields]):
+            if sid != MISSING:
+                meeting[name] = value(sid) if values[sid] is UNDECODED else values[sid]
+        for name, sid in zip(self.derived, ids[nfields:]):
+            meeting.__dict__[name] = value(sid) if values[sid] is UNDECODED else values[sid]
+        return meeting
+
+    def field(self, row, name):
+        """
+        Returns the value of a field of the row without building its Meeting, '' if the meeting does not have it
+
+        :param int row: Row number
+        :param str name: Field name
+        """
+        sid = self.rows[row * self.width + self.positions[name]] if name in self.positions else MISSING
+        return '' if sid == MISSING else self.value(sid)
+
+    def meetings(self, rows=None):
+        """
+        Returns a lazy MeetingSet of the rows, all the meetings by default
+
+        :param list rows: Row numbers
+        :rtype: DatasetMeetingSet
+        """
+        return DatasetMeetingSet(self, range(len(self)) if rows is None else rows)
+
+    def groups(self, attr):
+        """
+        Returns the sorted (value, rows) tuples of an indexed attribute like MeetingSet.by_value without a scan
+
+        :param str attr: One of the INDEXES attributes
+        :rtype: list
+        """
+        return [(value, self.index[start:start + count]) for value, start, count in self.header['indexes'][attr]]
+
+    def by_value(self, attr):
+        """
+        Returns the sorted (value, MeetingSet) tuples of an indexed attribute without building any meeting
+
+        :param str attr: One of the INDEXES attributes
+        :rtype: list
+        """
+        return [(value, self.meetings(rows)) for value, rows in self.groups(attr)]
+
+
+class DatasetMeetingSet(MeetingSet):
+    """
+    MeetingSet of rows of a SharedDataset that builds its meetings the first time they are iterated.
+    Counting, limiting, joining, listing the ids and grouping by the INDEXES attributes read the rows
+    and the indexes of the dataset without building any meeting
+
+    :param SharedDataset dataset: Dataset the rows belong to
+    :param rows: Row numbers, a range for all the meetings
+    """
+
+    def __init__(self, dataset, rows):
+        super().__init__(None)
+        self.dataset = dataset
+        self.rows = rows
+
+    @cached_property
+    def items(self):
+        return [self.dataset.meeting(row) for row in self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __add__(self, other):
+        if isinstance(other, DatasetMeetingSet) and other.dataset is self.dataset:
+            return DatasetMeetingSet(self.dataset, list(self.rows) + list(other.rows))
+        return super().__add__(other)
+
+    def limit(self, num):
+        return DatasetMeetingSet(self.dataset, self.rows[:num])
+
+    def ids(self):
+        return [str(value) if value else None for value in (self.dataset.field(row, 'id') for row in self.rows)]
+
+    def by_value(self, attr, sort=True, limit=None, cast=str, reverse=False):
+        if attr not in INDEXES or limit or cast is not str:
+            return super().by_value(attr, sort=sort, limit=limit, cast=cast, reverse=reverse)
+        members = None if isinstance(self.rows, range) and len(self.rows) == len(self.dataset) else set(self.rows)
+        result = []
+        for value, rows in self.dataset.groups(attr):
+            if members is not None:
+                rows = [row for row in rows if row in members]
+            if len(rows):
+                result.append((value, DatasetMeetingSet(self.dataset, rows)))
+        return result[::-1] if reverse else result
+
+
+def attach(data_file, cache_dir=None):
+    """
+    Returns the shared dataset of the data file, publishing it first if it is missing or older than the data file.
+    Datasets stay attached for the life of the process and are attached again when their data file changes
+
+    :param str data_file: Downloaded meetings data file
+    :param str cache_dir: Project cache directory to keep the dataset in
+    :rtype: SharedDataset
+    """
+    filename = dataset_file(data_file, cache_dir)
+    dataset = attached.get(filename)
+    if dataset is not None and dataset.is_current(data_file):
+        return dataset
+    dataset = None
+    if path.isfile(filename):
+        try:
+            dataset = SharedDataset(filename)
+        except ValueError as exc:
+            logger.warning(exc)
+    if dataset is None or not dataset.is_current(data_file):
+        dataset = SharedDataset(publish(data_file, filename))
+    attached[filename] = dataset
+    logger.info(f'Attached {len(dataset)} meetings from {filename}')
+    return dataset
@@ -0,0 +1,119 @@
+import json
+import time
+from os import path
+
+from pdf12step.fragments import MAX_AGE
+from pdf12step.log import logger
+from pdf12step.utils import atomic_open, checksum, file_stamp
+
+
+def record_key(record):
+    """
+    Returns the id of a TSML record or the hash of its contents if it has no id.
+    Identical records without an id have the same key, so they are one entry of a change
+    """
+    return str(record['id']) if record.get('id') is not None else checksum(record)
+
+
+def merge(old, new):
+    """
+    Merges the new feed into the old snapshot by record id.
+    Records keep their old contents unless their `updated` timestamp changed (or their contents when they have none).
+    Returns the merged records in the order of the new feed and the ids added, changed and removed
+
+    :param list old: Records of the previous snapshot
+    :param list new: Records of the new feed
+    :rtype: tuple
+    """
+    previous = {record_key(record): record for record in old}
+    merged, added, changed = [], [], []
+    seen = set()
+    for record in new:
+        key = record_key(record)
+        seen.add(key)
+        old_record = previous.get(key)
+        if old_record is None:
+            added.append(key)
+        elif 'updated' in record or 'updated' in old_record:
+            if record.get('updated') == old_record.get('updated'):
+                record = old_record
+            else:
+                changed.append(key)
+        elif record != old_record:
+            changed.append(key)
+        merged.append(record)
+    removed = [key for key in previous if key not in seen]
+    return merged, {'added': added, 'changed': changed, 'removed': removed}
+
+
+def changes_file(data_file):
+    """
+    Returns the filename of the change log of a data file, eg `example.com-meetings.changes.jsonl`
+
+    :param str data_file: Downloaded data file
+    :rtype: str
+    """
+    return f'{path.splitext(data_file)[0]}.changes.jsonl'
+
+
+def update(data_file, data):
+    """
+    Merges the downloaded records into the data file and writes it only if any record was added, changed or removed.
+    Each change is appended to the data file's change log as a line of JSON with the time, the ids and the
+    modification time and size of the file before and after it was written.
+    Changes older than the caches keep their entries (MAX_AGE) are dropped from the log.
+    Returns the change, which has no ids when nothing changed
+
+    :param str data_file: JSON data file with the previous snapshot
+    :param list data: Downloaded records
+    :rtype: dict
+    """
+    old = []
+    if path.isfile(data_file):
+        with open(data_file) as dfile:
+            old = json.load(dfile)
+    merged, change = merge(old, data)
+    if not any(change.values()):
+        logger.info(f'No changes to {data_file}')
+        return change
+    previous = file_stamp(data_file)
+    with atomic_open(data_file) as dfile:
+        json.dump(merged, dfile, indent=2)
+    change = dict(time=time.time(), previous=previous, stamp=file_stamp(data_file), **change)
+    compact(data_file, change['time'] - MAX_AGE)
+    with open(changes_file(data_file), 'a') as cfile:
+        cfile.write(json.dumps(change) + '\n')
+    logger.info(f"Updated {data_file}: {len(change['added'])} added, {len(change['changed'])} changed, "
+                f"{len(change['removed'])} removed")
+    return change
+
+
+def compact(data_file, before):
+    """
+    Drops the changes logged before the time from the change log of the data file.
+    The log is only written again when it has such changes
+
+    :param str data_file: Downloaded data file
+    :param float before: Time of the oldest change to keep
+    """
+    changes = read_changes(data_file)
+    if changes and changes[0]['time'] < before:
+        with atomic_open(changes_file(data_file)) as cfile:
+            cfile.writelines(json.dumps(change) + '\n' for change in changes if change['time'] >= before)
+        logger.info(f'Dropped changes before {before} from {changes_file(data_file)}')
+
+
+def read_changes(data_file, since=None):
+    """
+    Returns the changes logged for the data file, optionally only the ones after the since timestamp
+
+    :param str data_file: Downloaded data file
+    :param float since: Only return changes after this time
+    :rtype: list
+    """
+    filename = changes_file(data_file)
+    if not path.isfile(filename):
+        return []
+    with open(filename) as cfile:
+        changes = [json.loads(line) for line in cfile if line.strip()]
+    return [change for change in changes if since is None or change['time'] > since]
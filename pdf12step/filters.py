@@ -0,0 +1,118 @@
+from pdf12step.meetings import Calendar, MeetingSet
+
+ATTENDANCE_OPTIONS = ('in_person', 'online', 'hybrid')
+# query params that are passed to the Context args as they are
+ARGS = ('limit',)
+
+
+class FilterError(ValueError):
+    """
+    Raised for query params that are unknown or have invalid values
+    """
+
+
+def split(value):
+    """
+    Returns the unique non empty values of a comma separated param
+    """
+    values = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if part and part not in values:
+            values.append(part)
+    return values
+
+
+def parse_days(value):
+    days = []
+    for day in split(value):
+        name = Calendar()[day if day.isdigit() else day.capitalize()]
+        if name is None:
+            raise FilterError(f'Unknown day "{day}"')
+        days.append(Calendar.DAYS_LOOKUP[name])
+    return sorted(set(days))
+
+
+def parse_attendance(value):
+    options = split(value)
+    for option in options:
+        if option not in ATTENDANCE_OPTIONS:
+            raise FilterError(f'Unknown attendance_option "{option}", use one of {", ".join(ATTENDANCE_OPTIONS)}')
+    return sorted(options)
+
+
+def parse_words(value):
+    return sorted(word.lower() for word in split(value))
+
+
+def parse_types(value):
+    return sorted(code.upper() for code in split(value))
+
+
+# query param name -> parser of its value in the order the filters are applied
+FILTERS = {
+    'day': parse_days,
+    'attendance_option': parse_attendance,
+    'region': parse_words,
+    'type': parse_types,
+}
+
+
+def parse_query(params):
+    """
+    Returns the Context args for the query params with the meeting filters normalized under `query`,
+    so the same filters always give the same args whatever their order or case.
+    Raises FilterError for unknown params or invalid values
+
+    :param dict params: Query params, eg the Flask request.args
+    :rtype: dict
+    """
+    args, query = {}, {}
+    for name, value in params.items():
+        if name in ARGS:
+            if name == 'limit' and not str(value).isdigit():
+                raise FilterError(f'limit must be a number, not "{value}"')
+            args[name] = value
+        elif name not in FILTERS:
+            raise FilterError(f'Unknown param "{name}", use one of {", ".join(list(FILTERS) + list(ARGS))}')
+    for name, parser in FILTERS.items():
+        if params.get(name):
+            values = parser(params[name])
+            if values:
+                query[name] = values
+    if query:
+        args['query'] = query
+    return args
+
+
+def matches(meeting, query):
+    """
+    Returns True if the meeting matches all the filters of the query.
+    Each filter matches any of its values
+
+    :param Meeting meeting: Meeting to check
+    :param dict query: Normalized filters from parse_query
+    :rtype: bool
+    """
+    if 'day' in query and str(meeting.day) not in map(str, query['day']):
+        return False
+    if 'attendance_option' in query and meeting.attendance_option not in query['attendance_option']:
+        return False
+    if 'region' in query:
+        regions = {str(meeting.region).lower(), str(meeting.region_display).lower()}
+        if not regions & set(query['region']):
+            return False
+    if 'type' in query and not set(meeting.types) & set(query['type']):
+        return False
+    return True
+
+
+def filter_query(meetings, query):
+    """
+    Returns the meetings matching the query
+
+    :param MeetingSet meetings: Meetings to filter
+    :param dict query: Normalized filters from parse_query
+    :rtype: MeetingSet
+    """
+    return MeetingSet([meeting for meeting in meetings if matches(meeting, query)])
@@ -1,8 +1,7 @@
 import os
 import json
-import sys
 import hashlib
-import subprocess
+import tempfile
 from datetime import datetime, timezone
 try:
     from flask import Flask
@@ -10,19 +9,30 @@ except ModuleNotFoundError:
     print('You must install Flask to use the pdf12step Flask app')
     exit(1)
 
-from flask import render_template, request, Response
-from flask import send_from_directory
-from flask_weasyprint import HTML as FHTML, render_pdf
+from flask import abort, render_template, request, Response
+from flask import send_file
+from werkzeug.security import safe_join
+from flask_weasyprint import CSS as FCSS, HTML as FHTML
 from yaml.parser import ParserError
 from yaml.scanner import ScannerError
 
-from pdf12step.templating import Context, FSBC, BASE_TEMPLATE
-from pdf12step.config import BASE_DIR, Config
-from pdf12step.utils import yaml_load
+from pdf12step.adict import AttrDict
+from pdf12step.contexts import ContextCache
+from pdf12step.filters import FilterError, parse_query
+from pdf12step.jobs import JobQueue
+from pdf12step.store import OutputStore
+from pdf12step.config import BASE_DIR, Config, read_config_file
+from pdf12step.utils import SingleFlight, yaml_load
 
 
 app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'assets'))
-app.jinja_env.bytecode_cache = FSBC
+contexts = ContextCache()
+# context caches of the sites added with `12step flask --site`, kept apart so each site can be evicted on its own
+site_contexts = {}
+# parsed stylesheets shared by all sites by name, with the modification time of local files
+stylesheet_cache = {}
+# live renders of the same output wait for the first one instead of rendering again
+renders = SingleFlight()
 
 
 def validate_config_yaml(stream):
@@ -37,73 +47,294 @@ def validate_config_yaml(stream):
         }).replace('"', '\\"')
 
 
-def liveproc(args):
-    yield f'{" ".join(map(str, args))}\n'
-    proc = subprocess.Popen(args, stdout=subprocess.PIPE, bufsize=1)
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        yield line
-
-
 def hashfunc(s):
     return hashlib.md5(s.encode()).hexdigest()
 
 
-def loadcontext():
+def requestargs():
     """
-    Loads the Context instance from runtime Flask request parameters as args to Context config
+    Returns the runtime Flask request parameters as args to Context config.
+    Meeting filter params are validated and normalized, invalid ones are a 400 error
 
-    :rtype: Context
+    :rtype: dict
     """
-    args = dict(request.args)
+    try:
+        args = parse_query(request.args)
+    except FilterError as exc:
+        abort(400, str(exc))
     args['flask'] = True
-    return app.config.setdefault('context', Context(app.pdfconfig, args))
+    return args
+
+
+def getsite(name=None):
+    """
+    Returns the name, config and context cache of the site of the request.
+    Without a name the site is picked by the request host matching a site name or its site_domain.
+    The app config is the default site with an empty name
+
+    :param str name: Name of the site from the URL
+    :rtype: tuple
+    """
+    sites = getattr(app, 'sites', None) or {}
+    if name is None:
+        host = request.host.split(':')[0]
+        name = next((key for key, site in sites.items() if host in (key, site.config.site_domain)), '')
+    if not name:
+        return '', app.pdfconfig, contexts
+    if name not in sites:
+        abort(404)
+    config = sites[name].config
+    cache = site_contexts.setdefault(name, ContextCache(config.get('context_cache_size', contexts.maxsize)))
+    return name, config, cache
+
+
+def loadcontext(name=None):
+    """
+    Loads the Context instance from runtime Flask request parameters as args to Context config.
+    Contexts are reused for the same args until the config or the meetings data changes
+
+    :param str name: Name of the site from the URL
+    :rtype: Context
+    """
+    name, config, cache = getsite(name)
+    if not name:
+        cache.maxsize = config.get('context_cache_size', cache.maxsize)
+    return cache.get(config, requestargs())
+
+
+def livename(name, ext):
+    """
+    Returns the name of the live rendered output of the request in the output store
+
+    :param str name: Name of the site from the URL
+    :param str ext: Output extension, .pdf/.html
+    :rtype: str
+    """
+    name, config, cache = getsite(name)
+    return f'live/{name or "default"}/{cache.key(config, requestargs())}{ext}'
+
+
+def loadstylesheets(names):
+    """
+    Returns the parsed stylesheets, parsing each one only once until its file changes
+
+    :param list names: Stylesheet filenames or URLs
+    :rtype: list
+    """
+    sheets = []
+    for name in names:
+        stamp = os.stat(name).st_mtime_ns if os.path.isfile(name) else None
+        cached = stylesheet_cache.get(name)
+        if cached is None or cached[0] != stamp:
+            cached = stylesheet_cache[name] = (stamp, FCSS(name))
+        sheets.append(cached[1])
+    return sheets
+
+
+def outputstore():
+    """
+    Returns the store of generated outputs in the cache_dir, created on first use
+
+    :rtype: OutputStore
+    """
+    if getattr(app, 'store', None) is None:
+        app.store = OutputStore(os.path.join(app.pdfconfig.get('cache_dir') or '.', 'store'),
+                                app.pdfconfig.get('output_cache_mb', 256) * 1024 * 1024)
+    return app.store
+
+
+def sendoutput(entry, name):
+    """
+    Returns the response serving the stored output with its hash as strong ETag so unchanged outputs get 304s.
+    Supports Range requests and serves the compressed variant the client accepts
+
+    :param dict entry: Index entry of the output in the store
+    :param str name: Filename to serve the output as
+    :rtype: Response
+    """
+    store = outputstore()
+    encoding = next((enc for enc in entry['encodings'] if enc in request.accept_encodings), None)
+    # send_file opens the object right away, under the store lock a concurrent put or prune can not delete it first.
+    # An object deleted after it was opened is still served in full
+    with store.lock:
+        filename = store.path(entry, encoding)
+        if not os.path.isfile(filename):
+            abort(404)
+        response = send_file(filename, mimetype=entry['mimetype'], conditional=True,
+                             etag=entry['digest'] + (f'-{encoding}' if encoding else ''), max_age=0,
+                             last_modified=entry['modified'], download_name=os.path.basename(name))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def jobqueue():
+    """
+    Returns the PDF job queue of the app, created with the pdf_workers config option on first use
+
+    :rtype: JobQueue
+    """
+    if getattr(app, 'jobs', None) is None:
+        app.jobs = JobQueue(app.pdfconfig, app.pdfconfig.get('pdf_workers', 2))
+    return app.jobs
+
+
+def siteargs(name):
+    """
+    Returns the runtime args with the config files of the site, the app args for the default site
+
+    :param str name: Name of the site, empty for the default site
+    :rtype: dict
+    """
+    if name:
+        return dict(app.sites[name].args)
+    return dict(getattr(app, 'pdfargs', None) or {})
+
+
+def reloadconfig(name=''):
+    """
+    Loads the config files of the site again after they were edited and drops the cached contexts
+
+    :param str name: Name of the site, empty for the default site
+    """
+    if name:
+        site = app.sites[name]
+        site.config = AttrDict(Config.load(site.args, setup_log=False))
+    elif getattr(app, 'pdfargs', None) is not None:
+        app.pdfconfig = AttrDict(Config.load(app.pdfargs, setup_log=False))
+    cache = site_contexts.get(name) if name else contexts
+    if cache is not None:
+        cache.clear()
 
 
 @app.route('/meetings.pdf')
-def viewpdf():
+@app.route('/sites/<name>/meetings.pdf')
+def viewpdf(name=None):
     """
-    View to render live PDF view. Takes a while to run but produces live PDF
+    View to render live PDF view. Takes a while to run but produces live PDF.
+    Takes day, attendance_option, region and type params to only show the matching meetings.
+    The PDF is kept in the output store until the args, config or meetings data change
     """
-    loadcontext().prerender()
-    html = render_template(BASE_TEMPLATE, **app.config['context'])
-    return render_pdf(FHTML(string=html), stylesheets=app.config['context']['config']['stylesheets'])
+    store = outputstore()
+    output = livename(name, '.pdf')
+    with renders(output):
+        entry = store.get(output)
+        if entry is None:
+            context = loadcontext(name)
+            context.prerender()
+            # renders through the context so its new rows and groups are written to their caches
+            html = context.render()
+            pdffile = tempfile.NamedTemporaryFile(dir=store.store_dir, suffix='.pdf', delete=False)
+            try:
+                with pdffile:
+                    FHTML(string=html).write_pdf(pdffile,
+                                                 stylesheets=loadstylesheets(context['config']['stylesheets']))
+                entry = store.put(output, pdffile.name, move=True, live=True)
+            finally:
+                if os.path.isfile(pdffile.name):
+                    os.unlink(pdffile.name)
+    return sendoutput(entry, 'meetings.pdf')
 
 
 @app.route('/meetings.html')
-def viewhtml():
+@app.route('/sites/<name>/meetings.html')
+def viewhtml(name=None):
     """
     View to render live HTML. Doesnt have the page/header formatting like the PDF but renders faster.
     """
-    loadcontext().prerender()
-    return render_template(BASE_TEMPLATE, **app.config['context'])
+    store = outputstore()
+    output = livename(name, '.html')
+    with renders(output):
+        entry = store.get(output)
+        if entry is None:
+            context = loadcontext(name)
+            context.prerender()
+            htmlfile = tempfile.NamedTemporaryFile('w', dir=store.store_dir, suffix='.html', encoding='utf8',
+                                                   delete=False)
+            try:
+                with htmlfile:
+                    context.stream(htmlfile)
+                entry = store.put(output, htmlfile.name, move=True, live=True)
+            finally:
+                if os.path.isfile(htmlfile.name):
+                    os.unlink(htmlfile.name)
+    return sendoutput(entry, 'meetings.html')
 
 
 @app.route('/make/pdf', methods=['GET', 'POST'])
-def makepdf():
+@app.route('/sites/<name>/make/pdf', methods=['GET', 'POST'])
+def makepdf(name=None):
+    """
+    View to queue a PDF render of the site's configs in the shared pool of PDF workers and follow its log
+    """
     errors = {}
+    name, config, cache = getsite(name) if name else ('', app.pdfconfig, contexts)
     if request.method == 'POST':
-        hashmap = {str(hashfunc(name)): name for name in app.pdfconfig.config}
-        args = [sys.executable, '-m', 'pdf12step', '-v', '--logfile', '-']
+        hashmap = {str(hashfunc(cfg)): cfg for cfg in config.config}
+        args = dict(siteargs(name), config=[])
         for name, lst in request.form.lists():
             if name.startswith('configs'):
                 for hsh in lst:
-                    args.extend(['-c', hashmap[hsh]])
-        args.append('pdf')
-        if 'download' in request.form and request.form['download'] == 'true':
-            args.append('-d')
-        if 'output' in request.form and request.form['output']:
-            args.extend(['-o', request.form['output']])
-        return Response(liveproc(args))
-    return render_template('flask/pdf.html', hash=hashfunc, errors=errors, app_config=app.pdfconfig, config=app.pdfconfig.config)
+                    args['config'].append(hashmap[hsh])
+        download = request.form.get('download') == 'true'
+        queue = jobqueue()
+        job = queue.submit(args, download, request.form.get('output') or None)
+        return Response(queue.follow(job), mimetype='text/plain', headers={'X-Job-Id': job.id})
+    return render_template('flask/pdf.html', hash=hashfunc, errors=errors, app_config=config, config=config.config)
+
+
+@app.route('/jobs')
+def jobs():
+    """
+    View of the status of the queued, running and finished PDF jobs as JSON
+    """
+    return {'jobs': [job.to_dict() for job in jobqueue().jobs.values()]}
+
+
+@app.route('/jobs/<ident>')
+def jobstatus(ident):
+    """
+    View of the status and progress of a PDF job as JSON
+    """
+    job = jobqueue().get(ident) or abort(404)
+    return job.to_dict()
+
+
+@app.route('/jobs/<ident>/log')
+def joblog(ident):
+    """
+    View streaming the log of a PDF job until it finishes
+    """
+    queue = jobqueue()
+    job = queue.get(ident) or abort(404)
+    return Response(queue.follow(job), mimetype='text/plain')
+
+
+@app.route('/stats')
+def stats():
+    """
+    View of the context cache hit/miss metrics of the default site and each added site as JSON
+    """
+    return dict(contexts.stats(), sites={name: cache.stats() for name, cache in site_contexts.items()})
+
+
+@app.route('/sites/<name>/evict', methods=['POST'])
+def evict(name):
+    """
+    Loads the configs of the site again and drops its loaded meetings and live rendered outputs
+    """
+    name, config, cache = getsite(name)
+    reloadconfig(name)
+    outputstore().drop(f'live/{name or "default"}/')
+    return cache.stats()
 
 
 @app.route('/edit', methods=['GET', 'POST'])
 def edit():
     context = {'hash': hashfunc, 'errors': {}, 'success': []}
-    context['config'] = config = {name: open(name).read() for name in app.pdfconfig.config}
+    context['config'] = config = {name: read_config_file(name)[0] for name in app.pdfconfig.config}
     if request.method == 'POST':
         for name, value in request.form.items():
             if name in config:
@@ -116,18 +347,20 @@ def edit():
                 with open(name, 'w') as f:
                     f.write(content.replace('\r', ''))
                 context['success'].append(name)
+            reloadconfig()
     return render_template('flask/editor.html', **context)
 
 
 @app.route('/preview')
 def preview():
-    def dt(attr):
+    def dt(pdfs, key):
         def inner(fn):
-            stat = os.stat(fn)
-            return datetime.fromtimestamp(getattr(stat, attr), tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            return datetime.fromtimestamp(pdfs[fn][key], tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
         return inner
-    pdfs = [fn for fn in os.listdir() if fn.endswith('.pdf')]
-    return render_template('flask/preview.html', pdfs=pdfs, modified=dt('st_mtime'), created=dt('st_ctime'))
+    store = outputstore()
+    store.sync(os.getcwd())
+    pdfs = store.outputs('.pdf')
+    return render_template('flask/preview.html', pdfs=pdfs, modified=dt(pdfs, 'modified'), created=dt(pdfs, 'created'))
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -146,5 +379,11 @@ def index():
 
 @app.route('/view')
 def view():
-    path = request.args.get('path')
-    return send_from_directory(os.getcwd(), path)
+    path = request.args.get('path') or abort(404)
+    filename = safe_join(os.getcwd(), path) or abort(404)
+    store = outputstore()
+    if not store.is_current(path, filename):
+        if not os.path.isfile(filename):
+            abort(404)
+        store.put(path, filename)
+    return sendoutput(store.get(path), path)
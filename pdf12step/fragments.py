@@ -0,0 +1,125 @@
+import sqlite3
+import time
+from os import path, makedirs
+from threading import Lock
+
+from pdf12step.cached import cached_property
+from pdf12step.log import logger
+
+# fragments not used for this many seconds are dropped on flush
+MAX_AGE = 30 * 24 * 60 * 60
+# number of the most recently used fragments kept on flush
+MAX_ENTRIES = 100000
+
+
+class FragmentCache(object):
+    """
+    Stores rendered template fragments on disk in an SQLite database keyed by a hash of their inputs.
+    New fragments are kept in memory until :meth:`flush` writes them out.
+    Each flush also prunes the fragments that were not used for a while, eg rows of old templates or meetings
+
+    :param str filename: Path of the SQLite database file
+    :param str name: Name of the cache in the logged stats
+    :param int max_entries: Number of the most recently used fragments to keep
+    :param int max_age: Seconds after which unused fragments are dropped
+    """
+
+    def __init__(self, filename, name='Fragment', max_entries=MAX_ENTRIES, max_age=MAX_AGE):
+        self.filename = filename
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.pending = {}
+        # keys read from the database since the last flush, their use time is updated on flush
+        self.touched = set()
+        self.hits = self.misses = 0
+        self.lock = Lock()
+
+    @cached_property
+    def db(self):
+        makedirs(path.dirname(self.filename), exist_ok=True)
+        conn = sqlite3.connect(self.filename, check_same_thread=False)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(fragments)')]
+        if columns and 'used' not in columns:
+            # written before fragments were pruned
+            conn.execute('DROP TABLE fragments')
+        conn.execute('CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, content TEXT NOT NULL, '
+                     'used REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS fragments_used ON fragments (used)')
+        return conn
+
+    def get(self, key):
+        """
+        Returns the cached fragment content for the key or None if it is not cached
+
+        :param str key: Hash of the fragment inputs
+        :rtype: str
+        """
+        with self.lock:
+            content = self.pending.get(key)
+            if content is None:
+                row = self.db.execute('SELECT content FROM fragments WHERE key = ?', (key,)).fetchone()
+                content = row[0] if row else None
+                if content is not None:
+                    self.touched.add(key)
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return content
+
+    def set(self, key, content):
+        """
+        Adds the fragment content to be written on the next flush
+
+        :param str key: Hash of the fragment inputs
+        :param str content: Rendered fragment
+        """
+        with self.lock:
+            self.pending[key] = content
+
+    def flush(self):
+        """
+        Writes the pending fragments to the database, marks the fragments read since the last flush as used
+        and prunes the fragments not used for max_age seconds or beyond the max_entries most recently used.
+        Logs and returns the hit/miss stats since the last flush and resets them
+
+        :rtype: dict
+        """
+        with self.lock:
+            now = time.time()
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO fragments VALUES (?, ?, ?)',
+                                    [(key, content, now) for key, content in self.pending.items()])
+                self.db.executemany('UPDATE fragments SET used = ? WHERE key = ?',
+                                    [(now, key) for key in self.touched])
+                pruned = self.prune(now)
+            stats = dict(self.stats(), written=len(self.pending), pruned=pruned)
+            if self.hits or self.misses:
+                logger.info(f'{self.name} cache: {self.hits} hits, {self.misses} misses '
+                            f'({self.hit_rate:.0%} hit rate), wrote {len(self.pending)}, pruned {pruned}')
+            self.pending = {}
+            self.touched = set()
+            self.hits = self.misses = 0
+            return stats
+
+    def prune(self, now):
+        # called with the lock held in a transaction
+        pruned = self.db.execute('DELETE FROM fragments WHERE used < ?', (now - self.max_age,)).rowcount
+        pruned += self.db.execute('DELETE FROM fragments WHERE key IN '
+                                  '(SELECT key FROM fragments ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                                  (self.max_entries,)).rowcount
+        return pruned
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """
+        Returns the hit/miss counts and hit rate
+
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate}
@@ -0,0 +1,139 @@
+import json
+from threading import local
+
+from pdf12step.adict import AttrDict
+from pdf12step.fragments import FragmentCache
+from pdf12step.utils import checksum
+
+# rendered variants of a group kept for different configs, eg several editions of one site
+MAX_VARIANTS = 4
+
+
+class TrackedConfig(AttrDict):
+    """
+    Config that records the top level keys read from it into the sets of the groups being rendered,
+    so a group is only rendered again when one of the config values it used changed
+    """
+    local = None
+
+    def __init__(self, arg=(), **kwargs):
+        super().__init__(arg, **kwargs)
+        self.local = local()
+
+    @classmethod
+    def fromdict(cls, value):
+        return AttrDict(value) if isinstance(value, dict) else value
+
+    @property
+    def frames(self):
+        """
+        Returns the stack of key sets of the groups being rendered by the current thread
+        """
+        if not hasattr(self.local, 'frames'):
+            self.local.frames = []
+        return self.local.frames
+
+    def __getitem__(self, name):
+        for frame in self.frames:
+            frame.add(name)
+        return super().__getitem__(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+def dirty_ids(changes, meta, stamp):
+    """
+    Returns the ids of the meetings that changed since a render of the data file.
+    Returns an empty set if the data file did not change and None if the change log does not cover the change,
+    eg the file was downloaded without `--incremental` or the log was compacted since, in which case the group
+    is rendered again
+
+    :param list changes: Changes logged for the data file (see :func:`pdf12step.delta.read_changes`)
+    :param dict meta: Time and data file stamp of the render
+    :param list stamp: Current modification time and size of the data file
+    :rtype: set
+    """
+    if not meta:
+        return None
+    if meta['stamp'] == stamp:
+        return set()
+    changes = [change for change in changes if change['time'] > meta['time']]
+    if not changes or changes[-1].get('stamp') != stamp:
+        return None
+    # the first change has to start from the data the render used, older logs do not record it
+    if changes[0].get('previous', meta['stamp']) != meta['stamp']:
+        return None
+    ids = set()
+    for change in changes:
+        for key in ('added', 'changed', 'removed'):
+            ids.update(change[key])
+    return ids
+
+
+class GroupCache(object):
+    """
+    Stores the rendered groups of the list sections with the meeting ids and config keys they depend on
+    and the data file stamp and time each variant was rendered from.
+    A group is reused when it has the same meetings, none of them changed since its variant was rendered
+    and the config values it read are the same
+
+    :param str filename: Path of the SQLite database file
+    """
+
+    def __init__(self, filename):
+        self.fragments = FragmentCache(filename, 'Group')
+
+    def lookup(self, key, ids, config, dirty):
+        """
+        Returns the stored variant of the group that can be reused or None
+
+        :param str key: Hash of the group name and the data file
+        :param list ids: Ids of the meetings in the group
+        :param dict config: Config the group is rendered with
+        :param dirty: Function of the data file stamp and time a variant was rendered from that returns the ids of
+            the meetings changed since, None if unknown
+        :rtype: dict
+        """
+        for variant in self.variants(key):
+            if variant['ids'] == ids and variant['config'] == config_values(config, variant['keys']):
+                changed = dirty(variant.get('stamp'), variant.get('time'))
+                if changed is None or changed & set(ids):
+                    return None
+                return variant
+        return None
+
+    def variants(self, key):
+        content = self.fragments.get(key)
+        return json.loads(content) if content else []
+
+    def store(self, key, ids, config, keys, content, stamp, time):
+        """
+        Stores the rendered group content with the meeting ids and config keys it depends on
+
+        :param str key: Hash of the group name and the data file
+        :param list ids: Ids of the meetings in the group
+        :param dict config: Config the group was rendered with
+        :param set keys: Top level config keys read while rendering the group
+        :param str content: Rendered group
+        :param list stamp: Modification time and size of the data file the group was rendered from
+        :param float time: Time the data file was loaded at
+        """
+        keys = sorted(keys)
+        variant = {'ids': ids, 'keys': keys, 'config': config_values(config, keys), 'content': content,
+                   'stamp': stamp, 'time': time}
+        variants = [old for old in self.variants(key) if old['config'] != variant['config'] or old['keys'] != keys]
+        self.fragments.set(key, json.dumps([variant] + variants[:MAX_VARIANTS - 1]))
+
+    def flush(self):
+        return self.fragments.flush()
+
+
+def config_values(config, keys):
+    """
+    Returns a hash of the config values of the keys
+    """
+    return checksum({key: config.get(key) for key in keys})
@@ -0,0 +1,294 @@
+import multiprocessing
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os import path, makedirs
+from threading import Lock
+
+from pdf12step.adict import AttrDict
+from pdf12step.config import Config
+from pdf12step.log import logger
+from pdf12step.utils import checksum
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+# asctime format of the job log lines
+LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+# seconds between polls of a job log that is being followed
+FOLLOW_INTERVAL = 0.2
+
+
+def warm(config):
+    """
+    Prepares a worker process for rendering PDFs.
+    Imports weasyprint, loads its fonts by rendering a blank page, compiles the base template into the
+    bytecode cache and attaches the shared meetings dataset so the first job does not pay for them
+
+    :param dict config: Base config of the app
+    """
+    from pdf12step.templating import BASE_TEMPLATE, get_env
+
+    get_env(config).get_template(BASE_TEMPLATE)
+    shared_meetings(config)
+    try:
+        from weasyprint import HTML
+        HTML(string='<p></p>').write_pdf()
+    except (ImportError, OSError) as exc:
+        logger.warning(f'Could not warm up weasyprint: {exc}')
+
+
+def shared_meetings(config):
+    """
+    Returns the meetings of the shared dataset of the config's data file, published first if it changed.
+    The meetings are only built from the dataset when a template iterates them, see DatasetMeetingSet
+    Returns None if config.shared_data is off, config.normalized is on or the data was not downloaded yet
+
+    :param dict config: Config with data_dir and site_domain
+    :rtype: MeetingSet
+    """
+    from pdf12step.dataset import attach
+    from pdf12step.manifest import meetings_file
+
+    data_file = meetings_file(config)
+    if config.get('shared_data') and not config.get('normalized') and path.isfile(data_file):
+        try:
+            return attach(data_file, config.get('cache_dir')).meetings()
+        except OSError as exc:
+            logger.warning(f'Could not share the meetings of {data_file}: {exc}')
+
+
+def run_job(args, download, output, logfile):
+    """
+    Renders a PDF the same way as `12step pdf`. Runs in the worker processes and logs to the logfile.
+    Returns the output filename
+
+    :param dict args: Runtime args with the config files
+    :param bool download: Download the meeting data before rendering
+    :param str output: Output filename
+    :param str logfile: File to write the job log to
+    :rtype: str
+    """
+    from pdf12step.client import Client
+    from pdf12step.manifest import BuildManifest, build_inputs
+    from pdf12step.templating import Context
+
+    # Config.load sets up the logging from the args
+    args = AttrDict(args, verbose=1, logfile=logfile)
+    config = AttrDict(Config.load(args))
+    logger.info(f'Rendering {output}')
+    try:
+        if download:
+            client = Client(config.site_url, config.api_url, config.nonce_url)
+            client.download(Client.download_sections(config), 'json', args.data_dir, config.site_domain)
+        manifest = BuildManifest(output, build_inputs(config, {'template': None, 'limit': None}))
+        if manifest.is_current():
+            logger.info(f'{output} is up to date')
+            return output
+        context = Context(config, args, meetings=shared_meetings(config))
+        context.prerender()
+        context.pdf(None, output)
+        manifest.save()
+    except Exception:
+        logger.exception(f'Rendering {output} failed')
+        raise
+    logger.info(f'Wrote to {output}')
+    return output
+
+
+class Job(object):
+    """
+    PDF render queued in a JobQueue
+
+    :param str ident: Job id
+    :param str key: Hash of the merged configs and options, identical jobs have the same key
+    :param list configs: Config files to render with
+    :param bool download: Download the meeting data before rendering
+    :param str output: Output filename
+    :param str logfile: File the worker writes the job log to
+    """
+
+    def __init__(self, ident, key, configs, download, output, logfile):
+        self.id = ident
+        self.key = key
+        self.configs = configs
+        self.download = download
+        self.output = output
+        self.logfile = logfile
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self.future = None
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def log(self):
+        """
+        Returns the lines logged by the job so far.
+        Sets the started time of the job to the time of its first line, logged when a worker picked it up
+
+        :rtype: list
+        """
+        if not path.isfile(self.logfile):
+            return []
+        with open(self.logfile) as lfile:
+            lines = lfile.readlines()
+        if self.started is None and lines:
+            try:
+                self.started = datetime.strptime(lines[0][:23], LOG_TIME_FORMAT).timestamp()
+            except ValueError:
+                self.started = time.time()
+        return lines
+
+    def to_dict(self):
+        """
+        Returns the status, timings and progress of the job
+
+        :rtype: dict
+        """
+        lines = self.log()
+        status = self.status
+        if status == QUEUED and self.started is not None:
+            status = RUNNING
+        return {
+            'id': self.id,
+            'status': status,
+            'configs': self.configs,
+            'download': self.download,
+            'output': self.output,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'seconds': (self.finished or time.time()) - self.created,
+            'log_lines': len(lines),
+            'last_log': lines[-1].rstrip() if lines else None,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status} {self.output}>'
+
+
+class JobQueue(object):
+    """
+    Renders PDFs in a bounded pool of worker processes that are warmed up once when started.
+    Submitting a job identical to a queued or running one returns that job instead of rendering twice
+
+    :param dict config: Base config of the app, used to warm up the workers and for the job log directory
+    :param int workers: Number of worker processes
+    :param int keep: Number of finished jobs to keep the status of
+    """
+
+    def __init__(self, config, workers=2, keep=50):
+        self.config = config
+        self.workers = workers
+        self.keep = keep
+        self.jobs = {}
+        self.lock = Lock()
+        self.count = 0
+        self.log_dir = path.join(config.get('cache_dir') or '.', 'jobs')
+        self.executor = None
+
+    def start(self):
+        """
+        Starts the worker processes. Called by the first submit
+        """
+        methods = multiprocessing.get_all_start_methods()
+        # forking a threaded web server is unsafe, workers are started from a clean process instead
+        mpcontext = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=mpcontext, initializer=warm,
+                                            initargs=(self.config,))
+        makedirs(self.log_dir, exist_ok=True)
+        logger.info(f'Started {self.workers} PDF worker(s)')
+
+    def submit(self, args, download=False, output=None):
+        """
+        Queues a PDF render of the configs in args and returns its Job.
+        Returns the queued or running Job if an identical one was already submitted
+
+        :param dict args: Runtime args with the config files
+        :param bool download: Download the meeting data before rendering
+        :param str output: Output filename, defaults to the date_str of the config
+        :rtype: Job
+        """
+        # the server process keeps its own logging
+        config = Config.load(args, setup_log=False)
+        output = path.abspath(output or f"{config['date_str']}.pdf")
+        key = checksum([config['config_hash'], download, output])
+        with self.lock:
+            for job in self.jobs.values():
+                if job.key == key and job.active:
+                    logger.info(f'Joined running job {job.id}')
+                    return job
+            if self.executor is None:
+                self.start()
+            self.count += 1
+            ident = str(self.count)
+            job = Job(ident, key, list(args.get('config') or []), download, output,
+                      path.join(self.log_dir, f'{ident}.log'))
+            self.jobs[ident] = job
+            self.prune()
+            job.future = self.executor.submit(run_job, dict(args), download, output, job.logfile)
+        job.future.add_done_callback(lambda future: self.finish(job, future))
+        return job
+
+    def finish(self, job, future):
+        job.log()
+        with self.lock:
+            job.finished = time.time()
+            error = future.exception()
+            if error is None:
+                job.status = DONE
+            else:
+                job.status, job.error = FAILED, f'{error.__class__.__name__}: {error}'
+                if isinstance(error, BrokenProcessPool) and self.executor is not None:
+                    # a worker died, the next submit starts a new pool
+                    self.executor.shutdown(wait=False)
+                    self.executor = None
+        logger.info(f'Job {job.id} {job.status}')
+
+    def prune(self):
+        # called with the lock held
+        finished = [job for job in self.jobs.values() if not job.active]
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self.jobs[job.id]
+
+    def get(self, ident):
+        """
+        Returns the job with the id or None
+
+        :rtype: Job
+        """
+        return self.jobs.get(ident)
+
+    def follow(self, job):
+        """
+        Yields the job's log lines as they are written until the job finishes
+
+        :param Job job: Job to follow
+        """
+        yield f'Job {job.id}: {" ".join(job.configs)} -> {job.output}\n'
+        position = 0
+        while True:
+            done = not job.active
+            if path.isfile(job.logfile):
+                with open(job.logfile) as lfile:
+                    lfile.seek(position)
+                    lines = lfile.read()
+                    position = lfile.tell()
+                if lines:
+                    yield lines
+            if done:
+                break
+            time.sleep(FOLLOW_INTERVAL)
+        yield f'Job {job.id} {job.status}' + (f': {job.error}' if job.error else '') + '\n'
+
+    def shutdown(self):
+        """
+        Stops the worker processes after the running jobs finish
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,169 @@
+import json
+from os import path, makedirs
+
+from jinja2 import BaseLoader, ChoiceLoader, FileSystemLoader, ModuleLoader
+from jinja2.loaders import split_template_path
+
+from pdf12step.log import logger
+from pdf12step.profiling import span
+from pdf12step.utils import file_stamp
+
+
+MANIFEST = 'manifest.json'
+
+
+class CompiledLoader(BaseLoader):
+    """
+    Loads templates precompiled by :func:`compile_templates` falling back to the source loader
+    when a template has no compiled module, resolves to a different source file or its source
+    file has been modified since it was compiled.
+    Sources are only checked with stat calls, never read, and compiled templates are reloaded
+    by the Environment once their source changes
+
+    :param jinja2.BaseLoader source: Loader used to find template sources
+    :param str compiled_dir: Directory containing the compiled template modules
+    """
+
+    def __init__(self, source, compiled_dir):
+        self.source = source
+        self.compiled_dir = compiled_dir
+        self.modules = ModuleLoader(compiled_dir)
+        self.manifest = read_manifest(compiled_dir)
+
+    def get_source(self, environment, template):
+        return self.source.get_source(environment, template)
+
+    def list_templates(self):
+        return self.source.list_templates()
+
+    def is_compiled(self, environment, name):
+        """
+        Returns True if the template name has a compiled module and its source file is the one it was
+        compiled from with the same modification time and size
+
+        :param jinja2.Environment environment: Environment loading the template
+        :param str name: Name of the template
+        :rtype: bool
+        """
+        entry = self.manifest.get(name)
+        if not isinstance(entry, dict):
+            return False
+        module = path.join(self.compiled_dir, ModuleLoader.get_module_filename(name))
+        if not path.isfile(module):
+            return False
+        return self.uptodate(name, entry)()
+
+    def uptodate(self, name, entry):
+        """
+        Returns a function telling whether the template still loads from the source its module was compiled from
+
+        :param str name: Name of the template
+        :param dict entry: Manifest entry of the template
+        :rtype: function
+        """
+        def uptodate():
+            filename = source_filename(self.source, name, entry['filename'])
+            return filename == entry['filename'] and (filename is None or file_stamp(filename) == entry['stamp'])
+        return uptodate
+
+    def load(self, environment, name, globals=None):
+        if self.is_compiled(environment, name):
+            template = self.modules.load(environment, name, globals)
+            # module templates are never reloaded otherwise, jinja2 sets this from the uptodate of a source
+            template._uptodate = self.uptodate(name, self.manifest[name])
+            return template
+        logger.debug(f'Loading template {name} from source')
+        return self.source.load(environment, name, globals)
+
+
+class ProfiledLoader(BaseLoader):
+    """
+    Wraps a loader so every render of its templates, including includes and imports, is timed as a profiler stage.
+    The template output is passed through as it is generated so streaming renders stay streamed
+
+    :param jinja2.BaseLoader source: Loader to load the templates with
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def get_source(self, environment, template):
+        return self.source.get_source(environment, template)
+
+    def list_templates(self):
+        return self.source.list_templates()
+
+    def load(self, environment, name, globals=None):
+        template = self.source.load(environment, name, globals)
+        render = template.root_render_func
+
+        def root_render_func(context):
+            with span(f'template {name}'):
+                yield from render(context)
+
+        template.root_render_func = root_render_func
+        return template
+
+
+def source_filename(loader, name, compiled=None):
+    """
+    Returns the file the loader loads the template name from without reading it, None if it is not found.
+    Directories of file system loaders are searched with stat calls, other loaders are expected
+    to still load the file the template was compiled from if that file exists
+
+    :param jinja2.BaseLoader loader: Source loader
+    :param str name: Name of the template
+    :param str compiled: Source filename the template was compiled from
+    :rtype: str
+    """
+    if isinstance(loader, ChoiceLoader):
+        for choice in loader.loaders:
+            filename = source_filename(choice, name, compiled)
+            if filename is not None:
+                return filename
+        return None
+    if isinstance(loader, FileSystemLoader):
+        pieces = split_template_path(name)
+        for searchpath in loader.searchpath:
+            filename = path.normpath(path.join(searchpath, *pieces))
+            if path.isfile(filename):
+                return filename
+        return None
+    return compiled if compiled and path.isfile(compiled) else None
+
+
+def read_manifest(compiled_dir):
+    """
+    Returns the mapping of template names to the source filename they were compiled from and its stamp
+
+    :param str compiled_dir: Directory containing the compiled template modules
+    :rtype: dict
+    """
+    manifest = path.join(compiled_dir, MANIFEST)
+    if not path.isfile(manifest):
+        return {}
+    with open(manifest) as mfile:
+        return json.load(mfile)
+
+
+def compile_templates(environment, compiled_dir):
+    """
+    Compiles all the templates found by the environment loader into python modules in compiled_dir
+    Writes a manifest of the source filename and its modification time and size for each compiled template.
+    Returns the list of compiled template names
+
+    :param jinja2.Environment environment: Environment to compile templates with
+    :param str compiled_dir: Directory to write the compiled template modules to
+    :rtype: list
+    """
+    makedirs(compiled_dir, exist_ok=True)
+    environment.compile_templates(compiled_dir, zip=None, log_function=logger.debug)
+    manifest = {}
+    for name in environment.list_templates():
+        if path.isfile(path.join(compiled_dir, ModuleLoader.get_module_filename(name))):
+            filename = environment.loader.get_source(environment, name)[1]
+            manifest[name] = {'filename': filename, 'stamp': filename and file_stamp(filename)}
+    with open(path.join(compiled_dir, MANIFEST), 'w') as mfile:
+        json.dump(manifest, mfile, indent=2)
+    logger.info(f'Compiled {len(manifest)} templates to {compiled_dir}')
+    return sorted(manifest)
@@ -1,8 +1,6 @@
 import logging
 import sys
 
-from weasyprint import LOGGER as wlogger
-
 LEVEL_MAP = {
     0: logging.WARN,
     1: logging.INFO,
@@ -11,6 +9,9 @@ LEVEL_MAP = {
 
 
 logger = logging.getLogger('pdf12step')
+# same logger as weasyprint.LOGGER without importing weasyprint
+wlogger = logging.getLogger('weasyprint')
+handlers = []
 
 
 def setup_logging(args):
@@ -33,5 +34,10 @@ def setup_logging(args):
     handler.setFormatter(formatter)
     handler.setLevel(level)
     for lggr in (wlogger, logger):
+        for old in handlers:
+            lggr.removeHandler(old)
         lggr.addHandler(handler)
         lggr.setLevel(level)
+    for old in handlers:
+        old.close()
+    handlers[:] = [handler]
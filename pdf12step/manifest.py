@@ -0,0 +1,129 @@
+import json
+import os
+from os import path
+
+from pdf12step.__version__ import __version__
+from pdf12step.config import config_checksum
+from pdf12step.log import logger
+from pdf12step.meetings import NORMALIZED_SECTIONS, section_file
+from pdf12step.templating import GENERATED_ASSETS, STYLESHEETS, get_env
+from pdf12step.utils import checksum, file_checksum
+
+
+def meetings_file(config):
+    """
+    Returns the path of the downloaded meetings data file for the config
+
+    :param dict config: Config with data_dir and site_domain
+    :rtype: str
+    """
+    return path.join(config.data_dir, f'{config.site_domain}-meetings.json')
+
+
+def data_files(config):
+    """
+    Returns the downloaded data files the meetings are loaded from.
+    That is the meetings data file and with config.normalized the locations and groups files next to it
+
+    :param dict config: Config with data_dir and site_domain
+    :rtype: list
+    """
+    data_file = meetings_file(config)
+    sections = NORMALIZED_SECTIONS if config.get('normalized') else ()
+    return [data_file] + [section_file(data_file, section) for section in sections]
+
+
+def build_inputs(config, options=None, env=None):
+    """
+    Returns the hashes of all the inputs that go into rendering a document.
+    That is the meetings data, the merged config, the template sources, the stylesheets and the static assets.
+    Assets rendered by the build itself (eg the cover background and QR code) are left out.
+
+    :param dict config: Merged Config
+    :param dict options: Command options that change the output (eg template and limit)
+    :param jinja2.Environment env: Environment to load templates with, defaults to one for the config
+    :rtype: dict
+    """
+    if env is None:
+        env = get_env(config, compiled=False)
+    checksums = [file_checksum(filename) if path.isfile(filename) else None for filename in data_files(config)]
+    templates = {name: checksum(env.loader.get_source(env, name)[0]) for name in env.list_templates()}
+    sheets = config.stylesheets if config.stylesheets else STYLESHEETS
+    assets = {}
+    for root, _, files in os.walk(config.asset_dir):
+        for fname in files:
+            filename = path.join(root, fname)
+            relname = path.relpath(filename, config.asset_dir)
+            if relname not in GENERATED_ASSETS:
+                assets[relname] = file_checksum(filename)
+    return {
+        'version': __version__,
+        'meetings': checksums[0] if len(checksums) == 1 else checksum(checksums),
+        'config': config_checksum(config),
+        'options': checksum(options or {}),
+        'templates': checksum(templates),
+        'stylesheets': checksum([env.loader.get_source(env, sheet)[0] for sheet in sheets]),
+        'assets': checksum(assets),
+    }
+
+
+class BuildManifest(object):
+    """
+    Manifest of input hashes written next to a build output as `<output>.manifest.json`.
+    Used to skip rebuilding an output when none of its inputs changed since it was written.
+
+    :param str output: Filename of the build output
+    :param dict inputs: Input hashes from :func:`build_inputs`
+    """
+
+    def __init__(self, output, inputs):
+        self.output = output
+        self.inputs = inputs
+        self.filename = f'{output}.manifest.json'
+
+    def load(self):
+        """
+        Returns the previously saved manifest or an empty dict
+
+        :rtype: dict
+        """
+        if not path.isfile(self.filename):
+            return {}
+        try:
+            with open(self.filename) as mfile:
+                return json.load(mfile)
+        except ValueError:
+            logger.warning(f'Ignoring invalid build manifest {self.filename}')
+            return {}
+
+    def changed(self):
+        """
+        Returns the names of the inputs that changed since the last build.
+        Returns `['output']` if the output is missing or was modified after the last build
+
+        :rtype: list
+        """
+        previous = self.load()
+        if not path.isfile(self.output) or previous.get('output') != file_checksum(self.output):
+            return ['output']
+        old = previous.get('inputs', {})
+        return sorted(name for name in set(old) | set(self.inputs) if old.get(name) != self.inputs.get(name))
+
+    def is_current(self):
+        """
+        Returns True if the output exists and none of the inputs changed since it was built
+
+        :rtype: bool
+        """
+        changed = self.changed()
+        if changed:
+            logger.info(f'Rebuilding {self.output}, changed: {", ".join(changed)}')
+        return not changed
+
+    def save(self):
+        """
+        Writes the manifest with the current input hashes and the output file hash
+        """
+        with open(self.filename, 'w') as mfile:
+            json.dump({'output': file_checksum(self.output), 'inputs': self.inputs}, mfile, indent=2)
+        logger.debug(f'Wrote build manifest {self.filename}')
@@ -1,6 +1,7 @@
 import json
 import re
 from datetime import datetime
+from os import path
 from collections import defaultdict
 from urllib.parse import unquote, urlparse
 from itertools import islice, cycle
@@ -10,6 +11,14 @@ from pdf12step.cached import cached_property
 
 US_ZIP_RE = re.compile(r'(\d{5})')
 CA_ZIP_RE = re.compile(r'([ABCEGHJ-NPRSTVXY]\d[ABCEGHJ-NPRSTV-Z][ -]?\d[ABCEGHJ-NPRSTV-Z]\d)', re.I)
+# fields of a TSML meeting record that belong to its location_id and group_id, shared by the normalized model
+LOCATION_FIELDS = ('location', 'location_notes', 'location_url', 'formatted_address', 'address', 'city', 'state',
+                   'postal_code', 'country', 'approximate', 'latitude', 'longitude', 'region_id', 'region',
+                   'sub_region', 'regions', 'timezone')
+GROUP_FIELDS = ('group', 'group_notes', 'district', 'district_id', 'website', 'email', 'phone', 'venmo', 'square',
+                'paypal')
+# TSML sections downloaded next to the meetings for the normalized model
+NORMALIZED_SECTIONS = ('locations', 'groups')
 
 
 def clean_url(url):
@@ -24,6 +33,40 @@ def clean_url(url):
     return unquote(url).strip()
 
 
+def section_file(data_file, section):
+    """
+    Returns the filename of another TSML section downloaded next to the meetings data file,
+    eg `data/example.com-locations.json` for `data/example.com-meetings.json`
+
+    :param str data_file: Downloaded meetings data file
+    :param str section: Section name (eg locations/groups)
+    :rtype: str
+    """
+    return re.sub(r'meetings(\.\w+)$', rf'{section}\1', data_file)
+
+
+def address_line(place):
+    if place.formatted_address:
+        return place.formatted_address
+    return f'{place.address}, {place.city} {place.state}, {place.zipcode}'
+
+
+def find_zipcode(place, url):
+    if place.postal_code:
+        return place.postal_code
+    addr = ' '.join(place.formatted_address.split()[1:])
+    zipre = CA_ZIP_RE if '.ca/' in url else US_ZIP_RE
+    match = zipre.search(addr)
+    return match.groups()[0] if match else ''
+
+
+def region_name(place):
+    if place.region:
+        return f'{place.region}/{place.sub_region}' if place.sub_region else place.region
+    elif place.regions:
+        return '/'.join(map(str, place.regions))
+
+
 class Calendar:
     DAYS = {
         0: 'Sunday',
@@ -56,10 +99,68 @@ class Calendar:
 
     def by_day(self, meetings):
         items = {int(day): meets for day, meets in meetings.by_value('day')}
-        return [(name, MeetingSet(items[day])) for day, name in self if day in items]
+        return [(name, items[day]) for day, name in self if day in items]
+
+
+class Location(AttrDict):
+    """
+    Location shared by all the meetings at its location_id in the normalized model (see :func:`normalize`).
+    Its derived fields are computed once for all of its meetings.
+    The site_url is the url of its first meeting, the zipcode format is picked by it like for a Meeting
+    """
+    site_url = ''
+
+    @cached_property
+    def address_display(self):
+        return address_line(self)
+
+    @cached_property
+    def zipcode(self):
+        return find_zipcode(self, self.site_url)
+
+    @cached_property
+    def region_display(self):
+        return region_name(self)
+
+    @cached_property
+    def latlon(self):
+        return f'{self.latitude},{self.longitude}'
 
 
 class Meeting(AttrDict):
+    # shared Location and group of a normalized meeting, which reads their fields instead of holding copies
+    location_ref = group_ref = None
+
+    def __missing__(self, key):
+        ref = self.location_ref if key in LOCATION_FIELDS else self.group_ref if key in GROUP_FIELDS else None
+        if ref is None or key not in ref:
+            raise KeyError(key)
+        return ref[key]
+
+    def __getattr__(self, name):
+        # read shared fields without copying them into the meeting like AttrDict does
+        if (self.location_ref is not None or self.group_ref is not None) and name not in self:
+            try:
+                return self.__missing__(name)
+            except KeyError:
+                pass
+        return super().__getattr__(name)
+
+    def record(self):
+        """
+        Returns the fields of the meeting with the fields of its shared location and group,
+        the same as its downloaded record
+
+        :rtype: dict
+        """
+        if self.location_ref is None and self.group_ref is None:
+            return self
+        record = {}
+        for ref in (self.group_ref, self.location_ref):
+            if ref is not None:
+                record.update(ref)
+        record.update(self)
+        return record
 
     @cached_property
     def id_display(self):
@@ -82,21 +183,18 @@ class Meeting(AttrDict):
         """
         Displays a long form address line
         """
-        if self.formatted_address:
-            return self.formatted_address
-        return f'{self.address}, {self.city} {self.state}, {self.zipcode}'
+        if self.location_ref is not None:
+            return self.location_ref.address_display
+        return address_line(self)
 
     @cached_property
     def zipcode(self):
         """
         Returns a 5 digit zipcode from the formatted address
         """
-        if self.postal_code:
-            return self.postal_code
-        addr = ' '.join(self.formatted_address.split()[1:])
-        zipre = CA_ZIP_RE if '.ca/' in self.url else US_ZIP_RE
-        match = zipre.search(addr)
-        return match.groups()[0] if match else ''
+        if self.location_ref is not None:
+            return self.location_ref.zipcode
+        return find_zipcode(self, self.url)
 
     @cached_property
     def time_display(self):
@@ -179,16 +277,17 @@ class Meeting(AttrDict):
         """
         Gets the text of the region and sub_region
         """
-        if self.region:
-            return f'{self.region}/{self.sub_region}' if self.sub_region else self.region
-        elif self.regions:
-            return '/'.join(map(str, self.regions))
+        if self.location_ref is not None:
+            return self.location_ref.region_display
+        return region_name(self)
 
     @cached_property
     def latlon(self):
         """
         Returns the latitude,longitude tuple for usage in map locations
         """
+        if self.location_ref is not None:
+            return self.location_ref.latlon
         return f'{self.latitude},{self.longitude}'
 
     @cached_property
@@ -212,18 +311,105 @@ class Meeting(AttrDict):
         return 'in_person'
 
 
+def share(record, id_field, fields, records, shared, cls):
+    """
+    Returns the shared record of the id of the meeting record, created from its fields if it is the first one.
+    Returns None if the record has no id or its fields differ from the shared ones
+    """
+    ref_id = record.get(id_field)
+    if ref_id in (None, ''):
+        return None
+    ref = shared.get(ref_id)
+    if ref is None:
+        other = records.get(ref_id, {})
+        ref = cls({name: other[name] for name in fields if name in other}, default='')
+        ref.update((name, record[name]) for name in fields if name in record)
+        shared[ref_id] = ref
+    if any(dict.get(ref, name) != record[name] for name in fields if name in record):
+        return None
+    return ref
+
+
+def normalize(records, locations=(), groups=()):
+    """
+    Returns Meetings for the TSML meeting records that reference one shared Location per location_id and
+    one shared group per group_id instead of each holding a copy of their fields.
+    The fields of the first meeting at a location or of a group are the shared ones and the records of
+    the locations and groups endpoints only add the shared fields the meetings do not have.
+    Meetings with fields that differ from the shared ones keep them
+
+    :param list records: Meeting records
+    :param list locations: Records of the locations endpoint
+    :param list groups: Records of the groups endpoint
+    :rtype: list
+    """
+    places = {record['id']: record for record in locations if isinstance(record, dict) and 'id' in record}
+    teams = {record['id']: record for record in groups if isinstance(record, dict) and 'id' in record}
+    shared_locations, shared_groups, meetings = {}, {}, []
+    for record in records:
+        location = share(record, 'location_id', LOCATION_FIELDS, places, shared_locations, Location)
+        if location is not None and not location.site_url:
+            location.site_url = record.get('url', '')
+        group = share(record, 'group_id', GROUP_FIELDS, teams, shared_groups, AttrDict)
+        moved = (LOCATION_FIELDS if location is not None else ()) + (GROUP_FIELDS if group is not None else ())
+        # a new dict without the shared fields, a dict does not shrink when fields are deleted from it
+        meeting = Meeting({name: value for name, value in record.items() if name not in moved}, default='')
+        if location is not None:
+            meeting.location_ref = location
+        if group is not None:
+            meeting.group_ref = group
+        meetings.append(meeting)
+    return meetings
+
+
 class MeetingSet(object):
     def __init__(self, fn_or_obj):
         self.fn_or_obj = fn_or_obj
 
+    @classmethod
+    def load(cls, data_file, normalized=False):
+        """
+        Returns the meetings of the data file.
+        With normalized the meetings reference the locations and groups they share (see :func:`normalize`),
+        using the records of the NORMALIZED_SECTIONS downloaded next to the data file if there are any
+
+        :param str data_file: Downloaded meetings data file
+        :param bool normalized: Load the meetings with shared locations and groups
+        :rtype: MeetingSet
+        """
+        if not normalized:
+            return cls(data_file)
+        sections = {}
+        for section in NORMALIZED_SECTIONS:
+            filename = section_file(data_file, section)
+            if path.isfile(filename):
+                with open(filename) as jfile:
+                    data = json.load(jfile)
+                sections[section] = data if isinstance(data, list) else []
+        with open(data_file) as jfile:
+            return cls(normalize(json.load(jfile), **sections))
+
     @cached_property
     def items(self):
         itms = json.load(open(self.fn_or_obj)) if isinstance(self.fn_or_obj, str) else self.fn_or_obj
-        return [Meeting(item, default='') for item in itms]
+        return [item if isinstance(item, Meeting) else Meeting(item, default='') for item in itms]
 
     def copy(self):
         return MeetingSet(self.items.copy())
 
+    def enrich(self):
+        """
+        Computes all the cached derived Meeting fields up front.
+        Used before sharing the MeetingSet with forked worker processes so each one doesn't compute them again
+
+        :rtype: MeetingSet
+        """
+        names = [name for name, attr in vars(Meeting).items() if isinstance(attr, cached_property)]
+        for item in self.items:
+            for name in names:
+                getattr(item, name)
+        return self
+
     def __iter__(self):
         for item in self.items:
             yield item
@@ -246,6 +432,14 @@ class MeetingSet(object):
         """
         return MeetingSet(self.items[:num])
 
+    def ids(self):
+        """
+        Returns the ids of the meetings as strings, None for the meetings without one
+
+        :rtype: list
+        """
+        return [str(item.id) if item.id else None for item in self.items]
+
     def value_set(self, attr, sort=False, filter_none=False):
         """
         Returns a set of unique values for the passed atribute name
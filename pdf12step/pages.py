@@ -0,0 +1,95 @@
+import hashlib
+import json
+from os import path
+from threading import RLock
+
+from pdf12step.log import logger
+from pdf12step.utils import atomic_open
+
+LOCK = RLock()
+# number of the most recently laid out documents whose page counts are kept
+MAX_COUNTS = 1000
+
+
+def needs_notes_page(pages, even_pages=True):
+    """
+    Returns True if a notes page is repeated to give a document of this many pages an even number of pages
+
+    :param int pages: Number of laid out pages
+    :param bool even_pages: config.even_pages
+    :rtype: bool
+    """
+    return bool(even_pages and pages % 2 and pages > 2)
+
+
+def html_key(content):
+    """
+    Returns the hash of the HTML content used to cache its page count.
+    Equals the :func:`pdf12step.utils.file_checksum` of the content written to a file as UTF-8
+
+    :param str content: HTML content
+    :rtype: str
+    """
+    return hashlib.sha1(content.encode('utf8')).hexdigest()
+
+
+class PageCache(object):
+    """
+    Keeps the number of pages each laid out HTML document took in `pages.json` in the cache_dir keyed by a hash
+    of the HTML. Used to count the pages of a document without laying it out again.
+    Only the counts of the max_counts most recently laid out documents are kept
+
+    :param str cache_dir: Cache directory to keep the page counts file in. Counts are kept in memory if None
+    :param int max_counts: Number of page counts to keep
+    """
+    memory = {}
+
+    def __init__(self, cache_dir=None, max_counts=MAX_COUNTS):
+        self.filename = path.join(cache_dir, 'pages.json') if cache_dir else None
+        self.max_counts = max_counts
+
+    def counts(self):
+        """
+        Returns the mapping of HTML hashes to page counts
+
+        :rtype: dict
+        """
+        if self.filename is None:
+            return self.memory
+        if not path.isfile(self.filename):
+            return {}
+        try:
+            with open(self.filename) as cfile:
+                return json.load(cfile)
+        except ValueError:
+            return {}
+
+    def get(self, key):
+        """
+        Returns the page count of the HTML with the hash key or None if it was never laid out
+
+        :param str key: Hash of the HTML
+        :rtype: int
+        """
+        return self.counts().get(key)
+
+    def set(self, key, pages):
+        """
+        Stores the page count of the HTML with the hash key
+
+        :param str key: Hash of the HTML
+        :param int pages: Number of pages the HTML was laid out into
+        """
+        with LOCK:
+            counts = self.counts()
+            if counts.get(key) == pages:
+                return
+            # counts are kept in the order they were laid out in, the oldest are dropped first
+            counts.pop(key, None)
+            counts[key] = pages
+            for old in list(counts)[:-self.max_counts]:
+                del counts[old]
+            if self.filename is not None:
+                with atomic_open(self.filename) as cfile:
+                    json.dump(counts, cfile, indent=2)
+            logger.debug(f'Cached page count {pages} for {key}')
@@ -0,0 +1,160 @@
+import cProfile
+import json
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from os import path, makedirs
+
+from pdf12step.log import logger
+
+
+class Profiler(object):
+    """
+    Records how long each named stage of a run takes.
+    Stages are timed with :meth:`span` and nest, so a span started inside another one is reported under it.
+    Does nothing until enabled
+
+    Optionally dumps cProfile stats for each outermost stage to stats_dir and records the peak traced memory of each
+    stage with tracemalloc
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats_dir = None
+        self.trace_memory = False
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the recorded spans
+        """
+        self.spans = {}
+        self.stack = []
+        self.dumps = 0
+
+    def enable(self, stats_dir=None, trace_memory=False):
+        """
+        Starts recording spans
+
+        :param str stats_dir: Directory to dump cProfile stats of each outermost stage to
+        :param bool trace_memory: Record the peak memory of each stage with tracemalloc
+        """
+        self.enabled = True
+        self.stats_dir = stats_dir
+        self.trace_memory = trace_memory
+        if stats_dir:
+            makedirs(stats_dir, exist_ok=True)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        """
+        Stops recording spans
+        """
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name):
+        """
+        Times the block as the stage name nested under the currently open stage
+
+        :param str name: Name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+        frame = {'name': name, 'peak': 0}
+        if self.trace_memory:
+            if self.stack:
+                parent = self.stack[-1]
+                parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+            # added in Python 3.9, before it the peak of a stage is the highest peak since tracing started
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        key = tuple(span['name'] for span in self.stack) + (name,)
+        # added when the span starts so parents come before their children
+        record = self.spans.setdefault(key, {'calls': 0, 'seconds': 0.0, 'peak': 0})
+        profile = cProfile.Profile() if self.stats_dir and not self.stack else None
+        self.stack.append(frame)
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            self.stack.pop()
+            record['calls'] += 1
+            record['seconds'] += seconds
+            if self.trace_memory:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                record['peak'] = max(record['peak'], peak)
+                if self.stack:
+                    self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            if profile:
+                self.dump_stats(profile, name)
+
+    def dump_stats(self, profile, name):
+        """
+        Writes the cProfile stats of a stage to `<number>-<name>.prof` in the stats_dir
+
+        :param cProfile.Profile profile: Profile of the stage
+        :param str name: Name of the stage
+        """
+        self.dumps += 1
+        slug = re.sub(r'[^\w.-]+', '_', name)
+        filename = path.join(self.stats_dir, f'{self.dumps:02d}-{slug}.prof')
+        profile.dump_stats(filename)
+        logger.info(f'Wrote profile stats of {name} to {filename}')
+
+    def report(self):
+        """
+        Returns a list of the recorded stages in the order they started with their nesting depth,
+        number of calls, total seconds and the peak traced memory in bytes when tracing memory
+
+        :rtype: list
+        """
+        report = []
+        for key, record in self.spans.items():
+            stage = {'stage': key[-1], 'path': list(key), 'depth': len(key) - 1, 'calls': record['calls'],
+                     'seconds': record['seconds']}
+            if self.trace_memory:
+                stage['peak_bytes'] = record['peak']
+            report.append(stage)
+        return report
+
+    def table(self):
+        """
+        Returns the report as a human readable table
+
+        :rtype: str
+        """
+        report = self.report()
+        width = max([len('stage')] + [stage['depth'] * 2 + len(stage['stage']) for stage in report])
+        lines = [f"{'stage':<{width}} {'calls':>6} {'seconds':>9}" + ('  peak MB' if self.trace_memory else '')]
+        for stage in report:
+            name = '  ' * stage['depth'] + stage['stage']
+            line = f"{name:<{width}} {stage['calls']:>6} {stage['seconds']:>9.3f}"
+            if self.trace_memory:
+                line += f"  {stage['peak_bytes'] / 1e6:7.1f}"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        """
+        Writes the report as JSON to the filename
+
+        :param str filename: File to write the JSON report to
+        """
+        with open(filename, 'w') as rfile:
+            json.dump(self.report(), rfile, indent=2)
+        logger.info(f'Wrote profile report to {filename}')
+
+
+profiler = Profiler()
+span = profiler.span
@@ -0,0 +1,146 @@
+import json
+import multiprocessing
+import time
+from os import path
+
+from pdf12step.config import SHARD_OUTPUT as OUTPUT
+from pdf12step.log import logger
+from pdf12step.manifest import BuildManifest, build_inputs, meetings_file
+from pdf12step.meetings import MeetingSet
+from pdf12step.templating import Context
+from pdf12step.utils import atomic_open, checksum, slugify
+
+# shard contexts and options shared with forked worker processes
+shared = {}
+
+
+def partition(context, attr):
+    """
+    Returns the (value, MeetingSet) shards of the context's meetings grouped by the attribute in one pass,
+    the same groups as `by_value` in the list templates
+
+    :param Context context: Context with the filtered meetings of the whole directory
+    :param str attr: Meeting attribute to shard by, eg region_display or day
+    :rtype: list
+    """
+    return [(str(value), group) for value, group in context.by_value(context.meetings, attr)]
+
+
+def shard_slugs(values):
+    """
+    Returns the slug of each shard value for its output filenames.
+    Values with the same slug, eg ones that only differ in case or punctuation, get a number after the first,
+    so their outputs and index entries do not overwrite each other
+
+    :param list values: Shard values in their render order
+    :rtype: list
+    """
+    slugs, seen = [], set()
+    for value in values:
+        slug = base = slugify(value)
+        num = 1
+        while slug in seen:
+            num += 1
+            slug = f'{base}-{num}'
+        if slug != base:
+            logger.warning(f'Shard "{value}" has the same slug as another shard, writing it as {slug}')
+        seen.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def render_shard(idx):
+    """
+    Renders the shared shard at the index in each format unless its manifest shows no changed inputs.
+    Runs in forked worker processes. Returns the shard report with the outputs written and skipped
+    """
+    shard = shared['shards'][idx]
+    context, inputs = shard['context'], shard['inputs']
+    options = shared['options']
+    start = time.perf_counter()
+    report = {'value': shard['value'], 'slug': shard['slug'], 'meetings': len(context.meetings), 'outputs': [],
+              'skipped': []}
+    for fmt in options['formats']:
+        outfile = options['output'].format(shard=shard['slug'], format=fmt, date_str=context.config.date_str)
+        manifest = BuildManifest(outfile, inputs)
+        if not options['force'] and manifest.is_current():
+            report['skipped'].append(outfile)
+            continue
+        if fmt == 'pdf':
+            report['pages'] = context.pdf(options['template'], outfile)
+        else:
+            with atomic_open(outfile) as outobj:
+                context.stream(outobj, options['template'])
+        manifest.save()
+        report['outputs'].append(outfile)
+        logger.info(f'Wrote to {outfile}')
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def load_index(filename):
+    if path.isfile(filename):
+        try:
+            with open(filename) as ifile:
+                return json.load(ifile)
+        except ValueError:
+            logger.warning(f'Ignoring invalid shard index {filename}')
+    return {}
+
+
+def shard(config, args, attr='region_display', formats=('pdf',), output=OUTPUT, index=None, force=False, jobs=1):
+    """
+    Renders one document per value of the meeting attribute, eg a pocket directory per region.
+    The meetings are loaded and partitioned once and the shards are rendered in forked worker processes.
+    A shard is skipped when its meetings, the config, templates and assets did not change since its last render.
+    Writes an index of the shards with their outputs and page counts and returns it
+
+    :param dict config: Merged Config
+    :param dict args: Runtime args
+    :param str attr: Meeting attribute to shard by
+    :param list formats: Output formats (pdf/html)
+    :param str output: Output filename pattern with {shard}, {format} and {date_str} fields
+    :param str index: JSON file to write the index to, defaults to the output pattern with shards and json
+    :param bool force: Render even if nothing changed since the last run
+    :param int jobs: Number of worker processes to render with
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    data_file = meetings_file(config)
+    if not path.isfile(data_file):
+        raise OSError(f'Meeting data file {data_file} not found! Please download first')
+    base = Context(config, args, meetings=MeetingSet.load(data_file, config.get('normalized')).enrich())
+    shards = partition(base, attr)
+    base.prerender()
+    template = args.get('template')
+    inputs = build_inputs(config, {'template': template, 'limit': args.get('limit')})
+    shared['shards'] = []
+    slugs = shard_slugs([value for value, _ in shards])
+    for (value, meetings), slug in zip(shards, slugs):
+        context = Context(config, args, meetings=meetings)
+        context['shard'] = value
+        shard_inputs = dict(inputs, meetings=checksum([dict(meeting.record()) for meeting in meetings]),
+                            options=checksum([inputs['options'], attr, value]))
+        shared['shards'].append({'value': value, 'slug': slug, 'context': context,
+                                 'inputs': shard_inputs})
+    shared['options'] = {'formats': formats, 'output': output, 'template': template, 'force': force}
+    load_seconds = time.perf_counter() - start
+    jobs = max(min(jobs, len(shards)), 1)
+    if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            reports = pool.map(render_shard, range(len(shards)))
+    else:
+        jobs = 1
+        reports = [render_shard(idx) for idx in range(len(shards))]
+    if index is None:
+        index = output.format(shard='shards', format='json', date_str=config.date_str)
+    previous = {entry['slug']: entry for entry in load_index(index).get('shards', [])}
+    for report in reports:
+        if 'pages' not in report and report['slug'] in previous:
+            report['pages'] = previous[report['slug']].get('pages')
+    result = {'by': attr, 'jobs': jobs, 'load_seconds': load_seconds, 'total_seconds': time.perf_counter() - start,
+              'shards': reports}
+    with atomic_open(index) as ifile:
+        json.dump(result, ifile, indent=2)
+    logger.info(f'Wrote shard index {index}')
+    return result
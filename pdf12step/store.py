@@ -0,0 +1,248 @@
+import gzip
+import json
+import os
+import shutil
+import time
+from os import path
+from threading import RLock
+
+from pdf12step.log import logger
+from pdf12step.utils import atomic_open, file_checksum
+
+MIMETYPES = {'.pdf': 'application/pdf', '.html': 'text/html'}
+# outputs also stored compressed for clients that accept them, best encoding first
+COMPRESSED = ('.html',)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(data, encoding):
+    """
+    Returns the data compressed with the encoding (br/gzip) or None if the encoding is not available
+
+    :param bytes data: Data to compress
+    :param str encoding: Content encoding
+    :rtype: bytes
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data)
+
+
+class OutputStore(object):
+    """
+    Keeps generated PDFs and HTML in the objects folder of the store_dir named by the hash of their contents,
+    with an `index.json` mapping output names to the stored object and its size and times.
+    HTML is also stored gzip and brotli (if installed) compressed.
+    Serving a stored output only needs its index entry, so repeated views cost a file stat instead of a render.
+    Live rendered outputs are dropped least recently used first once they take more than max_live_bytes
+
+    :param str store_dir: Directory to keep the objects and the index in
+    :param int max_live_bytes: Total size of the live rendered outputs to keep
+    """
+
+    def __init__(self, store_dir, max_live_bytes=256 * 1024 * 1024):
+        self.store_dir = store_dir
+        self.object_dir = path.join(store_dir, 'objects')
+        self.index_file = path.join(store_dir, 'index.json')
+        self.max_live_bytes = max_live_bytes
+        self.lock = RLock()
+        os.makedirs(store_dir, exist_ok=True)
+        self.index = self.load()
+
+    def load(self):
+        """
+        Returns the index of the stored outputs and the synced directories
+
+        :rtype: dict
+        """
+        if path.isfile(self.index_file):
+            try:
+                with open(self.index_file) as ifile:
+                    return json.load(ifile)
+            except ValueError:
+                logger.warning(f'Ignoring invalid output store index {self.index_file}')
+        return {'outputs': {}, 'dirs': {}}
+
+    def save(self):
+        with atomic_open(self.index_file) as ifile:
+            json.dump(self.index, ifile, indent=2)
+
+    def path(self, entry, encoding=None):
+        """
+        Returns the filename of the stored object of the index entry, compressed with the encoding if given
+
+        :param dict entry: Index entry of the output
+        :param str encoding: Content encoding of the variant (br/gzip)
+        :rtype: str
+        """
+        suffix = dict(ENCODINGS)[encoding] if encoding else ''
+        return path.join(self.object_dir, entry['digest'][:2], f"{entry['digest']}{entry['ext']}{suffix}")
+
+    def get(self, name):
+        """
+        Returns the index entry of the output name or None if it is not stored.
+        Marks live outputs as used, the time is saved with the next change of the index
+
+        :param str name: Output name
+        :rtype: dict
+        """
+        entry = self.index['outputs'].get(name)
+        if entry and entry.get('live'):
+            entry['accessed'] = time.time()
+        return entry
+
+    def outputs(self, suffix=None):
+        """
+        Returns the index entries of the stored outputs that are not live renders, optionally only with the suffix
+
+        :param str suffix: Filename extension to list, eg .pdf
+        :rtype: dict
+        """
+        return {name: entry for name, entry in self.index['outputs'].items()
+                if not entry.get('live') and (suffix is None or entry['ext'] == suffix)}
+
+    def put(self, name, filename, move=False, live=False):
+        """
+        Stores the file as the output name and returns its index entry
+
+        :param str name: Output name
+        :param str filename: File to store
+        :param bool move: Move the file into the store instead of copying it
+        :param bool live: The output is a live render that is pruned least recently used first
+        :rtype: dict
+        """
+        stat = os.stat(filename)
+        ext = path.splitext(name)[1]
+        entry = {'digest': file_checksum(filename), 'ext': ext, 'mimetype': MIMETYPES.get(ext), 'size': stat.st_size,
+                 'modified': stat.st_mtime, 'encodings': []}
+        with self.lock:
+            old = self.get(name)
+            entry['created'] = old['created'] if old else time.time()
+            if live:
+                entry['live'] = True
+                entry['accessed'] = time.time()
+            else:
+                entry['source'] = [path.abspath(filename), stat.st_mtime_ns, stat.st_size]
+            dest = self.path(entry)
+            if not path.isfile(dest):
+                os.makedirs(path.dirname(dest), exist_ok=True)
+                if move:
+                    os.replace(filename, dest)
+                else:
+                    with open(filename, 'rb') as src, atomic_open(dest, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+            elif move:
+                os.unlink(filename)
+            if ext in COMPRESSED:
+                entry['encodings'] = self.compress(entry)
+            self.index['outputs'][name] = entry
+            if live:
+                self.prune()
+            self.save()
+        logger.debug(f'Stored {name} as {entry["digest"]}')
+        return entry
+
+    def compress(self, entry):
+        """
+        Writes the compressed variants of the stored object and returns the encodings written
+        """
+        encodings = []
+        data = None
+        for encoding, _ in ENCODINGS:
+            dest = self.path(entry, encoding)
+            if not path.isfile(dest):
+                if data is None:
+                    with open(self.path(entry), 'rb') as ofile:
+                        data = ofile.read()
+                compressed = compress(data, encoding)
+                if compressed is None:
+                    continue
+                with atomic_open(dest, 'wb') as cfile:
+                    cfile.write(compressed)
+            encodings.append(encoding)
+        return encodings
+
+    def drop(self, prefix):
+        """
+        Drops the outputs whose names start with the prefix and deletes their objects if nothing else uses them
+
+        :param str prefix: Name prefix, eg `live/<site>/`
+        """
+        with self.lock:
+            for name in [name for name in self.index['outputs'] if name.startswith(prefix)]:
+                del self.index['outputs'][name]
+            self.prune()
+            self.save()
+
+    def is_current(self, name, filename):
+        """
+        Returns True if the output name is stored from the file and the file did not change since
+
+        :param str name: Output name
+        :param str filename: Source file of the output
+        :rtype: bool
+        """
+        entry = self.get(name)
+        if not entry or 'source' not in entry:
+            return False
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        return entry['source'] == [path.abspath(filename), stat.st_mtime_ns, stat.st_size]
+
+    def sync(self, directory, suffix='.pdf'):
+        """
+        Stores the new and changed files with the suffix in the directory and drops the removed ones.
+        Files are only listed when the directory modification time changed since the last sync
+
+        :param str directory: Directory of the outputs
+        :param str suffix: Filename extension of the outputs
+        """
+        directory = path.abspath(directory)
+        stamp = os.stat(directory).st_mtime_ns
+        if self.index['dirs'].get(directory) == stamp:
+            return
+        with self.lock:
+            names = set()
+            for entry in os.scandir(directory):
+                if entry.name.endswith(suffix) and entry.is_file():
+                    names.add(entry.name)
+                    if not self.is_current(entry.name, entry.path):
+                        self.put(entry.name, entry.path)
+            for name, entry in list(self.index['outputs'].items()):
+                source = entry.get('source')
+                if source and name not in names and entry['ext'] == suffix and path.dirname(source[0]) == directory:
+                    del self.index['outputs'][name]
+            self.index['dirs'][directory] = stamp
+            self.prune()
+            self.save()
+        logger.info(f'Synced {len(names)} outputs from {directory}')
+
+    def prune(self):
+        """
+        Drops the least recently used live outputs over max_live_bytes and deletes objects no output refers to
+        """
+        with self.lock:
+            outputs = self.index['outputs']
+            live = sorted((entry['accessed'], name) for name, entry in outputs.items() if entry.get('live'))
+            size = sum(outputs[name]['size'] for _, name in live)
+            for _, name in live:
+                if size <= self.max_live_bytes:
+                    break
+                size -= outputs.pop(name)['size']
+            used = {entry['digest'] for entry in outputs.values()}
+            if not path.isdir(self.object_dir):
+                return
+            for folder in os.scandir(self.object_dir):
+                for obj in os.scandir(folder.path):
+                    if obj.name.split('.')[0] not in used:
+                        try:
+                            os.unlink(obj.path)
+                        except OSError as exc:
+                            # eg still open on Windows, deleted by the next prune
+                            logger.debug(f'Could not delete {obj.path}: {exc}')
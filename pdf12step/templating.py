@@ -1,43 +1,159 @@
-from os import path, makedirs, getcwd
+import gc
+import io
+import tempfile
+import time
+from os import path, makedirs, getcwd, unlink
 from datetime import datetime
 from collections import defaultdict
 from functools import reduce
 from pprint import pformat
 
-from weasyprint import HTML
+from markupsafe import Markup
 from jinja2 import (Environment, FileSystemLoader, FileSystemBytecodeCache,
                     select_autoescape, PackageLoader, ChoiceLoader)
 
-from pdf12step.meetings import MeetingSet, Calendar
+from pdf12step.__version__ import __version__
+from pdf12step.meetings import NORMALIZED_SECTIONS, MeetingSet, Calendar, section_file
 from pdf12step.cached import cached_property
+from pdf12step.assets import AssetCache
 from pdf12step.config import BASE_DIR, BASE_TEMPLATE
-from pdf12step.utils import slugify, link, codify, qrcode, show
+from pdf12step.fragments import FragmentCache
+from pdf12step.delta import read_changes
+from pdf12step.filters import filter_query
+from pdf12step.impact import GroupCache, TrackedConfig, dirty_ids
+from pdf12step.loaders import CompiledLoader, ProfiledLoader, MANIFEST
+from pdf12step.pages import PageCache, html_key, needs_notes_page
+from pdf12step.utils import (slugify, link, codify, qrcode, show, checksum, atomic_open, file_checksum, file_stamp,
+                             QRCODE_BOX_SIZE)
 from pdf12step.log import logger
+from pdf12step.profiling import profiler, span
 
 
-FSBC = FileSystemBytecodeCache()
 ASSET_TEMPLATES = {
     'assets/img/cover_background.svg': ('img', 'cover_background.svg'),
 }
+GENERATED_ASSETS = [path.join(*dest) for dest in ASSET_TEMPLATES.values()] + [path.join('img', 'qrcode.png')]
+STYLESHEETS = ['assets/css/font.css', 'assets/css/style.css']
+ROW_TEMPLATE = 'includes/info.html'
+PREFLIGHT_TEMPLATE = 'preflight.html'
+ROW_CONFIG_KEYS = ('show_links', 'hide', 'codemap', 'filtercodes')
+# config values read by Context methods the section groups use instead of from the template
+GROUP_CONFIG_KEYS = ('zipcodes', 'start_day')
 
 
 def asset_join(asset_dir, *paths):
     return path.join(asset_dir, *paths).replace('\\', '/')
 
 
+# modification time of the compiled templates manifest and jinja2 Environment by template dirs and cache_dir
+envs = {}
+
+
+def get_template_dirs(config):
+    """
+    Returns a list of template directories for jinja2 to search
+    Adds directories from config.template_dirs first and the package templates last
+
+    :param dict config: Config with template_dirs
+    :rtype: list
+    """
+    dirs = []
+    if config.template_dirs:
+        for tdir in config.template_dirs:
+            tdir = path.abspath(path.expandvars(tdir))
+            if not path.isdir(tdir):
+                raise OSError(f'Template folder not found: {tdir}')
+            dirs.append(tdir)
+    dirs.append(path.join(BASE_DIR, 'templates'))  # package templates
+    logger.info(f'Using template dirs: {dirs}')
+    return dirs
+
+
+def bytecode_cache(cache_dir):
+    """
+    Returns the jinja2 bytecode cache persisted in the bytecode folder of the cache_dir
+
+    :param str cache_dir: Project cache directory (config.cache_dir)
+    :rtype: jinja2.FileSystemBytecodeCache
+    """
+    directory = path.join(cache_dir, 'bytecode')
+    makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def get_env(config, compiled=True):
+    """
+    Returns jinja2 Environment used to render all templates for the given config.
+    Uses the templates compiled by `12step compile-templates` in the cache_dir if they exist.
+    Configs with the same template dirs and cache_dir share one Environment, eg several sites served by one process
+
+    :param dict config: Config with template_dirs and cache_dir
+    :param bool compiled: Load precompiled templates when available
+    :rtype: jinja2.Environment
+    """
+    template_dirs = get_template_dirs(config)
+    cache_dir = config.get('cache_dir')
+    compiled_dir = path.join(cache_dir, 'compiled') if compiled and cache_dir else None
+    manifest = path.join(compiled_dir, MANIFEST) if compiled_dir else None
+    if manifest and not path.isfile(manifest):
+        manifest = None
+    key = (tuple(template_dirs), cache_dir, bool(manifest), profiler.enabled)
+    stamp = manifest and path.getmtime(manifest)
+    cached = envs.get(key)
+    # recompiling the templates replaces the Environment of the old compiled ones
+    if cached is None or cached[0] != stamp:
+        cached = envs[key] = (stamp, make_env(template_dirs, cache_dir, compiled_dir if manifest else None))
+    return cached[1]
+
+
+def make_env(template_dirs, cache_dir, compiled_dir=None):
+    """
+    Returns a new jinja2 Environment loading templates from the template_dirs and the package templates
+
+    :param list template_dirs: Template directories to search first
+    :param str cache_dir: Cache directory for the bytecode cache
+    :param str compiled_dir: Directory of templates compiled by `12step compile-templates`
+    :rtype: jinja2.Environment
+    """
+    loader = ChoiceLoader([FileSystemLoader(template_dirs), PackageLoader('pdf12step')])
+    if compiled_dir:
+        loader = CompiledLoader(loader, compiled_dir)
+        logger.info(f'Using compiled templates from {compiled_dir}')
+    if profiler.enabled:
+        loader = ProfiledLoader(loader)
+    environ = Environment(
+        loader=loader,
+        autoescape=select_autoescape(),
+        bytecode_cache=bytecode_cache(cache_dir) if cache_dir else None,
+    )
+    logger.info('Loaded template env')
+    return environ
+
+
 class Context(dict):
     """
     Context for jinja2 templating 
 
     :param dict args: Runtime arguments to inject into template context
+    :param MeetingSet meetings: Already loaded meetings to filter instead of loading the data file
     """
 
-    def __init__(self, config, args):
+    def __init__(self, config, args, meetings=None):
         dict.__init__(self)
         self.config = config
         self.args = args = args if isinstance(args, dict) else args.__dict__
         self.is_flask = args.get('flask', False)
-        self.meetings = self.get_meetings()
+        # time and data file stamp the meetings were loaded at, changes after them are picked up by the next render,
+        # with the stamps of the locations and groups files of the normalized model
+        sections = NORMALIZED_SECTIONS if config.get('normalized') else ()
+        self.loaded = (time.time(), file_stamp(self.data_file),
+                       [file_stamp(section_file(self.data_file, section)) for section in sections])
+        self.meetings = self.get_meetings(meetings=meetings)
+        self.group_stats = {'rendered': [], 'reused': []}
+        # changed meeting ids by the data file stamp and time group variants were rendered from,
+        # and the change log they are looked up in, both read again by the next render
+        self.dirty_since = {}
+        self.changes = None
         self.calendar = Calendar(config.start_day)
         self.update(
             meetings=self.meetings,
@@ -53,17 +169,51 @@ class Context(dict):
             link=link(config.show_links),
             show=show(config.hide),
             qrcode=self.qrcode,
-            config=config
+            row=self.row,
+            group=self.group,
+            config=config if self.groups is None else TrackedConfig(config)
         )
         logger.info('Loaded context config')
         logger.debug(pformat(dict(self)))
 
     @cached_property
-    def qrcode(self):
+    def assets(self):
+        """
+        Returns the cache of generated assets so unchanged assets are not rewritten
+
+        :rtype: AssetCache
+        """
+        return AssetCache(self.config.get('cache_dir'))
+
+    @cached_property
+    def qrcode_key(self):
+        """
+        Returns the hash of the QR code inputs or None if there is no config.qrcode_url
+
+        :rtype: str
+        """
         if self.config.qrcode_url:
-            img_file = asset_join(self.config.asset_dir, 'img', 'qrcode.png')
-            qrcode(self.config.qrcode_url, img_file, back_color=self.config.color)
+            return checksum([self.config.qrcode_url, self.config.color, QRCODE_BOX_SIZE])
+
+    def write_qrcode(self):
+        """
+        Writes the QR code image of config.qrcode_url to the asset_dir if it changed and returns its filename
+
+        :rtype: str
+        """
+        img_file = asset_join(self.config.asset_dir, 'img', 'qrcode.png')
+
+        def write(imgfile):
+            qrcode(self.config.qrcode_url, imgfile, back_color=self.config.color, box_size=QRCODE_BOX_SIZE)
+
+        if self.assets.update(img_file, self.qrcode_key, write, 'wb'):
             logger.info(f'Created QR {img_file}')
+        return img_file
+
+    @cached_property
+    def qrcode(self):
+        if self.config.qrcode_url:
+            img_file = self.write_qrcode()
             if self.is_flask:
                 return path.relpath(img_file, getcwd())
             return img_file
@@ -95,18 +245,23 @@ class Context(dict):
             codes.append((code, name))
         return codes
 
-    def get_meetings(self, meetings_file=None):
+    @span('get_meetings')
+    def get_meetings(self, meetings_file=None, meetings=None):
         """
         Loads list of meetings for main context based on filters/limiting
 
+        :param str meetings_file: Meeting data file to load, defaults to the downloaded file for the site
+        :param MeetingSet meetings: Already loaded meetings to filter instead of loading a file
         :rtype: MeetingSet
         """
-        if meetings_file is None:
-            meetings_file = path.join(self.config.data_dir, f'{self.config.site_domain}-meetings.json')
-        if not path.isfile(meetings_file):
-            raise OSError(f'Meeting data file {meetings_file} not found! Please download first')
-        meetings = MeetingSet(meetings_file)
-        logger.info(f'Loaded {len(meetings)} meetings from {meetings_file}')
+        if meetings is None:
+            if meetings_file is None:
+                meetings_file = self.data_file
+            if not path.isfile(meetings_file):
+                raise OSError(f'Meeting data file {meetings_file} not found! Please download first')
+            with span('load meetings'):
+                meetings = MeetingSet.load(meetings_file, self.config.get('normalized'))
+            logger.info(f'Loaded {len(meetings)} meetings from {meetings_file}')
         if getattr(self.config, 'attendance_options', []):
             meetings = meetings.by_value('attendance_option')
             options = [meeting_set for attendance_option, meeting_set in meetings
@@ -118,11 +273,23 @@ class Context(dict):
             meetings = MeetingSet(meetings.filter(**self.config.filter))
         if self.config.filtercodes:
             meetings = MeetingSet(meetings.filter_types(self.config.filtercodes))
+        if self.args.get('query'):
+            meetings = filter_query(meetings, self.args['query'])
+            logger.info(f'Filtered {len(meetings)} meetings by {self.args["query"]}')
         limit = self.args.get('limit', 0)
         if limit:
             meetings = meetings.limit(int(limit))
         return meetings
 
+    @cached_property
+    def data_file(self):
+        """
+        Returns the path of the downloaded meetings data file for the site
+
+        :rtype: str
+        """
+        return path.join(self.config.data_dir, f'{self.config.site_domain}-meetings.json')
+
     @cached_property
     def stylesheets(self):
         """
@@ -131,7 +298,7 @@ class Context(dict):
 
         :rtype: list
         """
-        sheets = self.config.stylesheets if self.config.stylesheets else ['assets/css/font.css', 'assets/css/style.css']
+        sheets = self.config.stylesheets if self.config.stylesheets else STYLESHEETS
         logger.info(f'Using stylesheets: {sheets}')
         return sheets
 
@@ -143,16 +310,7 @@ class Context(dict):
 
         :rtype: list
         """
-        dirs = []
-        if self.config.template_dirs:
-            for tdir in self.config.template_dirs:
-                tdir = path.abspath(path.expandvars(tdir))
-                if not path.isdir(tdir):
-                    raise OSError(f'Template folder not found: {tdir}')
-                dirs.append(tdir)
-        dirs.append(path.join(BASE_DIR, 'templates'))  # package templates
-        logger.info(f'Using template dirs: {dirs}')
-        return dirs
+        return get_template_dirs(self.config)
 
     @cached_property
     def env(self):
@@ -161,14 +319,157 @@ class Context(dict):
 
         :rtype: jinja2.Environment
         """
-        global FSBC
-        environ = Environment(
-            loader=ChoiceLoader([FileSystemLoader(self.template_dirs), PackageLoader('pdf12step')]),
-            autoescape=select_autoescape(),
-            bytecode_cache=FSBC,
-        )
-        logger.info('Loaded template env')
-        return environ
+        return get_env(self.config)
+
+    @cached_property
+    def fragments(self):
+        """
+        Returns the on disk cache of rendered meeting rows in the cache_dir.
+        Returns None if config.row_cache is off
+
+        :rtype: FragmentCache
+        """
+        if self.config.get('row_cache') and self.config.get('cache_dir'):
+            return FragmentCache(path.join(self.config.cache_dir, 'fragments.sqlite3'))
+
+    @cached_property
+    def macros(self):
+        """
+        Returns the macros.html template module imported once with this context for rendering rows
+
+        :rtype: jinja2.environment.TemplateModule
+        """
+        return self.env.get_template('macros.html').make_module(dict(self))
+
+    @cached_property
+    def row_salt(self):
+        """
+        Returns a hash of everything other than the meeting that a rendered row depends on.
+        That is the package version, the ROW_CONFIG_KEYS config values and the row and macros template sources
+
+        :rtype: str
+        """
+        sources = [self.env.loader.get_source(self.env, name)[0] for name in (ROW_TEMPLATE, 'macros.html')]
+        return checksum([__version__, {key: self.config.get(key) for key in ROW_CONFIG_KEYS}, sources])
+
+    def row(self, meeting):
+        """
+        Renders the includes/info.html table row for the meeting.
+        Rows of unchanged meetings are loaded from the fragment cache without rendering.
+        Meetings without an id or slug are always rendered since their anchor id changes every run
+
+        :param Meeting meeting: Meeting to render a row for
+        :rtype: markupsafe.Markup
+        """
+        key = None
+        if self.fragments is not None and (meeting.id or meeting.slug):
+            key = checksum([self.row_salt, {name: value for name, value in meeting.record().items() if value != ''}])
+            content = self.fragments.get(key)
+            if content is not None:
+                return Markup(content)
+        content = self.env.get_template(ROW_TEMPLATE).render(self, meeting=meeting, macros=self.macros)
+        if key is not None:
+            self.fragments.set(key, content)
+        return Markup(content)
+
+    @cached_property
+    def groups(self):
+        """
+        Returns the on disk cache of rendered section groups in the cache_dir.
+        Returns None if config.group_cache is off
+
+        :rtype: GroupCache
+        """
+        if self.config.get('group_cache') and self.config.get('cache_dir'):
+            return GroupCache(path.join(self.config.cache_dir, 'groups.sqlite3'))
+
+    def dirty(self, stamp, time):
+        """
+        Returns the ids of the meetings that changed since a group was rendered from the data file with the stamp
+        at the time, or None if they are not known and the group has to be rendered again.
+        Each edition stores its own group variants, so each variant is checked against the data it was rendered from
+
+        :param list stamp: Modification time and size of the data file the group was rendered from
+        :param float time: Time the data file was loaded at
+        :rtype: set
+        """
+        if stamp is None or self.loaded[1] is None:
+            return None
+        if list(stamp) == list(self.loaded[1]):
+            return set()
+        key = (tuple(stamp), time)
+        if key not in self.dirty_since:
+            if self.changes is None:
+                self.changes = read_changes(self.data_file)
+            self.dirty_since[key] = dirty_ids(self.changes, {'stamp': stamp, 'time': time}, self.loaded[1])
+        return self.dirty_since[key]
+
+    def group_salt(self, section):
+        """
+        Returns a hash of what a group depends on other than its meetings and the config values its template reads.
+        That is the row salt, the section template source, the GROUP_CONFIG_KEYS config values
+        and the stamps of the locations and groups files of the normalized model
+
+        :param str section: Name of the section template in includes/sections
+        :rtype: str
+        """
+        source = self.env.loader.get_source(self.env, f'includes/sections/{section}.html')[0]
+        return checksum([self.row_salt, source, {key: self.config.get(key) for key in GROUP_CONFIG_KEYS},
+                         self.loaded[2]])
+
+    def group(self, section, name, meetings=None, caller=None):
+        """
+        Renders the body of a `{% call group(...) %}` block of a section template, eg one by_value group of a list.
+        Groups whose meetings did not change and whose config values are the same are loaded from the group cache.
+        Groups with meetings without an id are always rendered
+
+        :param str section: Name of the section template in includes/sections
+        :param str name: Name of the group within the section
+        :param MeetingSet meetings: Meetings the group shows
+        :param caller: Body of the call block
+        :rtype: markupsafe.Markup
+        """
+        if isinstance(meetings, MeetingSet):
+            ids = meetings.ids()
+        else:
+            ids = [str(meeting.id) if meeting.id else None for meeting in meetings or ()]
+        if self.groups is None or None in ids:
+            self.group_stats['rendered'].append(f'{section}:{name}')
+            return caller()
+        tracked = self['config']
+        key = checksum([self.data_file, section, name, self.group_salt(section)])
+        variant = self.groups.lookup(key, ids, self.config, self.dirty)
+        if variant is not None:
+            for frame in tracked.frames:
+                frame.update(variant['keys'])
+            if variant['stamp'] != self.loaded[1]:
+                # none of its meetings changed, so it is also the group of the current data
+                self.groups.store(key, ids, self.config, variant['keys'], variant['content'], self.loaded[1],
+                                  self.loaded[0])
+            self.group_stats['reused'].append(f'{section}:{name}')
+            return Markup(variant['content'])
+        tracked.frames.append(set())
+        try:
+            content = caller()
+        finally:
+            keys = tracked.frames.pop()
+        for frame in tracked.frames:
+            frame.update(keys)
+        self.groups.store(key, ids, self.config, keys, str(content), self.loaded[1], self.loaded[0])
+        self.group_stats['rendered'].append(f'{section}:{name}')
+        return Markup(content)
+
+    def flush(self):
+        """
+        Writes the new rows and groups to their caches after a render
+        """
+        self.dirty_since, self.changes = {}, None
+        if self.fragments is not None:
+            self.fragments.flush()
+        if self.groups is not None:
+            self.groups.flush()
+            logger.info(f"Rendered {len(self.group_stats['rendered'])} groups, "
+                        f"reused {len(self.group_stats['reused'])}")
 
     def by_value(self, meetings, key):
         """
@@ -198,18 +499,51 @@ class Context(dict):
         if template is None:
             template = self.config.get('base_template', BASE_TEMPLATE)
         logger.info(f'Renderd {template}')
-        return self.env.get_template(template).render(self)
+        self.group_stats = {'rendered': [], 'reused': []}
+        with span(f'render {template}'):
+            content = self.env.get_template(template).render(self)
+        self.flush()
+        return content
 
+    def stream(self, outfile, template=None):
+        """
+        Renders a template by name writing its content to the file object piece by piece
+        without holding the whole content in memory
+
+        :param file outfile: Text file object to write to
+        :param str template: relative name of template to load
+        """
+        if template is None:
+            template = self.config.get('base_template', BASE_TEMPLATE)
+        logger.info(f'Streaming {template}')
+        self.group_stats = {'rendered': [], 'reused': []}
+        with span(f'render {template}'):
+            for chunk in self.env.get_template(template).generate(self):
+                outfile.write(chunk)
+        self.flush()
+
+    @span('prerender')
     def prerender(self):
         """
         Prerenders the assets ahead of page render to ensure proper values in assets are set
+        Asset files are only written again when their content changed
         """
+        if self.config.qrcode_url:
+            self.write_qrcode()
         for template, dest in ASSET_TEMPLATES.items():
             dest = asset_join(self.config.asset_dir, *dest)
-            dest_dir = path.dirname(dest)
-            makedirs(dest_dir, exist_ok=True)
-            with open(dest, 'w') as destfile:
-                destfile.write(self.render(template))
+            content = self.env.get_template(template).render(self)
+            self.assets.update(dest, checksum(content), lambda destfile: destfile.write(content))
+
+    def asset_signature(self):
+        """
+        Returns a hash of the asset_dir and the content of the assets written by prerender and qrcode.
+        Contexts with the same signature can render at the same time without overwriting each other's assets
+
+        :rtype: str
+        """
+        contents = [self.env.get_template(template).render(self) for template in ASSET_TEMPLATES]
+        return checksum([self.config.asset_dir, contents, self.qrcode_key])
 
     def html(self, template=None):
         """
@@ -217,24 +551,150 @@ class Context(dict):
 
         :rtype: weasyprint.HTML
         """
-        return HTML(string=self.render(template), base_url=path.dirname(self.config.asset_dir), encoding='utf8')
+        from weasyprint import HTML
+
+        content = self.render(template)
+        with span('weasyprint parse'):
+            return HTML(string=content, base_url=path.dirname(self.config.asset_dir), encoding='utf8')
 
-    def pdf(self, template=None):
+    def document(self, html, key=None):
         """
-        Returns the PDF content from this  of context
+        Lays out the weasyprint HTML into pages and repeats the notes page to get an even number of pages
 
-        :rtype: bytes
+        :param weasyprint.HTML html: HTML to lay out
+        :param str key: Hash of the HTML to cache the page count by
+        :rtype: weasyprint.document.Document
         """
-        html = self.html(template)
-        try:
-            document = html.render(optimize_size=('images', 'fonts'))
-        except TypeError:
-            # older versions of weasyprint
-            document = html.render()
-        if self.config.even_pages and len(document.pages) % 2 and len(document.pages) > 2:
+        with span('weasyprint layout'):
+            try:
+                document = html.render(optimize_size=('images', 'fonts'))
+            except TypeError:
+                # older versions of weasyprint
+                document = html.render()
+        if key is not None:
+            self.page_cache.set(key, len(document.pages))
+        if needs_notes_page(len(document.pages), self.config.even_pages):
             note = document.pages[-2]
             document.pages.insert(-1, note)
-        content = document.write_pdf(zoom=self.config.zoom)
         logger.info(f'Generated {len(document.pages)} pages')
-        logger.info(f'Generated {len(content)//1000}KB of PDF content')
-        return content
+        return document
+
+    @cached_property
+    def page_cache(self):
+        """
+        Returns the cache of page counts by HTML hash
+
+        :rtype: PageCache
+        """
+        return PageCache(self.config.get('cache_dir'))
+
+    def layout_pages(self, content):
+        """
+        Returns the number of pages the HTML content lays out into.
+        Only lays it out if the content was not laid out before
+
+        :param str content: HTML to count the pages of
+        :rtype: int
+        """
+        key = html_key(content)
+        pages = self.page_cache.get(key)
+        if pages is None:
+            from weasyprint import HTML
+
+            html = HTML(string=content, base_url=path.dirname(self.config.asset_dir), encoding='utf8')
+            with span('weasyprint layout'):
+                pages = len(html.render().pages)
+            self.page_cache.set(key, pages)
+        return pages
+
+    @span('page_count')
+    def page_count(self, template=None, exact=False):
+        """
+        Returns the number of pages the PDF will have without laying out the whole document when possible.
+        Returns a dict with the `pages`, whether the count is `exact` and the page count of each of the `sections`.
+
+        The count is exact when the same HTML was laid out before (eg by the last PDF build) or exact is passed.
+        Otherwise it is estimated by adding up the pages of each section laid out on its own.
+        Sections are cached by their HTML, so only the sections that changed are laid out again.
+        The estimate assumes each section starts a new page like the package stylesheet does
+
+        :param str template: relative name of template to load
+        :param bool exact: Lay out the whole document if its page count is not cached
+        :rtype: dict
+        """
+        content = self.render(template)
+        sections = {}
+        pages = self.page_cache.get(html_key(content))
+        if pages is None and exact:
+            pages = self.layout_pages(content)
+        if pages is None:
+            for section in ['cover'] + list(self.config.sections) + ['backcover']:
+                html = self.env.get_template(PREFLIGHT_TEMPLATE).render(self, section=section)
+                # the other sections start with a page of their own
+                sections[section] = self.layout_pages(html) - (section != 'cover')
+            pages = sum(sections.values())
+        if needs_notes_page(pages, self.config.even_pages):
+            pages += 1
+        return {'pages': pages, 'exact': not sections, 'sections': sections}
+
+    def pdf(self, template=None, target=None):
+        """
+        Returns the PDF content from this context or writes it to the target and returns its number of pages.
+        Filename targets are written to a temporary file next to them which replaces them once the PDF is complete,
+        so a failed render never leaves a half written PDF behind
+
+        :param str template: relative name of template to load
+        :param target: Filename or binary file object to write the PDF to
+        :rtype: bytes or int
+        """
+        if target is None:
+            output = io.BytesIO()
+            self.write_pdf(output, template)
+            content = output.getvalue()
+            logger.info(f'Generated {len(content)//1000}KB of PDF content')
+            return content
+        if isinstance(target, str):
+            with atomic_open(target, 'wb') as pdffile:
+                return self.write_pdf(pdffile, template)
+        return self.write_pdf(target, template)
+
+    def write_pdf(self, target, template=None):
+        """
+        Writes the PDF straight to the target without returning its content and returns its number of pages.
+        With config.low_memory the HTML is streamed to a temporary file instead of kept as a string,
+        the parsed HTML is dropped before the PDF is written and the laid out document right after
+
+        :param target: Binary file object to write the PDF to
+        :param str template: relative name of template to load
+        :rtype: int
+        """
+        from weasyprint import HTML
+
+        if not self.config.low_memory:
+            content = self.render(template)
+            with span('weasyprint parse'):
+                html = HTML(string=content, base_url=path.dirname(self.config.asset_dir), encoding='utf8')
+            document = self.document(html, html_key(content))
+            del html, content
+        else:
+            tmp_dir = path.join(self.config.cache_dir, 'tmp') if self.config.get('cache_dir') else None
+            if tmp_dir:
+                makedirs(tmp_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', suffix='.html', dir=tmp_dir, encoding='utf8', newline='',
+                                             delete=False) as htmlfile:
+                self.stream(htmlfile, template)
+            try:
+                with span('weasyprint parse'):
+                    html = HTML(filename=htmlfile.name, base_url=path.dirname(self.config.asset_dir),
+                                encoding='utf8')
+                document = self.document(html, file_checksum(htmlfile.name))
+                del html
+                gc.collect()
+            finally:
+                unlink(htmlfile.name)
+        with span('weasyprint write_pdf'):
+            document.write_pdf(target, zoom=self.config.zoom)
+        pages = len(document.pages)
+        del document
+        gc.collect()
+        return pages
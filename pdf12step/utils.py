@@ -1,10 +1,13 @@
 import re
 import os
 import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
 from csv import DictWriter
+from threading import Lock
 
 from markupsafe import Markup
-from qrcode import QRCode
 
 try:
     from yaml import CLoader as Loader
@@ -13,6 +16,8 @@ except ImportError:
 
 from pdf12step.adict import AttrDict
 
+QRCODE_BOX_SIZE = 5
+
 
 def yaml_load(filename_or_string):
     """
@@ -62,17 +67,130 @@ def json_dump(data, outfile):
         json.dump(data, jsonfile, indent=2)
 
 
+def checksum(data):
+    """
+    Returns a stable SHA1 hex digest of JSON serializable data
+
+    :param data: Data to hash, dict keys are sorted so ordering does not matter
+    :rtype: str
+    """
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_checksum(filename):
+    """
+    Returns the SHA1 hex digest of a file's contents
+
+    :param str filename: File to hash
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(filename):
+    """
+    Returns the modification time in nanoseconds and the size of a file or None if it does not exist.
+    Cheaper than hashing to tell whether a file was replaced
+
+    :param str filename: File to stat
+    :rtype: list
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+@contextmanager
+def atomic_open(dest, mode='w'):
+    """
+    Opens a temporary file next to dest for writing and moves it over dest once the block exits without errors.
+    Readers of dest see either the old or the new file, never a partially written one.
+    Keeps the permissions of an existing dest file
+
+    :param str dest: Filename to write to
+    :param str mode: File mode to open the temporary file with (eg w/wb)
+    """
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=dest_dir, prefix=f'.{os.path.basename(dest)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as tmpfile:
+            yield tmpfile
+        os.chmod(tmpname, os.stat(dest).st_mode if os.path.isfile(dest) else 0o644)
+        os.replace(tmpname, dest)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+def iter_chunks(fileobj, chunk_size=64 * 1024):
+    """
+    Yields the rest of the file object in chunks of chunk_size bytes and closes it once read or abandoned.
+    Used to stream a file as an HTTP response body without reading it all into memory
+
+    :param file fileobj: File object to read
+    :param int chunk_size: Number of bytes to read at a time
+    """
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+class SingleFlight(object):
+    """
+    Per key locks so only one thread computes the value of a key while the other threads asking for it wait.
+    Locks are dropped once no thread holds or waits for them
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.locks = {}
+
+    @contextmanager
+    def __call__(self, key):
+        with self.lock:
+            lock, waiting = self.locks.get(key, (None, 0))
+            lock = lock or Lock()
+            self.locks[key] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                lock, waiting = self.locks[key]
+                if waiting == 1:
+                    del self.locks[key]
+                else:
+                    self.locks[key] = (lock, waiting - 1)
+
+
 def qrcode(data, dest, **kwargs):
     """
-    Creates a QRCode of the given data written as a PNG to the dest filename
+    Creates a QRCode of the given data written as a PNG to the dest filename or file object
     Returns the PIL image instance
     """
-    qr = QRCode(box_size=kwargs.pop('box_size', 5))
+    from qrcode import QRCode
+
+    qr = QRCode(box_size=kwargs.pop('box_size', QRCODE_BOX_SIZE))
     qr.add_data(data, kwargs.pop('optimize', 20))
     qr.make(fit=True)
     img = qr.make_image(**kwargs)
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    img.save(dest)
+    if isinstance(dest, str):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        img.save(dest)
+    else:
+        img.save(dest, format='PNG')
     return img
 
 
@@ -0,0 +1,192 @@
+import heapq
+import json
+import random
+import time
+from os import path
+from queue import Full, Queue
+from threading import Lock, Thread
+
+from pdf12step.build import build, OUTPUT
+from pdf12step.client import Client
+from pdf12step.delta import update
+from pdf12step.log import logger
+from pdf12step.manifest import BuildManifest, build_inputs, meetings_file
+from pdf12step.meetings import NORMALIZED_SECTIONS, section_file
+from pdf12step.utils import atomic_open
+
+
+class Watcher(object):
+    """
+    Polls the TSML meetings feed of each site used by the editions and rebuilds a site's editions only when
+    its meetings data, config or templates changed.
+    The locations and groups feeds are polled too for sites with editions that load the normalized model.
+    The configs of the editions are loaded again on every check, so config edits are picked up while watching.
+    Sites are checked every interval seconds, spread by a random jitter so they are not all polled at once.
+    Rebuilds run one at a time from a bounded queue in a background thread.
+    The time and duration of the last check of each site and build of each edition are kept in the status_file
+
+    :param list editions: Edition instances to keep up to date
+    :param list formats: Output formats (pdf/html)
+    :param str output: Output filename pattern with {edition}, {format} and {date_str} fields
+    :param float interval: Seconds between checks of each site
+    :param float jitter: Fraction of the interval to randomly shift each check by
+    :param int max_queue: Number of editions that can wait to be rebuilt
+    :param str status_file: JSON file to record the status in
+    """
+
+    def __init__(self, editions, formats=('pdf',), output=OUTPUT, interval=900, jitter=0.1, max_queue=16,
+                 status_file='watch.json'):
+        self.editions = editions
+        self.formats = formats
+        self.output = output
+        self.interval = interval
+        self.jitter = jitter
+        self.status_file = status_file
+        self.queue = Queue(max_queue)
+        self.queued = set()
+        self.lock = Lock()
+        self.sites = {}
+        for edition in editions:
+            self.sites.setdefault(meetings_file(edition.config), []).append(edition)
+        self.status = self.load_status()
+
+    def load_status(self):
+        if path.isfile(self.status_file):
+            try:
+                with open(self.status_file) as sfile:
+                    return json.load(sfile)
+            except ValueError:
+                pass
+        return {'sites': {}, 'editions': {}}
+
+    def record(self, kind, name, **values):
+        """
+        Updates the status of a site or edition and writes the status file
+
+        :param str kind: sites or editions
+        :param str name: Site domain or edition name
+        """
+        with self.lock:
+            self.status[kind].setdefault(name, {}).update(values)
+            with atomic_open(self.status_file) as sfile:
+                json.dump(self.status, sfile, indent=2)
+
+    def delay(self):
+        """
+        Returns the seconds until the next check of a site
+
+        :rtype: float
+        """
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def check(self, data_file):
+        """
+        Downloads the meetings of the site of the data_file and merges them into the file if any of them changed,
+        with the locations and groups next to it if an edition is normalized.
+        Queues the site's editions that have outputs whose inputs changed
+
+        :param str data_file: Meetings data file of the site
+        """
+        editions = self.sites[data_file]
+        for edition in editions:
+            if edition.reload():
+                logger.info(f'Config of {edition.name} changed')
+        config = editions[0].config
+        start = time.time()
+        client = Client(config.site_url, config.api_url, config.nonce_url)
+        data = client.meetings()
+        changes = [update(data_file, data)]
+        if any(edition.config.get('normalized') for edition in editions):
+            changes.extend(update(section_file(data_file, section), getattr(client, section)())
+                           for section in NORMALIZED_SECTIONS)
+        changed = any(change[key] for change in changes for key in ('added', 'changed', 'removed'))
+        if changed:
+            self.record('sites', config.site_domain, last_change=start)
+        self.record('sites', config.site_domain, last_check=start, check_seconds=time.time() - start, changed=changed,
+                    meetings=len(data), error=None)
+        for edition in editions:
+            if changed or not self.is_current(edition):
+                self.enqueue(edition)
+
+    def is_current(self, edition):
+        """
+        Returns True if all the outputs of the edition were built from the current inputs
+
+        :param Edition edition: Edition to check
+        :rtype: bool
+        """
+        options = {key: edition.args.get(key) for key in ('template', 'limit')}
+        inputs = build_inputs(edition.config, options)
+        for fmt in self.formats:
+            outfile = self.output.format(edition=edition.name, format=fmt, date_str=edition.config.date_str)
+            if not BuildManifest(outfile, inputs).is_current():
+                return False
+        return True
+
+    def enqueue(self, edition):
+        """
+        Queues the edition to be rebuilt unless it is already queued.
+        When the queue is full the edition is left for the next check of its site
+
+        :param Edition edition: Edition to rebuild
+        """
+        with self.lock:
+            if edition.name in self.queued:
+                return
+            try:
+                self.queue.put_nowait(edition)
+            except Full:
+                logger.warning(f'Rebuild queue is full, {edition.name} waits for the next check')
+                return
+            self.queued.add(edition.name)
+        logger.info(f'Queued {edition.name} to rebuild')
+
+    def builder(self):
+        """
+        Rebuilds the queued editions one at a time until None is queued
+        """
+        while True:
+            edition = self.queue.get()
+            if edition is None:
+                break
+            with self.lock:
+                self.queued.discard(edition.name)
+            start = time.time()
+            try:
+                report = build([edition], self.formats, self.output)
+                self.record('editions', edition.name, last_build=start, build_seconds=time.time() - start,
+                            outputs=report['editions'][0]['outputs'], error=None)
+            except Exception as exc:
+                logger.exception(f'Rebuilding {edition.name} failed')
+                self.record('editions', edition.name, last_build=start, build_seconds=time.time() - start,
+                            error=str(exc))
+
+    def run(self, once=False):
+        """
+        Checks the sites and rebuilds their changed editions until interrupted
+
+        :param bool once: Check each site once, wait for the rebuilds and return
+        """
+        thread = Thread(target=self.builder, daemon=True)
+        thread.start()
+        now = time.time()
+        spread = 0 if once else self.interval * self.jitter
+        schedule = [(now + random.uniform(0, spread), data_file) for data_file in self.sites]
+        heapq.heapify(schedule)
+        try:
+            while schedule:
+                when, data_file = heapq.heappop(schedule)
+                time.sleep(max(0, when - time.time()))
+                domain = self.sites[data_file][0].config.site_domain
+                try:
+                    self.check(data_file)
+                except Exception as exc:
+                    logger.exception(f'Checking {domain} failed')
+                    self.record('sites', domain, last_check=time.time(), error=str(exc))
+                next_check = None if once else time.time() + self.delay()
+                if next_check:
+                    heapq.heappush(schedule, (next_check, data_file))
+                self.record('sites', domain, next_check=next_check)
+        finally:
+            self.queue.put(None)
+            thread.join()
@@ -0,0 +1,42 @@
+from unittest import mock
+from os import environ
+
+import pytest
+
+from .base import ENV, CONFIG_FILE, DATA_DIR
+
+
+def get_args(tmp_path):
+    return dict(config=[CONFIG_FILE], data_dir=DATA_DIR, cache_dir=str(tmp_path / 'cache'),
+                asset_dir=str(tmp_path / 'assets'))
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_edition_parse(tmp_path):
+    from pdf12step.build import Edition
+
+    print_config = tmp_path / 'print.yml'
+    print_config.write_text('show_links: false\n')
+    edition = Edition.parse(str(print_config), get_args(tmp_path))
+    assert edition.name == 'print'
+    assert edition.config.show_links is False
+    assert Edition.parse('web=', get_args(tmp_path)).config.show_links is True
+    with pytest.raises(ValueError):
+        Edition.parse('=', get_args(tmp_path))
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_build_html(tmp_path):
+    from pdf12step.build import Edition, build
+
+    args = get_args(tmp_path)
+    editions = [Edition.parse('web=', args), Edition.parse('print=show_links: false', args)]
+    output = str(tmp_path / '{edition}.{format}')
+    report = build(editions, ['html'], output)
+    assert [rep['edition'] for rep in report['editions']] == ['web', 'print']
+    web, printed = (tmp_path / 'web.html').read_text(), (tmp_path / 'print.html').read_text()
+    assert 'href=' in web and web != printed
+
+    report = build(editions, ['html'], output)
+    assert [rep['skipped'] for rep in report['editions']] == [[str(tmp_path / 'web.html')],
+                                                             [str(tmp_path / 'print.html')]]
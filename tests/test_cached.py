@@ -0,0 +1,23 @@
+import threading
+
+
+def test_cached_property_threads():
+    from pdf12step.cached import cached_property
+
+    barrier = threading.Barrier(4)
+
+    class Thing(object):
+        @cached_property
+        def value(self):
+            barrier.wait(timeout=5)  # every thread computes it at the same time
+            return object()
+
+    thing = Thing()
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(thing.value)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(values) == 4
+    assert all(value is thing.value for value in values)
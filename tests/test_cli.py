@@ -4,4 +4,24 @@ from unittest import mock
 @mock.patch('builtins.input')
 def test_prompt(mocked_input):
     from pdf12step.cli import prompt
-    assert prompt('test', 'this is a test field', default='nope', cast=bool) == {'test': True}
\ No newline at end of file
+    assert prompt('test', 'this is a test field', default='nope', cast=bool) == {'test': True}
+
+
+def test_startup_imports():
+    import subprocess
+    import sys
+    from os import path
+
+    import pytest
+
+    if sys.version_info < (3, 7):
+        pytest.skip('-X importtime needs Python 3.7')
+    heavy = {'weasyprint', 'qrcode', 'PIL', 'IPython', 'flask', 'jinja2', 'requests'}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import pdf12step.cli'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+                            cwd=path.dirname(path.dirname(__file__)))
+    # lines look like "import time:  self [us] | cumulative | imported package"
+    modules = {line.split('|')[-1].strip().split('.')[0] for line in result.stderr.splitlines()
+               if line.startswith('import time:')}
+    assert 'pdf12step' in modules
+    assert not heavy & modules, f'CLI startup imports {heavy & modules}'
@@ -0,0 +1,47 @@
+import os
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_config_cache(tmpdir):
+    from pdf12step.config import Config
+    from pdf12step.utils import yaml_load
+
+    config_file = tmpdir.join('site.yml')
+    config_file.write('color: red\n')
+    args = {'config': [CONFIG_FILE, str(config_file)]}
+    with mock.patch('pdf12step.config.yaml_load', side_effect=yaml_load) as parse:
+        first = Config.load(dict(args))
+        parses = parse.call_count
+        first['zipcodes']['00000'] = 'Changed by the caller'
+        second = Config.load(dict(args))
+        assert parse.call_count == parses
+        assert '00000' not in second['zipcodes']
+        assert second['config_hash'] == first['config_hash']
+
+        config_file.write('color: blue\n')
+        os.utime(config_file, ns=(1, 1))
+        third = Config.load(dict(args))
+        assert parse.call_count == parses + 1
+        assert third['color'] == 'blue'
+        assert third['config_hash'] != first['config_hash']
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_config_cache_size(tmpdir):
+    from pdf12step import config
+
+    config_file = tmpdir.join('site.yml')
+    config_file.write('color: red\n')
+    with mock.patch.object(config, 'MAX_MERGED_CONFIGS', 2):
+        for color in ('red', 'green', 'blue'):
+            config.Config.load({'config': [CONFIG_FILE, str(config_file)], 'color': color})
+        assert len(config.merged_configs) == 2
+    for mtime in (1, 2):
+        os.utime(config_file, ns=(mtime, mtime))
+        config.read_config_file(str(config_file))
+    # only the latest stamp of a file is kept
+    assert config.config_files[str(config_file)][0] == [2, config_file.size()]
@@ -0,0 +1,75 @@
+import os
+import threading
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, DATA_DIR
+
+
+def get_config(tmpdir, **kwargs):
+    from pdf12step.config import Config
+    from pdf12step.adict import AttrDict
+
+    kwargs.update(config=[CONFIG_FILE], cache_dir=str(tmpdir.join('cache')), data_dir=DATA_DIR)
+    return AttrDict(Config.load(kwargs))
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_context_cache(tmpdir):
+    from pdf12step.contexts import ContextCache
+
+    cache = ContextCache(maxsize=2)
+    config = get_config(tmpdir)
+    with mock.patch('pdf12step.contexts.Context', side_effect=lambda config, args: object()):
+        first = cache.get(config, {'limit': '5', 'flask': True})
+        assert cache.get(config, {'flask': True, 'limit': '5 '}) is first
+        second = cache.get(config, {'limit': '6'})
+        assert second is not first
+        cache.get(config, {'limit': '7'})
+        assert cache.get(config, {'limit': '5', 'flask': True}) is not first
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (1, 4, 2, 2)
+        cache.clear()
+        assert cache.stats()['size'] == 0
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_context_cache_data_change(tmpdir):
+    from pdf12step.contexts import ContextCache
+    from pdf12step.manifest import meetings_file
+
+    config = get_config(tmpdir)
+    data_file = tmpdir.join(os.path.basename(meetings_file(config)))
+    data_file.write('[]')
+    config.data_dir = str(tmpdir)
+    cache = ContextCache()
+    key = cache.key(config, {})
+    data_file.write('[{}]')
+    os.utime(data_file, ns=(1, 1))
+    assert cache.key(config, {}) != key
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_context_cache_single_flight(tmpdir):
+    from pdf12step.contexts import ContextCache
+
+    cache = ContextCache()
+    config = get_config(tmpdir)
+    calls = []
+    started = threading.Event()
+
+    def build(config, args):
+        calls.append(args)
+        started.wait(1)
+        return object()
+
+    with mock.patch('pdf12step.contexts.Context', side_effect=build):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(config, {}))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.set()
+        for thread in threads:
+            thread.join()
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+from os import environ
+from unittest import mock
+
+from .base import ENV, CONFIG_FILE, DATA_DIR, MEETINGS_FILE
+
+
+def test_shared_dataset(tmpdir):
+    from pdf12step.dataset import attach, derived_fields
+    from pdf12step.meetings import MeetingSet
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    shutil.copy(MEETINGS_FILE, data_file)
+    cache_dir = str(tmpdir.join('cache'))
+    dataset = attach(data_file, cache_dir)
+    assert os.path.isfile(dataset.filename)
+    meetings = MeetingSet(data_file).enrich()
+    shared = dataset.meetings()
+    assert len(shared) == len(meetings)
+    for meeting, attached in zip(meetings, shared):
+        assert dict(attached) == dict(meeting)
+        assert attached.missing == ''
+        for name in derived_fields():
+            if name != 'id_display':
+                assert attached.__dict__[name] == getattr(meeting, name)
+    assert [(value, [m.id for m in group]) for value, group in dataset.by_value('region_display')] == \
+        [(value, [m.id for m in group]) for value, group in meetings.by_value('region_display')]
+    assert attach(data_file, cache_dir) is dataset
+
+    with open(data_file, 'w') as dfile:
+        json.dump(json.load(open(MEETINGS_FILE))[:3], dfile)
+    os.utime(data_file, ns=(1, 1))
+    assert len(attach(data_file, cache_dir)) == 3
+
+
+def test_lazy_meetings(tmpdir):
+    from pdf12step.dataset import attach
+    from pdf12step.meetings import MeetingSet
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    shutil.copy(MEETINGS_FILE, data_file)
+    dataset = attach(data_file, str(tmpdir.join('cache')))
+    meetings = dataset.meetings()
+    plain = MeetingSet(data_file)
+    assert len(meetings) == len(plain)
+    assert meetings.ids() == plain.ids()
+    for attr in ('day', 'region_display'):
+        for (value, group), (expected, plain_group) in zip(meetings.limit(20).by_value(attr),
+                                                           plain.limit(20).by_value(attr)):
+            assert (value, group.ids()) == (expected, plain_group.ids())
+    assert (meetings.limit(3) + meetings.limit(2)).ids() == plain.ids()[:3] + plain.ids()[:2]
+    assert 'items' not in meetings.__dict__
+
+    first, second = [meeting for meeting in meetings if meeting.types][:2]
+    first.types.append('MUTATED')
+    assert 'MUTATED' not in second.types
+    assert 'MUTATED' not in dataset.meetings().items[0].types
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_lazy_render(tmpdir):
+    from pdf12step.adict import AttrDict
+    from pdf12step.config import Config
+    from pdf12step.dataset import attach
+    from pdf12step.templating import Context
+
+    args = dict(config=[CONFIG_FILE], data_dir=DATA_DIR, cache_dir=str(tmpdir), template_dirs=[DATA_DIR],
+                stylesheets=['blank.css'])
+    config = AttrDict(Config.load(args))
+    dataset = attach(MEETINGS_FILE, str(tmpdir))
+    html = Context(config, args).render()
+    assert Context(config, args, meetings=dataset.meetings()).render() == html
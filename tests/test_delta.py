@@ -0,0 +1,60 @@
+import json
+from unittest import mock
+
+
+def test_merge():
+    from pdf12step.delta import merge
+
+    old = [{'id': 1, 'updated': 'a', 'name': 'One'}, {'id': 2, 'updated': 'a'}, {'id': 3, 'updated': 'a'}]
+    new = [{'id': 1, 'updated': 'a', 'name': 'Changed without updated'}, {'id': 2, 'updated': 'b'}, {'id': 4}]
+    merged, change = merge(old, new)
+    assert change == {'added': ['4'], 'changed': ['2'], 'removed': ['3']}
+    assert merged == [old[0], new[1], new[2]]
+
+
+def test_update(tmpdir):
+    from pdf12step.delta import read_changes, update
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    records = [{'id': 1, 'updated': 'a'}, {'id': 2, 'updated': 'a'}]
+    assert update(data_file, records)['added'] == ['1', '2']
+    mtime = tmpdir.join('example.com-meetings.json').mtime()
+    assert not any(update(data_file, records).values())
+    assert tmpdir.join('example.com-meetings.json').mtime() == mtime
+    update(data_file, records[:1])
+    changes = read_changes(data_file)
+    assert [change['removed'] for change in changes] == [[], ['2']]
+    assert read_changes(data_file, since=changes[0]['time'])[0]['removed'] == ['2']
+    with open(data_file) as dfile:
+        assert json.load(dfile) == records[:1]
+
+
+def test_compact_changes(tmpdir):
+    from pdf12step.delta import changes_file, read_changes, update
+    from pdf12step.fragments import MAX_AGE
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    with open(changes_file(data_file), 'w') as cfile:
+        cfile.write(json.dumps({'time': 1, 'stamp': None, 'added': ['9'], 'changed': [], 'removed': []}) + '\n')
+    first = update(data_file, [{'id': 1}])
+    assert first['previous'] is None
+    second = update(data_file, [{'id': 1}, {'id': 2}])
+    assert second['previous'] == first['stamp']
+    assert [change['added'] for change in read_changes(data_file)] == [['1'], ['2']]
+
+    with mock.patch('pdf12step.delta.time.time', return_value=second['time'] + MAX_AGE + 1):
+        update(data_file, [{'id': 2}])
+    assert [change['removed'] for change in read_changes(data_file)] == [['1']]
+
+
+def test_dirty_ids():
+    from pdf12step.impact import dirty_ids
+
+    changes = [{'time': 1, 'previous': ['a'], 'stamp': ['b'], 'added': ['1'], 'changed': [], 'removed': []},
+               {'time': 2, 'previous': ['b'], 'stamp': ['c'], 'added': [], 'changed': ['2'], 'removed': []}]
+    assert dirty_ids(changes, {'stamp': ['c'], 'time': 3}, ['c']) == set()
+    assert dirty_ids(changes, {'stamp': ['a'], 'time': 0}, ['c']) == {'1', '2'}
+    assert dirty_ids(changes, {'stamp': ['b'], 'time': 1}, ['c']) == {'2'}
+    # the log does not start from the data the render used, eg it was compacted since
+    assert dirty_ids(changes[1:], {'stamp': ['a'], 'time': 0}, ['c']) is None
+    assert dirty_ids(changes, {'stamp': ['a'], 'time': 0}, ['d']) is None
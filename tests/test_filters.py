@@ -0,0 +1,25 @@
+import pytest
+
+from .base import MEETINGS_FILE
+
+
+def test_parse_query():
+    from pdf12step.filters import FilterError, parse_query
+
+    args = parse_query({'day': 'tuesday, 2,Thursday', 'attendance_option': 'online', 'limit': '5'})
+    assert args == {'limit': '5', 'query': {'day': [2, 4], 'attendance_option': ['online']}}
+    assert parse_query({'attendance_option': 'online', 'day': '4,2'})['query'] == args['query']
+    for params in ({'day': 'funday'}, {'attendance_option': 'remote'}, {'limit': 'x'}, {'color': 'red'}):
+        with pytest.raises(FilterError):
+            parse_query(params)
+
+
+def test_filter_query():
+    from pdf12step.filters import filter_query, parse_query
+    from pdf12step.meetings import MeetingSet
+
+    meetings = MeetingSet(MEETINGS_FILE)
+    query = parse_query({'day': '2', 'attendance_option': 'online,hybrid'})['query']
+    filtered = filter_query(meetings, query)
+    assert 0 < len(filtered) < len(meetings)
+    assert all(str(meeting.day) == '2' and meeting.is_conference for meeting in filtered)
@@ -0,0 +1,78 @@
+import json
+import shutil
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, DATA_DIR, MEETINGS_FILE
+
+
+def get_context(tmpdir, **kwargs):
+    from pdf12step.templating import Context
+    from pdf12step.config import Config
+    from pdf12step.adict import AttrDict
+
+    args = dict(config=[CONFIG_FILE], template_dirs=[DATA_DIR], stylesheets=['blank.css'],
+                data_dir=str(tmpdir), cache_dir=str(tmpdir.join('cache')), asset_dir=str(tmpdir.join('assets')),
+                **kwargs)
+    return Context(AttrDict(Config.load(args)), args)
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_changed_meeting(tmpdir):
+    from pdf12step.delta import read_changes, update
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    shutil.copy(MEETINGS_FILE, data_file)
+    ctx = get_context(tmpdir)
+    ctx.render()
+    first = ctx.group_stats
+    assert first['rendered'] and not first['reused']
+
+    # unchanged data reuses every group
+    ctx = get_context(tmpdir)
+    ctx.render()
+    assert not ctx.group_stats['rendered']
+    assert sorted(ctx.group_stats['reused']) == sorted(first['rendered'])
+
+    with open(MEETINGS_FILE) as mfile:
+        records = json.load(mfile)
+    meeting = next(meeting for meeting in ctx.meetings if meeting.id)
+    record = next(record for record in records if record['id'] == meeting.id)
+    record.update(time='23:59', time_formatted='11:59 pm', updated='later')
+    assert update(data_file, records)['changed'] == [str(meeting.id)]
+
+    ctx = get_context(tmpdir)
+    with mock.patch('pdf12step.templating.read_changes', wraps=read_changes) as reads:
+        content = ctx.render()
+    # the change log is read once for all the groups
+    assert reads.call_count == 1
+    dirty = f'list_2sections:{ctx.calendar.DAYS[int(meeting.day)]}/{meeting.region_display}'
+    assert sorted(ctx.group_stats['rendered']) == sorted(['index:index', dirty])
+    assert len(ctx.group_stats['reused']) == len(first['rendered']) - 2
+    assert '11:59 PM' in content
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_changed_meeting_editions(tmpdir):
+    from pdf12step.delta import update
+
+    data_file = str(tmpdir.join('example.com-meetings.json'))
+    shutil.copy(MEETINGS_FILE, data_file)
+    for show_links in (True, False):
+        get_context(tmpdir, show_links=show_links).render()
+
+    with open(MEETINGS_FILE) as mfile:
+        records = json.load(mfile)
+    record = next(record for record in records if record.get('id'))
+    record.update(time='23:59', time_formatted='11:59 pm', updated='later')
+    assert update(data_file, records)['changed'] == [str(record['id'])]
+
+    # each edition renders the group of the changed meeting again, not only the first one after the change
+    for show_links in (True, False):
+        ctx = get_context(tmpdir, show_links=show_links)
+        content = ctx.render()
+        assert '11:59 PM' in content
+        assert 'index:index' in ctx.group_stats['rendered'] and len(ctx.group_stats['rendered']) == 2
+        ctx = get_context(tmpdir, show_links=show_links)
+        assert ctx.render() == content
+        assert not ctx.group_stats['rendered']
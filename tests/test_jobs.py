@@ -0,0 +1,39 @@
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, DATA_DIR
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_job_queue(tmpdir):
+    from os import path
+
+    import pytest
+
+    from pdf12step.adict import AttrDict
+    from pdf12step.config import Config
+    from pdf12step.jobs import JobQueue, DONE
+
+    args = {'config': [CONFIG_FILE], 'data_dir': DATA_DIR, 'cache_dir': str(tmpdir),
+            'asset_dir': str(tmpdir.join('assets'))}
+    queue = JobQueue(AttrDict(Config.load(args)), workers=1)
+    try:
+        output = str(tmpdir.join('job.pdf'))
+        job = queue.submit(args, output=output)
+        assert queue.submit(args, output=output) is job
+        assert queue.submit(args, output=str(tmpdir.join('other.pdf'))) is not job
+        job.future.exception(timeout=120)
+        log = ''.join(queue.follow(job))
+        assert f'Rendering {output}' in log
+        status = queue.get(job.id).to_dict()
+        assert status['status'] == job.status
+        assert job.created <= status['started'] <= job.finished
+        assert queue.submit(args, output=output) is not job
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError):
+            pytest.skip('WeasyPrint or its system libraries are not installed')
+        assert job.status == DONE, job.error
+        assert path.isfile(output)
+    finally:
+        queue.shutdown()
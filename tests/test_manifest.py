@@ -0,0 +1,30 @@
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, DATA_DIR
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_manifest(tmp_path):
+    from pdf12step.adict import AttrDict
+    from pdf12step.config import Config
+    from pdf12step.manifest import BuildManifest, build_inputs
+
+    config = AttrDict(Config.load(dict(config=[CONFIG_FILE], data_dir=DATA_DIR, cache_dir=str(tmp_path / 'cache'),
+                                       asset_dir=str(tmp_path / 'assets'))))
+    output = tmp_path / 'out.html'
+    inputs = build_inputs(config, {'limit': None})
+    assert BuildManifest(str(output), inputs).changed() == ['output']
+
+    output.write_text('<html></html>')
+    BuildManifest(str(output), inputs).save()
+    assert BuildManifest(str(output), build_inputs(config, {'limit': None})).is_current()
+    assert BuildManifest(str(output), build_inputs(config, {'limit': 3})).changed() == ['options']
+
+    config.color = 'red'
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'logo.png').write_bytes(b'png')
+    assert BuildManifest(str(output), build_inputs(config, {'limit': None})).changed() == ['assets', 'config']
+
+    output.write_text('<html>edited</html>')
+    assert not BuildManifest(str(output), inputs).is_current()
@@ -1,6 +1,10 @@
+import json
+import shutil
+from os import path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
-from pdf12step.meetings import MeetingSet, Meeting, Calendar
+from pdf12step.meetings import MeetingSet, Meeting, Calendar, normalize
 
 from .base import MEETINGS_FILE
 
@@ -47,6 +51,52 @@ def test_conference_id():
         assert zitem.conference_id_formatted == cid
 
 
+def test_normalize():
+    place = dict(location_id=5, location='Hall', formatted_address='1 Main St, Springfield, MD 21000, USA',
+                 latitude=39.1, longitude=-76.5, region='Springfield')
+    records = [dict(place, id=1, name='A', url='https://example.com/a/'),
+               dict(place, id=2, name='B', url='https://example.com/b/'),
+               dict(place, id=3, name='C', location='Other Hall'),
+               dict(id=4, name='Online')]
+    meetings = normalize(records, locations=[{'id': 5, 'location_notes': 'Side door', 'name': 'Ignored'}])
+    first, second, moved, online = meetings
+    assert first.location_ref is second.location_ref
+    assert 'formatted_address' not in first and first.formatted_address == place['formatted_address']
+    assert first['location'] == 'Hall' and first.location_notes == 'Side door' and not first.notes
+    assert first.zipcode == second.zipcode == '21000'
+    assert {name: value for name, value in first.record().items() if value != ''} == \
+        dict(records[0], location_notes='Side door')
+    # meetings with other location fields than the shared ones keep them
+    assert moved.location_ref is None and moved.location == 'Other Hall' and moved.region_display == 'Springfield'
+    assert online.location_ref is None and online.record() is online
+
+
+def test_normalize_ca_zipcode():
+    place = dict(location_id=7, formatted_address='12 King St W, Toronto, ON M5H 1A1, Canada')
+    records = [dict(place, id=1, name='A', url='https://example.ca/meetings/a/'),
+               dict(place, id=2, name='B', url='https://example.ca/meetings/b/')]
+    plain = MeetingSet(records)
+    for meeting, other in zip(plain, normalize(records)):
+        assert other.location_ref is not None
+        assert (other.zipcode, other.address_display) == (meeting.zipcode, meeting.address_display) == \
+            ('M5H 1A1', place['formatted_address'])
+
+
+def test_load_normalized():
+    plain = MeetingSet.load(MEETINGS_FILE)
+    with TemporaryDirectory() as tmp:
+        shutil.copy(MEETINGS_FILE, tmp)
+        with open(path.join(tmp, 'example.com-locations.json'), 'w') as lfile:
+            json.dump([{'id': plain[0].location_id, 'timezone': 'America/New_York'}], lfile)
+        normalized = MeetingSet.load(path.join(tmp, path.basename(MEETINGS_FILE)), normalized=True)
+    assert len({id(meeting.location_ref) for meeting in normalized}) == len(plain.value_set('location_id'))
+    assert normalized[0].timezone == 'America/New_York'
+    for meeting, other in zip(plain, normalized):
+        assert (meeting.zipcode, meeting.address_display, meeting.region_display, meeting.latlon) == \
+            (other.zipcode, other.address_display, other.region_display, other.latlon)
+    assert normalized.regions == plain.regions
+
+
 class MeetingSetTest(TestCase):
 
     def setUp(self):
@@ -55,6 +105,7 @@ class MeetingSetTest(TestCase):
 
     def test_copy(self):
         assert self.meetings.items == self.meetings.copy().items
+        assert self.meetings.copy()[0] is self.meetings[0]
 
     def test_magic(self):
         assert len(self.meetings) == len(self.meetings.items)
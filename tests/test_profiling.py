@@ -0,0 +1,30 @@
+import json
+
+
+def test_profiler(tmp_path):
+    from pdf12step.profiling import Profiler
+
+    profiler = Profiler()
+    with profiler.span('disabled'):
+        pass
+    assert profiler.report() == []
+
+    profiler.enable(str(tmp_path / 'stats'), trace_memory=True)
+    with profiler.span('render'):
+        for _ in range(2):
+            with profiler.span('section'):
+                pass
+        data = [0] * 100000
+    profiler.disable()
+    del data
+
+    report = profiler.report()
+    assert [(stage['path'], stage['depth'], stage['calls']) for stage in report] == [
+        (['render'], 0, 1), (['render', 'section'], 1, 2)]
+    assert report[0]['seconds'] >= report[1]['seconds']
+    assert report[0]['peak_bytes'] > 800000
+    assert 'peak MB' in profiler.table() and '  section' in profiler.table()
+    assert [path.name for path in (tmp_path / 'stats').iterdir()] == ['01-render.prof']
+
+    profiler.dump(str(tmp_path / 'profile.json'))
+    assert json.loads((tmp_path / 'profile.json').read_text()) == report
@@ -0,0 +1,44 @@
+import json
+import os
+import shutil
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, DATA_DIR, MEETINGS_FILE
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_shard_html(tmp_path):
+    from pdf12step.adict import AttrDict
+    from pdf12step.config import Config
+    from pdf12step.shard import shard
+
+    data_file = tmp_path / os.path.basename(MEETINGS_FILE)
+    shutil.copy(MEETINGS_FILE, data_file)
+    args = dict(config=[CONFIG_FILE], data_dir=str(tmp_path), cache_dir=str(tmp_path / 'cache'),
+                asset_dir=str(tmp_path / 'assets'), template_dirs=[DATA_DIR])
+    config = AttrDict(Config.load(dict(args)))
+    output = str(tmp_path / '{shard}.{format}')
+    report = shard(config, args, 'region_display', ['html'], output)
+    regions = sorted({entry['value'] for entry in report['shards']})
+    assert 'Baltimore' in regions
+    baltimore = (tmp_path / 'baltimore.html').read_text()
+    assert 'Baltimore' in baltimore and 'Towson' not in baltimore
+    index = json.loads((tmp_path / 'shards.json').read_text())
+    assert [entry['slug'] for entry in index['shards']] == [entry['slug'] for entry in report['shards']]
+
+    with open(data_file) as dfile:
+        records = json.load(dfile)
+    record = next(record for record in records if record['region'] == 'Towson')
+    record['name'] = 'Renamed Meeting'
+    with open(data_file, 'w') as dfile:
+        json.dump(records, dfile)
+    report = shard(config, args, 'region_display', ['html'], output)
+    assert [entry['value'] for entry in report['shards'] if entry['outputs']] == ['Towson']
+    assert 'Renamed Meeting' in (tmp_path / 'towson.html').read_text()
+
+
+def test_shard_slugs():
+    from pdf12step.shard import shard_slugs
+
+    assert shard_slugs(['St. Mary', 'St Mary', 'st mary', 'Towson']) == ['st-mary', 'st-mary-2', 'st-mary-3', 'towson']
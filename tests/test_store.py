@@ -0,0 +1,55 @@
+import gzip
+import os
+
+
+def test_output_store(tmpdir):
+    from pdf12step.store import OutputStore
+
+    store = OutputStore(str(tmpdir.join('store')), max_live_bytes=10)
+    html = tmpdir.join('out.html')
+    html.write('<p>meetings</p>')
+    entry = store.put('out.html', str(html))
+    assert store.is_current('out.html', str(html))
+    assert 'gzip' in entry['encodings']
+    with open(store.path(entry, 'gzip'), 'rb') as gfile:
+        assert gzip.decompress(gfile.read()) == b'<p>meetings</p>'
+    html.write('<p>changed</p>')
+    os.utime(str(html), ns=(1, 1))
+    assert not store.is_current('out.html', str(html))
+
+    for num in range(2):
+        live = tmpdir.join(f'live{num}.html')
+        live.write(f'<p>{num}</p>')
+        store.put(f'live/{num}.html', str(live), move=True, live=True)
+        assert not live.exists()
+    assert store.get('live/0.html') is None and store.get('live/1.html')
+    assert list(store.outputs()) == ['out.html']
+
+
+def test_output_store_sync(tmpdir):
+    from pdf12step.store import OutputStore
+
+    out_dir = tmpdir.mkdir('out')
+    out_dir.join('a.pdf').write('a')
+    out_dir.join('b.pdf').write('b')
+    store = OutputStore(str(tmpdir.join('store')))
+    store.sync(str(out_dir))
+    assert sorted(store.outputs('.pdf')) == ['a.pdf', 'b.pdf']
+    out_dir.join('b.pdf').remove()
+    store.sync(str(out_dir))
+    assert list(store.outputs('.pdf')) == ['a.pdf']
+    assert OutputStore(store.store_dir).get('a.pdf')['size'] == 1
+
+
+def test_output_store_drop(tmpdir):
+    from pdf12step.store import OutputStore
+
+    store = OutputStore(str(tmpdir.join('store')))
+    for site in ('one', 'two'):
+        live = tmpdir.join(f'{site}.html')
+        live.write(site)
+        store.put(f'live/{site}/key.html', str(live), move=True, live=True)
+    path = store.path(store.get('live/one/key.html'))
+    store.drop('live/one/')
+    assert store.get('live/one/key.html') is None and store.get('live/two/key.html')
+    assert not os.path.exists(path)
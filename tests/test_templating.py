@@ -4,13 +4,15 @@ from os import environ, path
 from .base import ENV, CONFIG_FILE, DATA_DIR, contains_parts
 
 
-def get_context(**kwargs):
+def get_context(tmp_path, **kwargs):
     from pdf12step.templating import Context
     from pdf12step.config import Config
     from pdf12step.adict import AttrDict
 
-    kwargs.update(data_dir=DATA_DIR,
-                  config=[CONFIG_FILE],
+    kwargs.setdefault('cache_dir', str(tmp_path / 'cache'))
+    kwargs.setdefault('asset_dir', str(tmp_path / 'assets'))
+    kwargs.setdefault('data_dir', DATA_DIR)
+    kwargs.update(config=[CONFIG_FILE],
                   template_dirs=[DATA_DIR],
                   stylesheets=['blank.css'])
     return Context(AttrDict(Config.load(kwargs)), kwargs)
@@ -29,10 +31,10 @@ def test_slugify():
 
 
 @mock.patch.dict(environ, ENV, clear=True)
-def test_codify():
+def test_codify(tmp_path):
     from pdf12step.utils import codify
 
-    ctx = get_context(title='My Test Title', mycodes=['A', 'B', 'C'])
+    ctx = get_context(tmp_path, title='My Test Title', mycodes=['A', 'B', 'C'])
     coded = codify(ctx.config.codemap, ctx.config.filtercodes)(['C', 'B'])
     assert list(coded) == ['BB']
 
@@ -46,8 +48,8 @@ def test_link():
 
 
 @mock.patch.dict(environ, ENV, clear=True)
-def test_template():
-    ctx = get_context(title='My Test Title', mycodes=['A', 'B', 'C'])
+def test_template(tmp_path):
+    ctx = get_context(tmp_path, title='My Test Title', mycodes=['A', 'B', 'C'])
     contains_parts(ctx.render('test.txt'), [
         'my-test-title',
         DATA_DIR,
@@ -57,8 +59,8 @@ def test_template():
 
 
 @mock.patch.dict(environ, ENV, clear=True)
-def test_pdftemplate():
-    ctx = get_context()
+def test_pdftemplate(tmp_path):
+    ctx = get_context(tmp_path)
     contains_parts(ctx.render('layout.html'), [
         'Tuesday - Parkton',
         '<style>',
@@ -69,17 +71,266 @@ def test_pdftemplate():
     ])
 
 
+def test_fragment_prune(tmp_path):
+    from pdf12step.fragments import FragmentCache
+
+    filename = str(tmp_path / 'fragments.sqlite3')
+    cache = FragmentCache(filename, max_entries=2)
+    for key in 'abc':
+        cache.set(key, key)
+        cache.flush()
+    assert cache.flush()['pruned'] == 0
+    assert cache.get('a') is None and cache.get('c') == 'c'
+    # reading a fragment marks it as used so it outlives newer unread ones
+    cache.set('d', 'd')
+    assert cache.flush()['pruned'] == 1
+    assert cache.get('b') is None and cache.get('c') == 'c'
+    assert FragmentCache(filename, max_age=-1).flush()['pruned'] == 2
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_list_section_rows(tmp_path):
+    from jinja2 import ChoiceLoader, DictLoader
+
+    ctx = get_context(tmp_path, cache_dir=str(tmp_path))
+    section, info = 'includes/sections/list_2sections.html', 'includes/info.html'
+    current = ctx.env.get_template(section).render(ctx)
+    contains_parts(current, ['Tuesday - Parkton', '<a href="https://zoom.us/j/1234189178">Join on Zoom</a>'])
+    assert ctx.fragments.flush() == {'hits': 0, 'misses': len(ctx.meetings), 'hit_rate': 0.0,
+                                     'written': len(ctx.meetings), 'pruned': 0}
+
+    # rendered rows are reused from the fragment cache by new contexts
+    cached = get_context(tmp_path, cache_dir=str(tmp_path))
+    assert cached.env.get_template(section).render(cached) == current
+    assert cached.fragments.stats() == {'hits': len(cached.meetings), 'misses': 0, 'hit_rate': 1.0}
+
+    # the row template still imports macros itself when included directly
+    macros = "{% import 'macros.html' as macros with context %}"
+    lines = ctx.env.loader.get_source(ctx.env, info)[0].splitlines()
+    lines[0] = macros
+    legacy = {
+        section: ctx.env.loader.get_source(ctx.env, section)[0].replace('{{ row(meeting) }}', f"{{% include '{info}' %}}"),
+        info: '\n'.join(lines),
+    }
+    ctx.env.loader = ChoiceLoader([DictLoader(legacy), ctx.env.loader])
+    ctx.env.cache.clear()
+    assert ctx.env.get_template(section).render(ctx) == current
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_prerender(tmp_path):
+    import os
+
+    kwargs = dict(cache_dir=str(tmp_path / 'cache'), asset_dir=str(tmp_path / 'assets'), qrcode_url='https://example.com/')
+    ctx = get_context(tmp_path, **kwargs)
+    svg, png = tmp_path / 'assets' / 'img' / 'cover_background.svg', tmp_path / 'assets' / 'img' / 'qrcode.png'
+    ctx.prerender()
+    assert ctx.qrcode == str(png)
+    assert 'fill: lightblue' in svg.read_text()
+    assert png.read_bytes().startswith(b'\x89PNG')
+    stats, qr = (svg.stat(), png.stat()), png.read_bytes()
+
+    # unchanged inputs leave the assets alone, changed ones rewrite them
+    ctx = get_context(tmp_path, **kwargs)
+    ctx.prerender()
+    assert ctx.qrcode and (svg.stat(), png.stat()) == stats
+    ctx = get_context(tmp_path, color='red', **kwargs)
+    ctx.prerender()
+    assert ctx.qrcode and 'fill: red' in svg.read_text()
+    assert png.read_bytes() != qr
+    assert sorted(os.listdir(tmp_path / 'assets' / 'img')) == ['cover_background.svg', 'qrcode.png']
+
+
 @mock.patch.dict(environ, ENV, clear=True)
-def test_methods():
-    ctx = get_context()
+def test_methods(tmp_path):
+    ctx = get_context(tmp_path)
     assert ctx.stylesheets == ['blank.css']
     assert len(ctx.template_dirs) == 2
     assert ctx.template_dirs[0] == DATA_DIR
 
 
 @mock.patch.dict(environ, ENV, clear=True)
-def test_zips():
-    ctx = get_context()
+def test_zips(tmp_path):
+    ctx = get_context(tmp_path)
     zbr = ctx.zipcodes_by_region
     assert zbr['College Park'] == {'20705'}
     assert zbr['Laurel'] == {'20707', '20723'}
+
+
+def test_compiled_loader(tmp_path):
+    import os
+    from jinja2 import Environment, FileSystemLoader
+    from pdf12step.loaders import CompiledLoader, compile_templates
+
+    tdir, cdir = tmp_path / 'templates', str(tmp_path / 'compiled')
+    tdir.mkdir()
+    tmpl = tdir / 'hello.html'
+    tmpl.write_text('Hello {{ name }}')
+    assert compile_templates(Environment(loader=FileSystemLoader(str(tdir))), cdir) == ['hello.html']
+
+    loader = CompiledLoader(FileSystemLoader(str(tdir)), cdir)
+    env = Environment(loader=loader)
+    # the source is only read to load the template from it
+    with mock.patch.object(FileSystemLoader, 'get_source', side_effect=AssertionError):
+        assert loader.is_compiled(env, 'hello.html')
+        assert env.get_template('hello.html').render(name='World') == 'Hello World'
+
+    tmpl.write_text('Goodbye {{ name }}')
+    mtime = path.getmtime(tmpl) + 10
+    os.utime(tmpl, (mtime, mtime))
+    assert not loader.is_compiled(env, 'hello.html')
+    # the environment that loaded the compiled template reloads it from the edited source
+    assert env.get_template('hello.html').render(name='World') == 'Goodbye World'
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_stream_memory(tmp_path):
+    import json
+    import tracemalloc
+
+    with open(path.join(DATA_DIR, 'example.com-meetings.json')) as jfile:
+        sample = json.load(jfile)
+    meetings = [dict(sample[idx % len(sample)], id=idx + 1, slug=f'meeting-{idx}') for idx in range(1000)]
+    with open(tmp_path / 'example.com-meetings.json', 'w') as jfile:
+        json.dump(meetings, jfile)
+    ctx = get_context(tmp_path, data_dir=str(tmp_path), row_cache=False)
+    ctx.render('layout.html')  # compute the cached meeting fields first
+
+    tracemalloc.start()
+    with open(tmp_path / 'out.html', 'w') as outfile:
+        ctx.stream(outfile, 'layout.html')
+    streamed = tracemalloc.get_traced_memory()[1]
+    # restarted to reset the peak, tracemalloc.reset_peak was only added in Python 3.9
+    tracemalloc.stop()
+    tracemalloc.start()
+    content = ctx.render('layout.html')
+    rendered = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert (tmp_path / 'out.html').read_text() == content
+    assert streamed < len(content) < rendered, f'Streaming peaked at {streamed} bytes, rendering at {rendered}'
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_write_pdf_low_memory(tmp_path):
+    import json
+    import tracemalloc
+
+    import pytest
+
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        pytest.skip('WeasyPrint or its system libraries are not installed')
+    with open(path.join(DATA_DIR, 'example.com-meetings.json')) as jfile:
+        sample = json.load(jfile)
+    meetings = [dict(sample[idx % len(sample)], id=idx + 1, slug=f'meeting-{idx}') for idx in range(300)]
+    with open(tmp_path / 'example.com-meetings.json', 'w') as jfile:
+        json.dump(meetings, jfile)
+    peaks = {}
+    for low_memory in (False, True):
+        ctx = get_context(tmp_path, low_memory=low_memory, data_dir=str(tmp_path), cache_dir=str(tmp_path),
+                          row_cache=False)
+        ctx.prerender()
+        ctx.render('layout.html')  # compute the cached meeting fields first
+        outfile = tmp_path / f'{low_memory}.pdf'
+        tracemalloc.start()
+        with open(outfile, 'wb') as pdffile:
+            ctx.write_pdf(pdffile)
+        peaks[low_memory] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert outfile.read_bytes().startswith(b'%PDF')
+    assert not list((tmp_path / 'tmp').iterdir())
+    assert peaks[True] < peaks[False], f'Low memory PDF peaked at {peaks[True]} bytes, the default at {peaks[False]}'
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_pdf_target(tmp_path):
+    import io
+    import pytest
+    from pdf12step.templating import Context
+
+    def write_pdf(self, target, template=None):
+        target.write(b'%PDF-1.7 ')
+        if template == 'broken.html':
+            raise ValueError('Layout failed')
+        target.write(b'%%EOF')
+
+    ctx = get_context(tmp_path)
+    outfile = tmp_path / 'out.pdf'
+    with mock.patch.object(Context, 'write_pdf', write_pdf):
+        assert ctx.pdf() == b'%PDF-1.7 %%EOF'
+        output = io.BytesIO()
+        assert ctx.pdf(target=output) is None
+        assert output.getvalue() == b'%PDF-1.7 %%EOF'
+        ctx.pdf(target=str(outfile))
+        with pytest.raises(ValueError):
+            ctx.pdf('broken.html', str(outfile))
+    assert outfile.read_bytes() == b'%PDF-1.7 %%EOF'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.pdf']
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_page_count(tmp_path):
+    from pdf12step.pages import html_key
+    from pdf12step.templating import Context
+
+    laid_out = []
+
+    def layout_pages(self, content):
+        laid_out.append(content)
+        return 2
+
+    ctx = get_context(tmp_path, cache_dir=str(tmp_path))
+    ctx.prerender()
+    sections = ['cover'] + ctx.config.sections + ['backcover']
+    with mock.patch.object(Context, 'layout_pages', layout_pages):
+        count = ctx.page_count()
+    assert list(count['sections']) == sections
+    assert count['sections']['cover'] == 2 and count['sections']['backcover'] == 1
+    # 11 pages get a notes page repeated for an even count
+    assert count['pages'] == 12 and not count['exact']
+    assert len(laid_out) == len(sections)
+    assert all('<meta name="created"' not in content for content in laid_out)
+
+    ctx.page_cache.set(html_key(ctx.render()), 41)
+    assert ctx.page_count() == {'pages': 42, 'exact': True, 'sections': {}}
+    assert get_context(tmp_path, cache_dir=str(tmp_path)).page_cache.get(html_key(ctx.render())) == 41
+
+
+def test_page_cache_prune(tmp_path):
+    from pdf12step.pages import PageCache
+
+    cache = PageCache(str(tmp_path), max_counts=2)
+    for key, pages in (('a', 1), ('b', 2), ('c', 3), ('a', 4)):
+        cache.set(key, pages)
+    assert PageCache(str(tmp_path)).counts() == {'c': 3, 'a': 4}
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_shared_env(tmp_path):
+    from pdf12step.adict import AttrDict
+    from pdf12step.templating import get_env
+
+    first, second = get_context(tmp_path), get_context(tmp_path, title='Another Site')
+    assert first.env is second.env
+    assert get_env(AttrDict(first.config, template_dirs=[])) is not first.env
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_recompiled_env(tmp_path):
+    import os
+    from pdf12step.loaders import MANIFEST
+    from pdf12step.templating import envs, get_env
+
+    config = get_context(tmp_path, cache_dir=str(tmp_path)).config
+    manifest = tmp_path / 'compiled' / MANIFEST
+    manifest.parent.mkdir()
+    manifest.write_text('{}')
+    compiled = get_env(config)
+    assert get_env(config) is compiled
+    count = len(envs)
+    mtime = os.path.getmtime(manifest) + 10
+    os.utime(manifest, (mtime, mtime))
+    assert get_env(config) is not compiled
+    assert len(envs) == count
@@ -9,3 +9,29 @@ def test_utils(mocked_input):
 
     assert lister(None) == []
     assert lister('a,b,c') == ['a', 'b', 'c']
+
+
+def test_atomic_open(tmp_path):
+    from pdf12step.utils import atomic_open
+
+    dest = tmp_path / 'out.txt'
+    with atomic_open(str(dest)) as fobj:
+        fobj.write('first')
+    assert dest.read_text() == 'first'
+    try:
+        with atomic_open(str(dest)) as fobj:
+            fobj.write('second')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert dest.read_text() == 'first'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.txt']
+
+
+def test_iter_chunks():
+    import io
+    from pdf12step.utils import iter_chunks
+
+    fobj = io.BytesIO(b'%PDF' * 5)
+    assert list(iter_chunks(fobj, 8)) == [b'%PDF%PDF', b'%PDF%PDF', b'%PDF']
+    assert fobj.closed
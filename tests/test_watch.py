@@ -0,0 +1,62 @@
+import json
+from unittest import mock
+from os import environ
+
+from .base import ENV, CONFIG_FILE, MEETINGS_FILE
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_watch(tmpdir):
+    from pdf12step.build import Edition
+    from pdf12step.watch import Watcher
+
+    with open(MEETINGS_FILE) as mfile:
+        meetings = json.load(mfile)
+    args = {'config': [CONFIG_FILE], 'data_dir': str(tmpdir), 'cache_dir': str(tmpdir.join('cache')),
+            'asset_dir': str(tmpdir.join('assets')), 'limit': 5}
+    config_file = tmpdir.join('site.yml')
+    config_file.write('author: First Intergroup\n')
+    edition = Edition.parse(f'site={config_file}', args)
+    status_file = str(tmpdir.join('watch.json'))
+    output = str(tmpdir.join('{edition}.{format}'))
+    with mock.patch('pdf12step.watch.Client') as client:
+        client.return_value.meetings.return_value = meetings
+        Watcher([edition], ['html'], output, status_file=status_file).run(once=True)
+        assert tmpdir.join('site.html').exists()
+        Watcher([edition], ['html'], output, status_file=status_file).run(once=True)
+    with open(status_file) as sfile:
+        status = json.load(sfile)
+    site = status['sites'][edition.config.site_domain]
+    assert site['changed'] is False and site['meetings'] == len(meetings) and not site['error']
+    assert status['editions']['site']['outputs'] == [str(tmpdir.join('site.html'))]
+    last_build = status['editions']['site']['last_build']
+
+    # an edited config is picked up by the next check and rebuilds the edition
+    config_file.write('author: The Second Intergroup\n')
+    with mock.patch('pdf12step.watch.Client') as client:
+        client.return_value.meetings.return_value = meetings
+        Watcher([edition], ['html'], output, status_file=status_file).run(once=True)
+    with open(status_file) as sfile:
+        assert json.load(sfile)['editions']['site']['last_build'] > last_build
+    assert 'The Second Intergroup' in tmpdir.join('site.html').read()
+
+
+@mock.patch.dict(environ, ENV, clear=True)
+def test_watch_normalized(tmpdir):
+    from pdf12step.build import Edition
+    from pdf12step.watch import Watcher
+
+    with open(MEETINGS_FILE) as mfile:
+        meetings = json.load(mfile)
+    args = {'config': [CONFIG_FILE], 'data_dir': str(tmpdir), 'cache_dir': str(tmpdir.join('cache')),
+            'asset_dir': str(tmpdir.join('assets')), 'limit': 5, 'normalized': True}
+    edition = Edition.parse('site=', args)
+    watcher = Watcher([edition], ['html'], str(tmpdir.join('{edition}.{format}')),
+                      status_file=str(tmpdir.join('watch.json')))
+    with mock.patch('pdf12step.watch.Client') as client:
+        client.return_value.meetings.return_value = meetings
+        client.return_value.locations.return_value = [{'id': meetings[0]['location_id'], 'timezone': 'UTC'}]
+        client.return_value.groups.return_value = []
+        watcher.run(once=True)
+    assert json.loads(tmpdir.join('example.com-locations.json').read())[0]['timezone'] == 'UTC'
+    assert tmpdir.join('site.html').exists()